@@ -3,4 +3,15 @@ from .file_handler import FileHandler
 
 
 def main(blobfile: func.InputStream) -> None:
-    FileHandler(blobfile.name, blobfile, blobfile.length).handle_file()
+    deadline = FileHandler.get_processing_deadline()
+
+    # The rest of files that reached the deadline in previous invocations are processed first.
+    FileHandler.handle_remainders(deadline)
+
+    if FileHandler.is_file_skipped(blobfile.name, blobfile.length):
+        return
+
+    blob_properties = blobfile.blob_properties or {}
+    etag = blob_properties.get('ETag', blob_properties.get('Etag'))
+
+    FileHandler(blobfile.name, blobfile, blobfile.length, etag, deadline=deadline).handle_file()
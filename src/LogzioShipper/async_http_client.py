@@ -0,0 +1,102 @@
+import asyncio
+import aiohttp
+import requests
+
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+from requests.adapters import RetryError
+from requests.sessions import InvalidSchema
+from requests.structures import CaseInsensitiveDict
+from .throttling import RateLimiter, ThrottlingRetry
+
+
+class AsyncHttpClient:
+
+    SCHEMES = ('http', 'https')
+
+    def __init__(self, max_connections: int, timeout: float, retries: int, backoff_factor: float,
+                 status_forcelist: List[int], rate_limiter: Optional[RateLimiter] = None) -> None:
+        self._max_connections = max_connections
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff_factor = backoff_factor
+        self._status_forcelist = status_forcelist
+        self._rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def post(self, url: str, data: bytes, headers: Dict[str, str]) -> int:
+        # The errors are raised as the requests errors, so they are handled like the errors of the threaded senders.
+        try:
+            scheme = urlsplit(url).scheme
+        except ValueError as e:
+            raise requests.exceptions.InvalidURL("Invalid url {0} - {1}".format(url, e)) from e
+
+        if scheme not in AsyncHttpClient.SCHEMES:
+            raise InvalidSchema("No connection adapters were found for {!r}".format(url))
+
+        session = self._get_session()
+        retry_num = 0
+
+        while True:
+            retry_after_seconds = None
+            await asyncio.sleep(self._rate_limiter.reserve(len(data)))
+
+            try:
+                async with session.post(url, data=data, headers=headers) as response:
+                    await response.read()
+            except aiohttp.InvalidURL as e:
+                raise requests.exceptions.InvalidURL("Invalid url {0} - {1}".format(url, e)) from e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if retry_num >= self._retries:
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise requests.Timeout("Max retries exceeded with url {0} - {1}".format(url, repr(e))) from e
+
+                    raise requests.ConnectionError("Max retries exceeded with url {0} - {1}".format(
+                        url, repr(e))) from e
+            else:
+                if response.status not in self._status_forcelist:
+                    self._raise_for_status(url, response)
+
+                    return response.status
+
+                if retry_num >= self._retries:
+                    raise RetryError("Max retries exceeded with url {0} - too many {1} error responses".format(
+                        url, response.status))
+
+                if response.status in ThrottlingRetry.RETRY_AFTER_STATUS_CODES:
+                    retry_after_seconds = ThrottlingRetry.get_retry_after_seconds(response.headers.get('Retry-After'))
+
+            retry_num += 1
+
+            # The rate limiter waits for the pause before the next attempt.
+            if retry_after_seconds is not None:
+                self._rate_limiter.pause(retry_after_seconds)
+            else:
+                await asyncio.sleep(self._get_backoff_seconds(retry_num))
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # The session is created in the event loop that uses it, and the proxies are taken from the environment
+        # (HTTPS_PROXY, NO_PROXY) like in the requests session.
+        if self._session is None:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self._max_connections),
+                                                  timeout=aiohttp.ClientTimeout(sock_connect=self._timeout,
+                                                                                sock_read=self._timeout),
+                                                  trust_env=True)
+
+        return self._session
+
+    def _raise_for_status(self, url: str, response: aiohttp.ClientResponse) -> None:
+        requests_response = requests.Response()
+        requests_response.status_code = response.status
+        requests_response.reason = response.reason
+        requests_response.url = url
+        requests_response.headers = CaseInsensitiveDict(response.headers)
+
+        requests_response.raise_for_status()
+
+    def _get_backoff_seconds(self, retry_num: int) -> float:
+        # The same jittered backoff as the requests retries, the first retry is immediate.
+        if retry_num <= 1:
+            return 0
+
+        return ThrottlingRetry.get_jittered_seconds(self._backoff_factor * (2 ** (retry_num - 1)))
@@ -0,0 +1,68 @@
+import asyncio
+import concurrent.futures
+
+from typing import List, Optional
+from .logzio_shipper import LogzioShipper
+from .consumer_producer_queues import ConsumerProducerQueues
+
+
+class AsyncLogzioShipper(LogzioShipper):
+
+    MAX_CONNECTIONS = 8
+
+    def __init__(self, logzio_url: str, logzio_token: str, consumer_producer_queues: ConsumerProducerQueues,
+                 version: str, compressed_bulk_size_ratio: Optional[float] = None,
+                 max_in_flight_bytes: Optional[int] = None, max_in_flight_bulks: Optional[int] = None,
+                 max_requests_per_second: Optional[float] = None,
+                 max_bytes_per_second: Optional[float] = None) -> None:
+        super().__init__(logzio_url, logzio_token, consumer_producer_queues, version, compressed_bulk_size_ratio,
+                         max_in_flight_bytes, max_in_flight_bulks, max_requests_per_second, max_bytes_per_second)
+        self._async_http_client = self._shipping_runtime.get_async_http_client(
+            AsyncLogzioShipper.MAX_CONNECTIONS, LogzioShipper.CONNECTION_TIMEOUT_SECONDS)
+
+    def _submit_sender(self, logs: List[bytes], bulk_size: int, bulk_num: int, bulk_offset: Optional[int],
+                       compressed_logs: Optional[bytes]) -> concurrent.futures.Future:
+        return self._shipping_runtime.submit_coroutine(
+            self._send_bulk_async(logs, bulk_size, bulk_num, bulk_offset, compressed_logs))
+
+    async def _send_bulk_async(self, logs: List[bytes], bulk_size: int, bulk_num: int, bulk_offset: Optional[int],
+                               compressed_logs: Optional[bytes]) -> None:
+        try:
+            await self._send_to_logzio_async(logs, bulk_size, bulk_num, bulk_offset, compressed_logs)
+        finally:
+            self._bulks_budget.release(self._get_in_flight_size(bulk_size, compressed_logs))
+
+    async def _send_to_logzio_async(self, logs: List[bytes], bulk_size: int, bulk_num: int,
+                                    bulk_offset: Optional[int], compressed_logs: Optional[bytes]) -> None:
+        if not logs and compressed_logs is None:
+            self._set_bulk_delivered(bulk_num, bulk_offset)
+            return
+
+        compressed_data = compressed_logs
+
+        try:
+            if compressed_data is None:
+                # Compressing is CPU bound, so it runs in the senders threads instead of the event loop.
+                compressed_data = await asyncio.wrap_future(self._shipping_runtime.submit_sender(self._compress_logs,
+                                                                                                 logs))
+
+            await self._async_http_client.post(self._logzio_url, compressed_data, self._get_headers())
+            self._consumer_producer_queues.put_info_into_queue(
+                "Successfully sent bulk of {} bytes to Logz.io.".format(bulk_size))
+            self._set_bulk_delivered(bulk_num, bulk_offset)
+        except Exception as e:
+            message, is_transient = self._get_send_error_message(e)
+
+            if is_transient:
+                await self._set_transient_exception_async(message, e, compressed_data, bulk_size, bulk_num,
+                                                          bulk_offset)
+                return
+
+            self._set_exception(message, e)
+
+    async def _set_transient_exception_async(self, message: str, exception: Exception,
+                                             compressed_data: Optional[bytes], bulk_size: int, bulk_num: int,
+                                             bulk_offset: Optional[int]) -> None:
+        # Spilling writes to the dead letter store, so it runs in the senders threads instead of the event loop.
+        await asyncio.wrap_future(self._shipping_runtime.submit_sender(
+            self._set_transient_exception, message, exception, compressed_data, bulk_size, bulk_num, bulk_offset))
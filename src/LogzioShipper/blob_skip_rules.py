@@ -0,0 +1,79 @@
+import re
+import fnmatch
+
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from .datetime_filter import DatetimeFilter
+
+
+class BlobSkipRules:
+
+    PARTITION_REGEX = re.compile(r'(?:^|/)(?:y|year)=(\d{4})'
+                                 r'(?:/(?:m|month)=(\d{1,2})'
+                                 r'(?:/(?:d|day)=(\d{1,2})'
+                                 r'(?:/(?:h|hour)=(\d{1,2}))?)?)?(?=/|$)')
+
+    def __init__(self, include_patterns: List[str], exclude_patterns: List[str],
+                 filter_datetime: Optional[datetime] = None) -> None:
+        self._include_patterns = include_patterns
+        self._exclude_patterns = exclude_patterns
+        self._filter_datetime = filter_datetime
+
+    @staticmethod
+    def get_filter_datetime(datetime_filter: str, datetime_format: str) -> datetime:
+        if datetime_format == DatetimeFilter.EPOCH_SECONDS_FORMAT:
+            filter_datetime = datetime.fromtimestamp(float(datetime_filter), timezone.utc)
+        elif datetime_format == DatetimeFilter.EPOCH_MILLISECONDS_FORMAT:
+            filter_datetime = datetime.fromtimestamp(float(datetime_filter) / 1000, timezone.utc)
+        else:
+            filter_datetime = datetime.strptime(datetime_filter, datetime_format)
+
+        if filter_datetime.tzinfo is None:
+            return filter_datetime
+
+        return filter_datetime.astimezone(timezone.utc).replace(tzinfo=None)
+
+    def get_skip_reason(self, blob_name: str, blob_size: int) -> Optional[str]:
+        if blob_size == 0:
+            return "The file {} is empty.".format(blob_name)
+
+        if self._include_patterns and not any(fnmatch.fnmatchcase(blob_name, include_pattern)
+                                              for include_pattern in self._include_patterns):
+            return "The file {} does not match any include pattern.".format(blob_name)
+
+        for exclude_pattern in self._exclude_patterns:
+            if fnmatch.fnmatchcase(blob_name, exclude_pattern):
+                return "The file {0} matches exclude pattern {1}.".format(blob_name, exclude_pattern)
+
+        if self._filter_datetime is None:
+            return None
+
+        partition_end_datetime = self._get_partition_end_datetime(blob_name)
+
+        if partition_end_datetime is not None and partition_end_datetime <= self._filter_datetime:
+            return "The partition of file {0} ends at {1}, before the datetime filter.".format(
+                blob_name, partition_end_datetime.isoformat())
+
+        return None
+
+    def _get_partition_end_datetime(self, blob_name: str) -> Optional[datetime]:
+        match = BlobSkipRules.PARTITION_REGEX.search(blob_name)
+
+        if match is None:
+            return None
+
+        year, month, day, hour = (int(value) if value is not None else None for value in match.groups())
+
+        try:
+            if month is None:
+                return datetime(year + 1, 1, 1)
+
+            if day is None:
+                return datetime(year + month // 12, month % 12 + 1, 1)
+
+            if hour is None:
+                return datetime(year, month, day) + timedelta(days=1)
+
+            return datetime(year, month, day, hour) + timedelta(hours=1)
+        except ValueError:
+            return None
@@ -0,0 +1,61 @@
+import zlib
+
+from typing import List
+
+
+class BulkBuilder:
+
+    COMPRESSION_LEVEL = 6
+    GZIP_WBITS = 16 + zlib.MAX_WBITS
+    # Deflate holds back up to one block of input, which is never compressed to more than this size.
+    MAX_PENDING_COMPRESSED_SIZE_BYTES = 128 * 1024      # 128 KB
+    GZIP_TRAILER_SIZE_BYTES = 8
+
+    def __init__(self, max_compressed_size: int) -> None:
+        self._max_compressed_size = max_compressed_size
+        self._compressor = zlib.compressobj(BulkBuilder.COMPRESSION_LEVEL, zlib.DEFLATED, BulkBuilder.GZIP_WBITS)
+        self._compressed_chunks: List[bytes] = []
+        self._compressed_size = 0
+        self._size = 0
+        self._logs_num = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def compressed_size(self) -> int:
+        return self._compressed_size
+
+    @property
+    def logs_num(self) -> int:
+        return self._logs_num
+
+    def can_add_log(self, log_size: int) -> bool:
+        if self._logs_num == 0:
+            return True
+
+        pending_compressed_size = min(self._size + 1 + log_size,
+                                      BulkBuilder.MAX_PENDING_COMPRESSED_SIZE_BYTES + 1 + log_size)
+
+        return self._compressed_size + pending_compressed_size + BulkBuilder.GZIP_TRAILER_SIZE_BYTES \
+            <= self._max_compressed_size
+
+    def add_log(self, log: bytes) -> None:
+        if self._logs_num > 0:
+            self._add_compressed_chunk(self._compressor.compress(b'\n'))
+            self._size += 1
+
+        self._add_compressed_chunk(self._compressor.compress(log))
+        self._size += len(log)
+        self._logs_num += 1
+
+    def get_compressed_bulk(self) -> bytes:
+        self._add_compressed_chunk(self._compressor.flush())
+
+        return b''.join(self._compressed_chunks)
+
+    def _add_compressed_chunk(self, compressed_chunk: bytes) -> None:
+        if compressed_chunk:
+            self._compressed_chunks.append(compressed_chunk)
+            self._compressed_size += len(compressed_chunk)
@@ -0,0 +1,191 @@
+import logging
+import sqlite3
+import hashlib
+
+from abc import ABC, abstractmethod
+from typing import Optional, NamedTuple
+
+try:
+    from azure.data.tables import TableServiceClient
+    from azure.core.exceptions import ResourceNotFoundError
+except ImportError:
+    TableServiceClient = None
+    ResourceNotFoundError = None
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class TailState(NamedTuple):
+    offset: int
+    partial_line_hash: str
+    partial_line_size: int
+
+
+class CheckpointStore(ABC):
+
+    @abstractmethod
+    def get_offset(self, blob_name: str, etag: str) -> int:
+        pass
+
+    @abstractmethod
+    def set_offset(self, blob_name: str, etag: str, offset: int) -> None:
+        pass
+
+    @abstractmethod
+    def delete_offset(self, blob_name: str) -> None:
+        pass
+
+    @abstractmethod
+    def get_tail_state(self, blob_name: str) -> Optional[TailState]:
+        pass
+
+    @abstractmethod
+    def set_tail_state(self, blob_name: str, tail_state: TailState) -> None:
+        pass
+
+    @abstractmethod
+    def delete_tail_state(self, blob_name: str) -> None:
+        pass
+
+
+class SqliteCheckpointStore(CheckpointStore):
+
+    def __init__(self, database_path: str) -> None:
+        self._database_path = database_path
+
+        self._execute('CREATE TABLE IF NOT EXISTS checkpoints (blob_name TEXT PRIMARY KEY, etag TEXT, offset INTEGER)')
+        self._execute('CREATE TABLE IF NOT EXISTS tail_states (blob_name TEXT PRIMARY KEY, offset INTEGER, '
+                      'partial_line_hash TEXT, partial_line_size INTEGER)')
+
+    def get_offset(self, blob_name: str, etag: str) -> int:
+        row = self._execute('SELECT offset FROM checkpoints WHERE blob_name = ? AND etag = ?', (blob_name, etag))
+
+        if row is None:
+            return 0
+
+        return row[0]
+
+    def set_offset(self, blob_name: str, etag: str, offset: int) -> None:
+        self._execute('INSERT OR REPLACE INTO checkpoints (blob_name, etag, offset) VALUES (?, ?, ?)',
+                      (blob_name, etag, offset))
+
+    def delete_offset(self, blob_name: str) -> None:
+        self._execute('DELETE FROM checkpoints WHERE blob_name = ?', (blob_name,))
+
+    def get_tail_state(self, blob_name: str) -> Optional[TailState]:
+        row = self._execute('SELECT offset, partial_line_hash, partial_line_size FROM tail_states WHERE blob_name = ?',
+                            (blob_name,))
+
+        if row is None:
+            return None
+
+        return TailState(*row)
+
+    def set_tail_state(self, blob_name: str, tail_state: TailState) -> None:
+        self._execute('INSERT OR REPLACE INTO tail_states (blob_name, offset, partial_line_hash, partial_line_size) '
+                      'VALUES (?, ?, ?, ?)', (blob_name, *tail_state))
+
+    def delete_tail_state(self, blob_name: str) -> None:
+        self._execute('DELETE FROM tail_states WHERE blob_name = ?', (blob_name,))
+
+    def _execute(self, query: str, parameters: tuple = ()) -> Optional[tuple]:
+        connection = sqlite3.connect(self._database_path, timeout=30)
+
+        try:
+            with connection:
+                return connection.execute(query, parameters).fetchone()
+        finally:
+            connection.close()
+
+
+class TableCheckpointStore(CheckpointStore):
+
+    PARTITION_KEY = 'checkpoints'
+    TAIL_STATES_PARTITION_KEY = 'tail_states'
+
+    def __init__(self, connection_string: str, table_name: str) -> None:
+        if TableServiceClient is None:
+            raise ImportError("azure-data-tables must be installed to use the table checkpoint store.")
+
+        table_service_client = TableServiceClient.from_connection_string(connection_string)
+        self._table_client = table_service_client.create_table_if_not_exists(table_name)
+
+    def get_offset(self, blob_name: str, etag: str) -> int:
+        try:
+            entity = self._table_client.get_entity(TableCheckpointStore.PARTITION_KEY, self._get_row_key(blob_name))
+        except ResourceNotFoundError:
+            return 0
+
+        if entity.get('Etag') != etag:
+            return 0
+
+        return entity['Offset']
+
+    def set_offset(self, blob_name: str, etag: str, offset: int) -> None:
+        self._table_client.upsert_entity({'PartitionKey': TableCheckpointStore.PARTITION_KEY,
+                                          'RowKey': self._get_row_key(blob_name),
+                                          'BlobName': blob_name,
+                                          'Etag': etag,
+                                          'Offset': offset})
+
+    def delete_offset(self, blob_name: str) -> None:
+        self._table_client.delete_entity(TableCheckpointStore.PARTITION_KEY, self._get_row_key(blob_name))
+
+    def get_tail_state(self, blob_name: str) -> Optional[TailState]:
+        try:
+            entity = self._table_client.get_entity(TableCheckpointStore.TAIL_STATES_PARTITION_KEY,
+                                                   self._get_row_key(blob_name))
+        except ResourceNotFoundError:
+            return None
+
+        return TailState(entity['Offset'], entity['PartialLineHash'], entity['PartialLineSize'])
+
+    def set_tail_state(self, blob_name: str, tail_state: TailState) -> None:
+        self._table_client.upsert_entity({'PartitionKey': TableCheckpointStore.TAIL_STATES_PARTITION_KEY,
+                                          'RowKey': self._get_row_key(blob_name),
+                                          'BlobName': blob_name,
+                                          'Offset': tail_state.offset,
+                                          'PartialLineHash': tail_state.partial_line_hash,
+                                          'PartialLineSize': tail_state.partial_line_size})
+
+    def delete_tail_state(self, blob_name: str) -> None:
+        self._table_client.delete_entity(TableCheckpointStore.TAIL_STATES_PARTITION_KEY,
+                                         self._get_row_key(blob_name))
+
+    def _get_row_key(self, blob_name: str) -> str:
+        # Table row keys can't contain '/', which most blob names do.
+        return hashlib.sha256(blob_name.encode('utf-8')).hexdigest()
+
+
+class BlobCheckpoint:
+
+    def __init__(self, checkpoint_store: CheckpointStore, blob_name: str, etag: str) -> None:
+        self._checkpoint_store = checkpoint_store
+        self._blob_name = blob_name
+        self._etag = etag
+
+    def get_offset(self) -> int:
+        try:
+            return self._checkpoint_store.get_offset(self._blob_name, self._etag)
+        except Exception as e:
+            logger.error("Failed to get checkpoint of {0}. Processing from the start - {1}".format(
+                self._blob_name, e))
+
+        return 0
+
+    def set_offset(self, offset: Optional[int]) -> None:
+        if offset is None:
+            return
+
+        try:
+            self._checkpoint_store.set_offset(self._blob_name, self._etag, offset)
+        except Exception as e:
+            logger.error("Failed to save checkpoint of {0} at offset {1} - {2}".format(self._blob_name, offset, e))
+
+    def delete(self) -> None:
+        try:
+            self._checkpoint_store.delete_offset(self._blob_name)
+        except Exception as e:
+            logger.error("Failed to delete checkpoint of {0} - {1}".format(self._blob_name, e))
@@ -1,27 +1,56 @@
 import queue
 
-from typing import Optional
+from typing import Optional, List, Tuple
+from .log_record import LogRecord
+from .in_flight_budget import InFlightBudget
 
 
 class ConsumerProducerQueues:
 
-    END_LOG = 'END'
+    # A unique object, so no log can be mistaken for the end of the logs.
+    END_LOG = object()
+    LOGS_BATCH_SIZE = 1000
 
-    def __init__(self) -> None:
+    def __init__(self, max_logs_bytes: Optional[int] = None) -> None:
         self._logs_queue = queue.Queue()
+        self._logs_budget = InFlightBudget(max_bytes=max_logs_bytes)
         self._info_queue = queue.Queue()
         self._errors_queue = queue.Queue()
 
-    def get_log_from_queue(self) -> Optional[str]:
-        log = self._logs_queue.get()
+    class LogsQueueClosedError(Exception):
+        pass
 
-        if log == ConsumerProducerQueues.END_LOG:
+    @property
+    def logs_blocked_seconds(self) -> float:
+        return self._logs_budget.blocked_seconds
+
+    def get_logs_from_queue(self) -> Optional[List[Tuple[LogRecord, Optional[int]]]]:
+        queued_logs = self._logs_queue.get()
+
+        if queued_logs is ConsumerProducerQueues.END_LOG:
             return None
 
-        return log
+        logs, logs_size = queued_logs
+        self._logs_budget.release(logs_size, len(logs))
+
+        return logs
+
+    def put_logs_into_queue(self, logs: List[Tuple[LogRecord, Optional[int]]]) -> None:
+        logs_size = sum(len(log.raw) for log, _ in logs)
+
+        # Blocks the parser while the queued logs are over the budget, until the shipper catches up.
+        self._logs_budget.acquire(logs_size, len(logs))
+
+        if self._logs_budget.is_closed:
+            raise self.LogsQueueClosedError("The shipper stopped getting logs from the queue.")
+
+        self._logs_queue.put((logs, logs_size))
+
+    def put_log_into_queue(self, log: LogRecord, offset: Optional[int] = None) -> None:
+        self.put_logs_into_queue([(log, offset)])
 
-    def put_log_into_queue(self, log: str) -> None:
-        self._logs_queue.put(log)
+    def close_logs_queue(self) -> None:
+        self._logs_budget.close()
 
     def put_end_log_into_queue(self) -> None:
         self._logs_queue.put(ConsumerProducerQueues.END_LOG)
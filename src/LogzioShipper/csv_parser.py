@@ -1,13 +1,11 @@
 import logging
-import io
 import csv
-import json
 
-from typing import Generator, Optional
+from typing import Generator, Optional, List, Dict, Any
 from io import BytesIO
-from jsonpath_ng import parse, JSONPathError
-from datetime import datetime
 from .file_parser import FileParser
+from .log_record import LogRecord
+from . import json_codec
 
 
 logger = logging.getLogger(__name__)
@@ -15,33 +13,80 @@ logger.setLevel(logging.INFO)
 
 
 class CsvParser(FileParser):
-    
+
+    # Values without a column are kept under a null key, the same as csv.DictReader does.
+    EXTRA_VALUES_KEY_PREFIX = b', "null": '
+
     def __init__(self, file_stream: BytesIO, delimiter: str, datetime_finder: Optional[str] = None,
                  datetime_format: Optional[str] = None) -> None:
         super().__init__(file_stream, datetime_finder, datetime_format)
         self._delimiter = delimiter
+        self._json_path_accessor = self._get_json_path_accessor()
+
+    def parse_file(self) -> Generator[LogRecord, None, None]:
+        rows = self._get_rows()
+        header = next(rows, None)
+
+        if header is None:
+            return
 
-        if self._datetime_finder is not None:
-            try:
-                self._json_path_parser = parse(self._datetime_finder)
-            except JSONPathError as e:
-                logger.error(
-                    "Something is wrong with the datetime finder json path {0} - {1}".format(self._datetime_finder, e))
-                self._json_path_parser = None
+        self._seek_start_offset()
 
-    def parse_file(self) -> Generator[str, None, None]:
-        logs = [self._file_stream.readline().decode("utf-8").rstrip(), '']
+        keys_prefixes = self._get_keys_prefixes(header)
 
+        if keys_prefixes is None or (self._datetime_finder is not None and self._datetime_format is not None):
+            for row in rows:
+                yield LogRecord(json_log=self._get_json_log(header, row))
+        else:
+            for row in rows:
+                yield LogRecord(self._get_encoded_log(keys_prefixes, row))
+
+    def get_log_datetime_value(self, log: LogRecord) -> Any:
+        return self._get_log_datetime_value(log, self._json_path_accessor)
+
+    def _get_lines(self) -> Generator[str, None, None]:
         while True:
-            logs[1] = self._file_stream.readline().decode("utf-8").rstrip()
+            line = self._file_stream.readline()
+
+            if line == b'':
+                return
+
+            yield line.decode("utf-8")
+
+    def _get_rows(self) -> Generator[List[str], None, None]:
+        # The reader pulls one line at a time, so the stream position is always at the end of the last row.
+        for row in csv.reader(self._get_lines(), delimiter=self._delimiter):
+            if row:
+                yield row
+
+    def _get_keys_prefixes(self, header: List[str]) -> Optional[List[bytes]]:
+        if len(set(header)) != len(header):
+            return None
+
+        keys_prefixes = [b', ' + json_codec.encode_string(key) + b': ' for key in header]
+        keys_prefixes[0] = b'{' + keys_prefixes[0][2:]
+
+        return keys_prefixes
+
+    def _get_encoded_log(self, keys_prefixes: List[bytes], row: List[str]) -> bytes:
+        fields = [key_prefix + json_codec.encode_string(value) for key_prefix, value in zip(keys_prefixes, row)]
+
+        if len(row) < len(keys_prefixes):
+            fields.extend(key_prefix + b'null' for key_prefix in keys_prefixes[len(row):])
+        elif len(row) > len(keys_prefixes):
+            fields.append(CsvParser.EXTRA_VALUES_KEY_PREFIX + json_codec.dumps(row[len(keys_prefixes):]))
+
+        fields.append(b'}')
 
-            if logs[1] == '':
-                break
+        return b''.join(fields)
 
-            reader = csv.DictReader(io.StringIO('\n'.join(logs)), delimiter=self._delimiter)
-            log = next(reader)
+    def _get_json_log(self, header: List[str], row: List[str]) -> Dict[Optional[str], Any]:
+        json_log: Dict[Optional[str], Any] = dict(zip(header, row))
 
-            yield json.dumps(log)
+        if len(row) < len(header):
+            for key in header[len(row):]:
+                json_log[key] = None
+        elif len(row) > len(header):
+            json_log[None] = row[len(header):]
 
-    def get_log_datetime(self, log: str) -> Optional[datetime]:
-        return self._get_log_datetime(log, self._json_path_parser)
+        return json_log
@@ -1,3 +1,8 @@
+from typing import List
+from .log_record import LogRecord
+from . import json_codec
+
+
 class CustomField:
 
     def __init__(self, field_key: str, field_value: str) -> None:
@@ -11,3 +16,39 @@ class CustomField:
     @property
     def value(self) -> str:
         return self._value
+
+
+class CustomFieldsInjector:
+
+    def __init__(self, custom_fields: List[CustomField]) -> None:
+        self._custom_fields = {custom_field.key: custom_field.value for custom_field in custom_fields}
+        self._encoded_keys = [json_codec.dumps(key) for key in self._custom_fields]
+        self._fragment = b''.join(b', ' + json_codec.dumps(key) + b': ' + json_codec.dumps(value)
+                                  for key, value in self._custom_fields.items())
+
+    def add_custom_fields_to_log(self, log: LogRecord) -> bytes:
+        if not self._custom_fields:
+            return log.raw
+
+        if not log.is_encoded or not self._is_splicable(log):
+            log.update(self._custom_fields)
+            return log.raw
+
+        return log.raw[:-1] + self._fragment + b'}'
+
+    def _is_splicable(self, log: LogRecord) -> bool:
+        raw = log.raw
+
+        if not raw.startswith(b'{') or not raw.endswith(b'}') or not raw[1:-1].strip():
+            return False
+
+        # An escaped key can be the same as a custom field key without matching its encoding, so the keys of escaped
+        # logs are checked on the decoded log.
+        if b'\\' in raw:
+            return not any(key in log.json_log for key in self._custom_fields)
+
+        for encoded_key in self._encoded_keys:
+            if encoded_key in raw:
+                return False
+
+        return True
@@ -0,0 +1,89 @@
+import re
+
+from typing import Any, Callable
+from datetime import datetime
+from functools import lru_cache
+
+
+class DatetimeFilter:
+
+    EPOCH_SECONDS_FORMAT = 'EPOCH_SECONDS'
+    EPOCH_MILLISECONDS_FORMAT = 'EPOCH_MILLISECONDS'
+
+    # Zero padded formats that sort the same as the datetimes they represent.
+    LEXICOGRAPHIC_FORMATS = {
+        '%Y-%m-%dT%H:%M:%S': re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}'),
+        '%Y-%m-%d %H:%M:%S': re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}'),
+        '%Y-%m-%d': re.compile(r'\d{4}-\d{2}-\d{2}'),
+        '%Y%m%d%H%M%S': re.compile(r'\d{14}'),
+    }
+    ISO_FORMATS = {
+        '%Y-%m-%dT%H:%M:%S.%f': re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.(\d{3}|\d{6})'),
+        '%Y-%m-%d %H:%M:%S.%f': re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.(\d{3}|\d{6})'),
+        '%Y-%m-%dT%H:%M:%S%z': re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}[+-]\d{2}:\d{2}'),
+        '%Y-%m-%dT%H:%M:%S.%f%z': re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.(\d{3}|\d{6})[+-]\d{2}:\d{2}'),
+    }
+
+    TIMESTAMPS_CACHE_SIZE = 1024
+
+    def __init__(self, datetime_filter: str, datetime_format: str) -> None:
+        self._datetime_format = datetime_format
+        self._get_timestamp = self._get_timestamp_parser()
+        self._get_cached_timestamp = lru_cache(maxsize=DatetimeFilter.TIMESTAMPS_CACHE_SIZE)(self._get_timestamp)
+        self._filter_timestamp = self._get_timestamp(datetime_filter)
+
+    def get_timestamp(self, datetime_value: Any) -> Any:
+        if isinstance(datetime_value, str):
+            return self._get_cached_timestamp(datetime_value)
+
+        return self._get_timestamp(datetime_value)
+
+    def is_timestamp_greater_or_equal_filter(self, timestamp: Any) -> bool:
+        return timestamp >= self._filter_timestamp
+
+    def _get_timestamp_parser(self) -> Callable[[Any], Any]:
+        if self._datetime_format in (DatetimeFilter.EPOCH_SECONDS_FORMAT, DatetimeFilter.EPOCH_MILLISECONDS_FORMAT):
+            return self._get_epoch_timestamp
+
+        if self._datetime_format in DatetimeFilter.LEXICOGRAPHIC_FORMATS:
+            return self._get_lexicographic_timestamp
+
+        if self._datetime_format in DatetimeFilter.ISO_FORMATS:
+            return self._get_iso_timestamp
+
+        return self._get_strptime_timestamp
+
+    def _get_epoch_timestamp(self, datetime_value: Any) -> float:
+        if isinstance(datetime_value, bool):
+            raise ValueError("{} is not an epoch".format(datetime_value))
+
+        try:
+            return float(datetime_value)
+        except TypeError:
+            raise ValueError("{} is not an epoch".format(datetime_value))
+
+    def _get_lexicographic_timestamp(self, datetime_value: Any) -> str:
+        self._check_is_string(datetime_value)
+
+        if DatetimeFilter.LEXICOGRAPHIC_FORMATS[self._datetime_format].fullmatch(datetime_value) is not None:
+            return datetime_value
+
+        # strptime also accepts values that are not zero padded, so they are padded to be comparable.
+        return datetime.strptime(datetime_value, self._datetime_format).strftime(self._datetime_format)
+
+    def _get_iso_timestamp(self, datetime_value: Any) -> datetime:
+        self._check_is_string(datetime_value)
+
+        if DatetimeFilter.ISO_FORMATS[self._datetime_format].fullmatch(datetime_value) is not None:
+            return datetime.fromisoformat(datetime_value)
+
+        return datetime.strptime(datetime_value, self._datetime_format)
+
+    def _get_strptime_timestamp(self, datetime_value: Any) -> datetime:
+        self._check_is_string(datetime_value)
+
+        return datetime.strptime(datetime_value, self._datetime_format)
+
+    def _check_is_string(self, datetime_value: Any) -> None:
+        if not isinstance(datetime_value, str):
+            raise ValueError("{} is not a string".format(datetime_value))
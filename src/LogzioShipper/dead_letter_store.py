@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import uuid
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, NamedTuple
+
+try:
+    from azure.storage.blob import ContainerClient
+    from azure.core.exceptions import ResourceExistsError
+except ImportError:
+    ContainerClient = None
+    ResourceExistsError = None
+
+
+class DeadLetter(NamedTuple):
+    payload: bytes
+    metadata: Dict[str, Any]
+
+
+class DeadLetterStore(ABC):
+
+    @abstractmethod
+    def put_dead_letter(self, payload: bytes, metadata: Dict[str, Any]) -> str:
+        pass
+
+    @abstractmethod
+    def get_dead_letters_names(self) -> List[str]:
+        pass
+
+    @abstractmethod
+    def get_dead_letter(self, name: str) -> DeadLetter:
+        pass
+
+    @abstractmethod
+    def delete_dead_letter(self, name: str) -> None:
+        pass
+
+    @abstractmethod
+    def quarantine_dead_letter(self, name: str) -> None:
+        pass
+
+    @staticmethod
+    def _get_new_name() -> str:
+        # Names are sorted by their spill time, so the dead letters are replayed in the order they failed.
+        return "{0:020d}-{1}".format(time.time_ns(), uuid.uuid4().hex)
+
+
+class DirectoryDeadLetterStore(DeadLetterStore):
+
+    PAYLOAD_EXTENSION = '.gz'
+    METADATA_EXTENSION = '.json'
+    TEMP_EXTENSION = '.tmp'
+    QUARANTINE_DIRECTORY_NAME = 'quarantine'
+
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+        self._quarantine_directory = os.path.join(directory, DirectoryDeadLetterStore.QUARANTINE_DIRECTORY_NAME)
+
+        os.makedirs(self._quarantine_directory, exist_ok=True)
+
+    def put_dead_letter(self, payload: bytes, metadata: Dict[str, Any]) -> str:
+        name = self._get_new_name()
+
+        # The metadata file is written last, so a dead letter is never listed before its payload is complete.
+        self._write_file(name + DirectoryDeadLetterStore.PAYLOAD_EXTENSION, payload)
+        self._write_file(name + DirectoryDeadLetterStore.METADATA_EXTENSION, json.dumps(metadata).encode('utf-8'))
+
+        return name
+
+    def get_dead_letters_names(self) -> List[str]:
+        return sorted(file_name[:-len(DirectoryDeadLetterStore.METADATA_EXTENSION)]
+                      for file_name in os.listdir(self._directory)
+                      if file_name.endswith(DirectoryDeadLetterStore.METADATA_EXTENSION))
+
+    def get_dead_letter(self, name: str) -> DeadLetter:
+        with open(self._get_path(name + DirectoryDeadLetterStore.PAYLOAD_EXTENSION), 'rb') as payload_file:
+            payload = payload_file.read()
+
+        with open(self._get_path(name + DirectoryDeadLetterStore.METADATA_EXTENSION), 'rb') as metadata_file:
+            metadata = json.loads(metadata_file.read())
+
+        return DeadLetter(payload, metadata)
+
+    def delete_dead_letter(self, name: str) -> None:
+        os.remove(self._get_path(name + DirectoryDeadLetterStore.METADATA_EXTENSION))
+        os.remove(self._get_path(name + DirectoryDeadLetterStore.PAYLOAD_EXTENSION))
+
+    def quarantine_dead_letter(self, name: str) -> None:
+        # The payload is moved first, so a dead letter is never listed without its payload.
+        for extension in (DirectoryDeadLetterStore.PAYLOAD_EXTENSION, DirectoryDeadLetterStore.METADATA_EXTENSION):
+            os.replace(self._get_path(name + extension), os.path.join(self._quarantine_directory, name + extension))
+
+    def _write_file(self, file_name: str, data: bytes) -> None:
+        temp_path = self._get_path(file_name + DirectoryDeadLetterStore.TEMP_EXTENSION)
+
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(data)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        os.replace(temp_path, self._get_path(file_name))
+
+    def _get_path(self, file_name: str) -> str:
+        return os.path.join(self._directory, file_name)
+
+
+class BlobDeadLetterStore(DeadLetterStore):
+
+    METADATA_KEY = 'deadletter'
+    QUARANTINE_PREFIX = 'quarantine/'
+
+    def __init__(self, connection_string: str, container_name: str) -> None:
+        if ContainerClient is None:
+            raise ImportError("azure-storage-blob must be installed to use the blob dead letter store.")
+
+        self._container_client = ContainerClient.from_connection_string(connection_string, container_name)
+
+        try:
+            self._container_client.create_container()
+        except ResourceExistsError:
+            pass
+
+    def put_dead_letter(self, payload: bytes, metadata: Dict[str, Any]) -> str:
+        name = self._get_new_name()
+
+        # Blob metadata values must be ASCII, which json.dumps escapes to by default.
+        self._container_client.upload_blob(name, payload,
+                                           metadata={BlobDeadLetterStore.METADATA_KEY: json.dumps(metadata)})
+
+        return name
+
+    def get_dead_letters_names(self) -> List[str]:
+        return sorted(blob.name for blob in self._container_client.list_blobs()
+                      if not blob.name.startswith(BlobDeadLetterStore.QUARANTINE_PREFIX))
+
+    def get_dead_letter(self, name: str) -> DeadLetter:
+        downloader = self._container_client.download_blob(name)
+        payload = downloader.readall()
+
+        return DeadLetter(payload, json.loads(downloader.properties.metadata[BlobDeadLetterStore.METADATA_KEY]))
+
+    def delete_dead_letter(self, name: str) -> None:
+        self._container_client.delete_blob(name)
+
+    def quarantine_dead_letter(self, name: str) -> None:
+        downloader = self._container_client.download_blob(name)
+
+        self._container_client.upload_blob(BlobDeadLetterStore.QUARANTINE_PREFIX + name, downloader.readall(),
+                                           metadata=downloader.properties.metadata, overwrite=True)
+        self._container_client.delete_blob(name)
@@ -0,0 +1,180 @@
+import logging
+import zlib
+import bz2
+import lzma
+
+from abc import ABC, abstractmethod
+from typing import Generator, Iterable, Optional, Any, List, Type
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class Decompressor(ABC):
+
+    NAME = ''
+    MAGIC_NUMBER = b''
+
+    def __init__(self, chunk_size: int) -> None:
+        self._chunk_size = chunk_size
+
+    class UnavailableDecompressorError(Exception):
+        pass
+
+    @staticmethod
+    def is_available() -> bool:
+        return True
+
+    def decompress(self, chunks: Iterable[bytes]) -> Generator[bytes, None, None]:
+        decompressor = self._create_decompressor()
+        pending_data = b''
+
+        for chunk in chunks:
+            data = pending_data + chunk if pending_data else chunk
+            pending_data = b''
+
+            while data:
+                if decompressor.eof:
+                    if len(data) < len(self.MAGIC_NUMBER) and self.MAGIC_NUMBER.startswith(data):
+                        pending_data = data
+                        break
+
+                    if not data.startswith(self.MAGIC_NUMBER):
+                        logger.warning("Ignoring {0} trailing bytes after the last {1} member.".format(
+                            len(data), self.NAME))
+                        return
+
+                    decompressor = self._create_decompressor()
+
+                yield from self._get_member_decompressed_chunks(decompressor, data)
+
+                data = decompressor.unused_data if decompressor.eof else b''
+
+        if not decompressor.eof:
+            logger.warning("The {} stream ended before the end of the last member.".format(self.NAME))
+            yield self._flush(decompressor)
+
+    @classmethod
+    def is_matching(cls, header: bytes) -> bool:
+        return header.startswith(cls.MAGIC_NUMBER)
+
+    @abstractmethod
+    def _create_decompressor(self) -> Any:
+        pass
+
+    def _get_member_decompressed_chunks(self, decompressor: Any, data: bytes) -> Generator[bytes, None, None]:
+        yield decompressor.decompress(data, self._chunk_size)
+
+        while not decompressor.eof and not decompressor.needs_input:
+            yield decompressor.decompress(b'', self._chunk_size)
+
+    def _flush(self, decompressor: Any) -> bytes:
+        return b''
+
+
+class GzDecompressor(Decompressor):
+
+    NAME = 'gzip'
+    MAGIC_NUMBER = b'\x1f\x8b'
+
+    def _create_decompressor(self) -> Any:
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def _get_member_decompressed_chunks(self, decompressor: Any, data: bytes) -> Generator[bytes, None, None]:
+        while data and not decompressor.eof:
+            yield decompressor.decompress(data, self._chunk_size)
+            data = decompressor.unconsumed_tail
+
+    def _flush(self, decompressor: Any) -> bytes:
+        return decompressor.flush()
+
+
+class Bz2Decompressor(Decompressor):
+
+    NAME = 'bz2'
+    MAGIC_NUMBER = b'BZh'
+    BLOCK_SIZES = b'123456789'
+    BLOCK_MAGIC_NUMBERS = (b'\x31\x41\x59\x26\x53\x59', b'\x17\x72\x45\x38\x50\x90')
+
+    @classmethod
+    def is_matching(cls, header: bytes) -> bool:
+        return (header.startswith(cls.MAGIC_NUMBER) and header[3:4] != b'' and header[3:4] in cls.BLOCK_SIZES
+                and header[4:10] in cls.BLOCK_MAGIC_NUMBERS)
+
+    def _create_decompressor(self) -> Any:
+        return bz2.BZ2Decompressor()
+
+
+class XzDecompressor(Decompressor):
+
+    NAME = 'xz'
+    MAGIC_NUMBER = b'\xfd7zXZ\x00'
+
+    def _create_decompressor(self) -> Any:
+        return lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+
+
+class ZstdDecompressor(Decompressor):
+
+    NAME = 'zstd'
+    MAGIC_NUMBER = b'\x28\xb5\x2f\xfd'
+
+    @staticmethod
+    def is_available() -> bool:
+        return zstandard is not None
+
+    def _create_decompressor(self) -> Any:
+        return zstandard.ZstdDecompressor().decompressobj(write_size=self._chunk_size)
+
+    def _get_member_decompressed_chunks(self, decompressor: Any, data: bytes) -> Generator[bytes, None, None]:
+        yield decompressor.decompress(data)
+
+    def _flush(self, decompressor: Any) -> bytes:
+        return decompressor.flush()
+
+
+class Lz4Decompressor(Decompressor):
+
+    NAME = 'lz4'
+    MAGIC_NUMBER = b'\x04\x22\x4d\x18'
+
+    @staticmethod
+    def is_available() -> bool:
+        return lz4_frame is not None
+
+    def _create_decompressor(self) -> Any:
+        return lz4_frame.LZ4FrameDecompressor()
+
+
+HEADER_SIZE_BYTES = 16
+DECOMPRESSORS: List[Type[Decompressor]] = [GzDecompressor, Bz2Decompressor, XzDecompressor, ZstdDecompressor,
+                                           Lz4Decompressor]
+
+
+def register_decompressor(decompressor: Type[Decompressor]) -> None:
+    DECOMPRESSORS.append(decompressor)
+
+
+def get_decompressor(header: bytes, chunk_size: int) -> Optional[Decompressor]:
+    for decompressor in DECOMPRESSORS:
+        if not decompressor.is_matching(header):
+            continue
+
+        if not decompressor.is_available():
+            raise Decompressor.UnavailableDecompressorError(
+                "The file is compressed with {} but the library for it is not installed.".format(decompressor.NAME))
+
+        return decompressor(chunk_size)
+
+    return None
@@ -1,19 +1,34 @@
 import logging
 import os
 import csv
-import zlib
+import mmap
+import tempfile
 import concurrent.futures
+import itertools
+import json
+import re
+import time
 
-from typing import Optional, Generator, List
+from typing import Optional, Generator, List, Union, IO, Tuple, Type
 from io import BytesIO, IOBase
-from datetime import datetime
 from .file_parser import FileParser
 from .json_parser import JsonParser
+from .json_document_parser import JsonDocumentParser
 from .csv_parser import CsvParser
 from .text_parser import TextParser
 from .consumer_producer_queues import ConsumerProducerQueues
 from .logzio_shipper import LogzioShipper
+from .async_logzio_shipper import AsyncLogzioShipper
 from .custom_field import CustomField
+from .log_record import LogRecord
+from .stream_reader import StreamReader
+from .parallel_parser import ParallelParser
+from .checkpoint_store import CheckpointStore, SqliteCheckpointStore, TableCheckpointStore, BlobCheckpoint
+from .dead_letter_store import DeadLetterStore, DirectoryDeadLetterStore, BlobDeadLetterStore
+from .tail_stream import TailStream
+from .multiline_assembler import MultilineAssembler
+from .blob_skip_rules import BlobSkipRules
+from .remainder_queue import RemainderQueue
 
 
 logger = logging.getLogger(__name__)
@@ -22,15 +37,43 @@ logger.setLevel(logging.INFO)
 
 class FileHandler:
 
-    GZ_MAGIC_NUMBER = b'\x1f\x8b'
-
     FORMAT_ENVIRON_NAME = 'Format'
     LOGZIO_URL_ENVIRON_NAME = 'LogzioURL'
     LOGZIO_TOKEN_ENVIRON_NAME = 'LogzioToken'
     MULTILINE_REGEX_ENVIRON_NAME = 'MultilineRegex'
+    MULTILINE_MODE_ENVIRON_NAME = 'MultilineMode'
+    MULTILINE_MAX_LINES_ENVIRON_NAME = 'MultilineMaxLines'
+    MULTILINE_MAX_BYTES_ENVIRON_NAME = 'MultilineMaxBytes'
     DATETIME_FILTER_ENVIRON_NAME = 'DatetimeFilter'
     DATETIME_FINDER_ENVIRON_NAME = 'DatetimeFinder'
     DATETIME_FORMAT_ENVIRON_NAME = 'DatetimeFormat'
+    STREAMING_INGESTION_ENVIRON_NAME = 'StreamingIngestion'
+    DISK_SPILL_THRESHOLD_ENVIRON_NAME = 'DiskSpillThresholdBytes'
+    PARALLEL_PARSE_WORKERS_ENVIRON_NAME = 'ParallelParseWorkers'
+    CHECKPOINT_STORE_ENVIRON_NAME = 'CheckpointStore'
+    CHECKPOINT_SQLITE_PATH_ENVIRON_NAME = 'CheckpointSqlitePath'
+    CHECKPOINT_CONNECTION_STRING_ENVIRON_NAME = 'CheckpointConnectionString'
+    CHECKPOINT_TABLE_NAME_ENVIRON_NAME = 'CheckpointTableName'
+    APPEND_BLOB_TAILING_ENVIRON_NAME = 'AppendBlobTailing'
+    SORTED_INPUT_ENVIRON_NAME = 'SortedInput'
+    BLOB_INCLUDE_PATTERNS_ENVIRON_NAME = 'BlobIncludePatterns'
+    BLOB_EXCLUDE_PATTERNS_ENVIRON_NAME = 'BlobExcludePatterns'
+    PARTITION_DATETIME_FILTER_ENVIRON_NAME = 'PartitionDatetimeFilter'
+    COMPRESSED_BULK_SIZE_RATIO_ENVIRON_NAME = 'CompressedBulkSizeRatio'
+    MAX_IN_FLIGHT_BYTES_ENVIRON_NAME = 'MaxInFlightBytes'
+    MAX_IN_FLIGHT_BULKS_ENVIRON_NAME = 'MaxInFlightBulks'
+    SHIPPING_BACKEND_ENVIRON_NAME = 'ShippingBackend'
+    MAX_REQUESTS_PER_SECOND_ENVIRON_NAME = 'MaxRequestsPerSecond'
+    MAX_BYTES_PER_SECOND_ENVIRON_NAME = 'MaxBytesPerSecond'
+    DEAD_LETTER_STORE_ENVIRON_NAME = 'DeadLetterStore'
+    DEAD_LETTER_DIRECTORY_ENVIRON_NAME = 'DeadLetterDirectory'
+    DEAD_LETTER_CONNECTION_STRING_ENVIRON_NAME = 'DeadLetterConnectionString'
+    DEAD_LETTER_CONTAINER_NAME_ENVIRON_NAME = 'DeadLetterContainerName'
+    PROCESSING_DEADLINE_ENVIRON_NAME = 'ProcessingDeadlineSeconds'
+    REMAINDER_QUEUE_DIRECTORY_ENVIRON_NAME = 'RemainderQueueDirectory'
+    JSON_DOCUMENT_MODE_ENVIRON_NAME = 'JsonDocumentMode'
+    JSON_ENVELOPE_PATH_ENVIRON_NAME = 'JsonEnvelopePath'
+    FUNCTION_STORAGE_CONNECTION_STRING_ENVIRON_NAME = 'AzureWebJobsStorage'
 
     JSON_FORMAT_VALUE = 'JSON'
     CSV_FORMAT_VALUE = 'CSV'
@@ -39,27 +82,111 @@ class FileHandler:
     NO_DATETIME_FILTER_VALUE = 'NO_DATETIME_FILTER'
     NO_DATETIME_FINDER_VALUE = 'NO_DATETIME_FINDER'
     NO_DATETIME_FORMAT_VALUE = 'NO_DATETIME_FORMAT'
+    NO_DISK_SPILL_VALUE = 'NO_DISK_SPILL'
+    NO_PARALLEL_PARSE_VALUE = 'NO_PARALLEL_PARSE'
+    NO_CHECKPOINT_VALUE = 'NO_CHECKPOINT'
+    NO_DEAD_LETTER_VALUE = 'NO_DEAD_LETTER'
+    NO_PATTERNS_VALUE = 'NO_PATTERNS'
+    NO_ENVELOPE_PATH_VALUE = 'NO_ENVELOPE_PATH'
+    NO_COMPRESSED_BULK_SIZE_RATIO_VALUE = 'NO_COMPRESSED_BULK_SIZE_RATIO'
+    NO_RATE_LIMIT_VALUE = 'NO_RATE_LIMIT'
+    NO_DEADLINE_VALUE = 'NO_DEADLINE'
+    NO_REMAINDER_QUEUE_VALUE = 'NO_REMAINDER_QUEUE'
+    FUNCTION_TIMEOUT_DEADLINE_VALUE = 'FUNCTION_TIMEOUT'
+    THREADS_SHIPPING_BACKEND_VALUE = 'THREADS'
+    ASYNCIO_SHIPPING_BACKEND_VALUE = 'ASYNCIO'
+    SQLITE_CHECKPOINT_VALUE = 'SQLITE'
+    TABLE_CHECKPOINT_VALUE = 'TABLE'
+    DIRECTORY_DEAD_LETTER_VALUE = 'DIRECTORY'
+    BLOB_DEAD_LETTER_VALUE = 'BLOB'
+    DEFAULT_CHECKPOINT_SQLITE_PATH = os.path.join(tempfile.gettempdir(), 'logzio_checkpoints.db')
+    DEFAULT_CHECKPOINT_TABLE_NAME = 'LogzioCheckpoints'
+    DEFAULT_DEAD_LETTER_DIRECTORY = os.path.join(tempfile.gettempdir(), 'logzio_dead_letters')
+    DEFAULT_DEAD_LETTER_CONTAINER_NAME = 'logzio-dead-letters'
+    DEFAULT_MAX_IN_FLIGHT_BYTES = 64 * 1024 * 1024      # 64 MB
+    DEFAULT_MAX_IN_FLIGHT_BULKS = 10
+    HOST_JSON_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'host.json')
+    FUNCTION_TIMEOUT_REGEX = re.compile(r'(?:(\d+)\.)?(\d+):(\d+):(\d+(?:\.\d+)?)')
+    # The rest of the function timeout is left for waiting for the sent bulks and queuing the remainder.
+    FUNCTION_TIMEOUT_DEADLINE_RATIO = 0.8
+    MAX_REMAINDER_ATTEMPTS = 5
+    # The queued remainders can't take more than this part of the time that is left, so the file of the invocation
+    # is processed too.
+    REMAINDERS_DEADLINE_RATIO = 0.5
+    DEAD_LETTERS_DEADLINE_RATIO = 0.5
+    TRUE_VALUE = 'true'
+    FALSE_VALUE = 'false'
 
     VERSION = '1.0.6'
 
-    def __init__(self, file_name: str, file_stream: IOBase, file_size: int) -> None:
+    def __init__(self, file_name: str, file_stream: IOBase, file_size: int, etag: Optional[str] = None,
+                 start_offset: Optional[int] = None, deadline: Optional[float] = None,
+                 is_remainder: bool = False) -> None:
         self._file_name = file_name
-        self._file_stream = self._get_seekable_file_stream(file_stream)
         self._file_size = file_size
-        self._datetime_filter = self._get_datetime_filter()
-        self._datetime_finder = self._get_datetime_finder()
-        self._datetime_format = self._get_datetime_format()
-        self._is_default_file_parser = False
+        self._etag = etag
+        self._deadline = deadline if deadline is not None else FileHandler.get_processing_deadline()
+        self._is_deadline_reached = False
+        self._is_remainder = is_remainder
+        self._stopped_offset: Optional[int] = None
+        self._start_offset = 0
+        self._is_streaming_ingestion = self._get_is_streaming_ingestion()
+        self._disk_spill_threshold = self._get_disk_spill_threshold()
+        self._spill_file: Optional[IO[bytes]] = None
         self._file_format = os.environ[FileHandler.FORMAT_ENVIRON_NAME]
-        self._file_parser = self._get_file_parser()
-        self._consumer_producer_queues = ConsumerProducerQueues()
-        self._logzio_shipper = LogzioShipper(os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME],
-                                             os.environ[FileHandler.LOGZIO_TOKEN_ENVIRON_NAME],
-                                             self._consumer_producer_queues,
-                                             FileHandler.VERSION)
-        self._custom_fields = [CustomField(field_key='file', field_value=self._file_name)]
+        self._checkpoint_store = self._get_checkpoint_store()
+        self._tail_stream = self._get_tail_stream(file_stream)
+        self._file_stream = self._get_file_stream(file_stream if self._tail_stream is None else self._tail_stream)
 
-        self._add_custom_fields_to_logzio_shipper()
+        # The spill file is closed if the handler fails to be created, since handle_file is not called to close it.
+        try:
+            self._datetime_filter = self._get_datetime_filter()
+            self._datetime_finder = self._get_datetime_finder()
+            self._datetime_format = self._get_datetime_format()
+            self._is_default_file_parser = False
+            self._file_parser = self._get_file_parser()
+            self._max_in_flight_bytes = self._get_positive_number(FileHandler.MAX_IN_FLIGHT_BYTES_ENVIRON_NAME,
+                                                                  FileHandler.DEFAULT_MAX_IN_FLIGHT_BYTES)
+            self._consumer_producer_queues = ConsumerProducerQueues(self._max_in_flight_bytes)
+            self._logzio_shipper = self._get_logzio_shipper_class()(
+                os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME],
+                os.environ[FileHandler.LOGZIO_TOKEN_ENVIRON_NAME],
+                self._consumer_producer_queues,
+                FileHandler.VERSION,
+                self._get_compressed_bulk_size_ratio(),
+                self._max_in_flight_bytes,
+                self._get_positive_number(FileHandler.MAX_IN_FLIGHT_BULKS_ENVIRON_NAME,
+                                          FileHandler.DEFAULT_MAX_IN_FLIGHT_BULKS),
+                self._get_rate_limit(FileHandler.MAX_REQUESTS_PER_SECOND_ENVIRON_NAME),
+                self._get_rate_limit(FileHandler.MAX_BYTES_PER_SECOND_ENVIRON_NAME))
+            self._dead_letter_store = self._get_dead_letter_store()
+            self._custom_fields = [CustomField(field_key='file', field_value=self._file_name)]
+            self._parallel_parser = self._get_parallel_parser()
+
+            self._checkpoint = self._get_blob_checkpoint()
+            self._deadline = self._get_resumable_deadline()
+
+            if self._parallel_parser is None:
+                self._add_custom_fields_to_logzio_shipper()
+
+            if self._dead_letter_store is not None:
+                self._logzio_shipper.set_dead_letter_store(self._dead_letter_store, self._file_name)
+
+            if self._checkpoint is not None:
+                self._resume_from_checkpoint()
+
+            if self._get_is_sorted_input():
+                self._skip_to_datetime_filter()
+
+            if start_offset is not None:
+                self._set_start_offset(start_offset)
+        except Exception:
+            self._close_file_stream()
+            raise
+
+    @property
+    def stopped_offset(self) -> Optional[int]:
+        return self._stopped_offset
 
     @property
     def file_parser(self) -> FileParser:
@@ -75,74 +202,369 @@ class FileHandler:
     class FailedToSendLogsError(Exception):
         pass
 
-    def handle_file(self) -> None:
-        if self._file_size == 0:
-            logger.info("The file {} is empty.".format(self._file_name))
+    class DeadlineReachedError(Exception):
+        pass
+
+    @staticmethod
+    def get_processing_deadline() -> Optional[float]:
+        processing_deadline = os.environ.get(FileHandler.PROCESSING_DEADLINE_ENVIRON_NAME,
+                                             FileHandler.FUNCTION_TIMEOUT_DEADLINE_VALUE)
+
+        if processing_deadline == FileHandler.NO_DEADLINE_VALUE:
+            return None
+
+        if processing_deadline == FileHandler.FUNCTION_TIMEOUT_DEADLINE_VALUE:
+            function_timeout_seconds = FileHandler._get_function_timeout_seconds()
+
+            if function_timeout_seconds is None:
+                return None
+
+            return time.monotonic() + function_timeout_seconds * FileHandler.FUNCTION_TIMEOUT_DEADLINE_RATIO
+
+        try:
+            deadline_seconds = float(processing_deadline)
+        except ValueError:
+            deadline_seconds = 0
+
+        if deadline_seconds <= 0:
+            logger.error("Processing deadline {} is not a positive number of seconds. Processing has no "
+                         "deadline.".format(processing_deadline))
+            return None
+
+        return time.monotonic() + deadline_seconds
+
+    @staticmethod
+    def _get_partial_deadline(deadline: Optional[float], ratio: float) -> Optional[float]:
+        if deadline is None:
+            return None
+
+        return time.monotonic() + max(deadline - time.monotonic(), 0) * ratio
+
+    @staticmethod
+    def handle_remainders(deadline: Optional[float]) -> None:
+        remainder_queue = FileHandler._get_remainder_queue()
+
+        if remainder_queue is None:
+            return
+
+        deadline = FileHandler._get_partial_deadline(deadline, FileHandler.REMAINDERS_DEADLINE_RATIO)
+
+        while deadline is None or time.monotonic() < deadline:
+            try:
+                remainder = remainder_queue.claim_remainder()
+            except Exception as e:
+                logger.error("Failed to claim a remainder of a file - {}".format(e))
+                return
+
+            if remainder is None:
+                return
+
+            FileHandler._handle_remainder(remainder_queue, remainder[0], remainder[1], deadline)
+
+    @staticmethod
+    def _get_remainder_queue() -> Optional[RemainderQueue]:
+        remainder_queue_directory = os.environ.get(FileHandler.REMAINDER_QUEUE_DIRECTORY_ENVIRON_NAME,
+                                                   FileHandler.NO_REMAINDER_QUEUE_VALUE)
+
+        if remainder_queue_directory == FileHandler.NO_REMAINDER_QUEUE_VALUE:
+            return None
+
+        return RemainderQueue(remainder_queue_directory)
+
+    @staticmethod
+    def _get_function_timeout_seconds() -> Optional[float]:
+        try:
+            with open(FileHandler.HOST_JSON_PATH, 'r') as host_json_file:
+                function_timeout = json.load(host_json_file).get('functionTimeout')
+        except (OSError, ValueError):
+            return None
+
+        if function_timeout is None:
+            return None
+
+        # An unlimited timeout is -1, which doesn't match.
+        match = FileHandler.FUNCTION_TIMEOUT_REGEX.fullmatch(function_timeout)
+
+        if match is None:
+            return None
+
+        days, hours, minutes, seconds = match.groups()
+
+        return ((int(days or 0) * 24 + int(hours)) * 60 + int(minutes)) * 60 + float(seconds)
+
+    @staticmethod
+    def _handle_remainder(remainder_queue: RemainderQueue, remainder_name: str, metadata: dict,
+                          deadline: Optional[float]) -> None:
+        logger.info("Continues processing file {0} from offset {1}.".format(metadata['file_name'],
+                                                                          metadata['offset']))
+
+        try:
+            data_path = remainder_queue.get_data_path(remainder_name)
+
+            with open(data_path, 'rb') as remainder_stream:
+                file_handler = FileHandler(metadata['file_name'], remainder_stream, os.path.getsize(data_path),
+                                           metadata['etag'], metadata['offset'], deadline, is_remainder=True)
+                file_handler.handle_file()
+
+            if file_handler.stopped_offset is not None:
+                FileHandler._requeue_remainder(remainder_queue, remainder_name, metadata, file_handler.stopped_offset)
+                return
+        except FileHandler.DefaultParserError as e:
+            logger.error(e)
+        except Exception as e:
+            attempts = metadata['attempts'] + 1
+
+            if attempts < FileHandler.MAX_REMAINDER_ATTEMPTS:
+                logger.error("Failed to process the rest of file {0}, it will be processed again - {1}".format(
+                    metadata['file_name'], e))
+                remainder_queue.release_remainder(remainder_name, dict(metadata, attempts=attempts))
+                return
+
+            logger.error("Failed to process the rest of file {0} {1} times. Giving up on it - {2}".format(
+                metadata['file_name'], attempts, e))
+
+        remainder_queue.delete_remainder(remainder_name)
+
+    @staticmethod
+    def _requeue_remainder(remainder_queue: RemainderQueue, remainder_name: str, metadata: dict,
+                           offset: int) -> None:
+        # A remainder that delivered nothing before its deadline uses up an attempt, so it is not queued forever.
+        attempts = metadata['attempts'] + 1 if offset <= metadata['offset'] else 0
+
+        if attempts >= FileHandler.MAX_REMAINDER_ATTEMPTS:
+            logger.error("The rest of file {0} was not processed from offset {1} {2} times. Giving up on it.".format(
+                metadata['file_name'], offset, attempts))
+            remainder_queue.delete_remainder(remainder_name)
             return
 
-        logging.info("Starts processing file - {}".format(self._file_name))
+        # The data of the remainder is the same, so only its offset is updated.
+        remainder_queue.release_remainder(remainder_name, dict(metadata, offset=offset, attempts=attempts))
+        logger.info("Processing deadline was reached. The rest of file {0} from offset {1} was queued again as "
+                    "{2}.".format(metadata['file_name'], offset, remainder_name))
+
+    @staticmethod
+    def is_file_skipped(file_name: str, file_size: int) -> bool:
+        skip_reason = FileHandler._get_blob_skip_rules().get_skip_reason(file_name, file_size)
+
+        if skip_reason is None:
+            return False
+
+        logger.info("{} Skipping it.".format(skip_reason))
+        return True
+
+    @staticmethod
+    def _get_blob_skip_rules() -> BlobSkipRules:
+        include_patterns = FileHandler._get_blob_patterns(FileHandler.BLOB_INCLUDE_PATTERNS_ENVIRON_NAME)
+        exclude_patterns = FileHandler._get_blob_patterns(FileHandler.BLOB_EXCLUDE_PATTERNS_ENVIRON_NAME)
+        is_partition_datetime_filter = os.environ.get(FileHandler.PARTITION_DATETIME_FILTER_ENVIRON_NAME,
+                                                      FileHandler.FALSE_VALUE)
+        datetime_filter = os.environ.get(FileHandler.DATETIME_FILTER_ENVIRON_NAME, FileHandler.NO_DATETIME_FILTER_VALUE)
+        datetime_format = os.environ.get(FileHandler.DATETIME_FORMAT_ENVIRON_NAME, FileHandler.NO_DATETIME_FORMAT_VALUE)
+
+        if (is_partition_datetime_filter.lower() != FileHandler.TRUE_VALUE
+                or datetime_filter == FileHandler.NO_DATETIME_FILTER_VALUE
+                or datetime_format == FileHandler.NO_DATETIME_FORMAT_VALUE):
+            return BlobSkipRules(include_patterns, exclude_patterns)
 
         try:
+            filter_datetime = BlobSkipRules.get_filter_datetime(datetime_filter, datetime_format)
+        except ValueError:
+            logger.error("datetime filter {0} does not match datetime format {1}. Partition datetime filter is "
+                         "disabled.".format(datetime_filter, datetime_format))
+            return BlobSkipRules(include_patterns, exclude_patterns)
+
+        return BlobSkipRules(include_patterns, exclude_patterns, filter_datetime)
+
+    @staticmethod
+    def _get_blob_patterns(environ_name: str) -> List[str]:
+        blob_patterns = os.environ.get(environ_name, FileHandler.NO_PATTERNS_VALUE)
+
+        if blob_patterns == FileHandler.NO_PATTERNS_VALUE:
+            return []
+
+        return [blob_pattern.strip() for blob_pattern in blob_patterns.split(',') if blob_pattern.strip()]
+
+    def handle_file(self) -> None:
+        try:
+            if self._file_size == 0:
+                logger.info("The file {} is empty.".format(self._file_name))
+                return
+
+            logging.info("Starts processing file - {}".format(self._file_name))
+
+            # Bulks that failed in previous invocations are sent before the logs of this file, within a part of the
+            # time left, so the file itself is still processed before the deadline.
+            self._logzio_shipper.replay_dead_letters(
+                self._get_partial_deadline(self._deadline, FileHandler.DEAD_LETTERS_DEADLINE_RATIO))
             self._send_logs_to_logzio()
         except Exception:
             raise
+        finally:
+            self._close_file_stream()
+
+        if self._is_deadline_reached:
+            logger.info("Partially processed file - {}, the remainder was queued.".format(self._file_name))
+            return
 
         logger.info("Successfully finished processing file - {}".format(self._file_name))
 
+    def _get_tail_stream(self, file_stream: IOBase) -> Optional[TailStream]:
+        is_append_blob_tailing = os.environ.get(FileHandler.APPEND_BLOB_TAILING_ENVIRON_NAME, FileHandler.FALSE_VALUE)
+
+        if is_append_blob_tailing.lower() != FileHandler.TRUE_VALUE:
+            return None
+
+        if self._checkpoint_store is None:
+            logger.error("Append blob tailing requires a checkpoint store. Processing the whole file.")
+            return None
+
+        if self._file_format == FileHandler.CSV_FORMAT_VALUE:
+            logger.info("Append blob tailing is not supported in CSV format. Processing the whole file.")
+            return None
+
+        try:
+            return TailStream(file_stream, self._file_size, self._checkpoint_store.get_tail_state(self._file_name))
+        except TailStream.RewrittenBlobError:
+            self._checkpoint_store.delete_tail_state(self._file_name)
+            raise
+
+    def _get_file_stream(self, file_stream: IOBase) -> Union[BytesIO, StreamReader, IO[bytes], mmap.mmap]:
+        if self._is_streaming_ingestion:
+            return self._get_stream_reader(file_stream)
+
+        if self._disk_spill_threshold is not None:
+            return self._get_disk_spill_file_stream(file_stream)
+
+        return self._get_seekable_file_stream(file_stream)
+
+    def _get_disk_spill_file_stream(self, file_stream: IOBase) -> Union[IO[bytes], mmap.mmap]:
+        if self._file_size > self._disk_spill_threshold:
+            self._spill_file = tempfile.TemporaryFile()
+        else:
+            self._spill_file = tempfile.SpooledTemporaryFile(max_size=self._disk_spill_threshold)
+
+        self._copy_stream(self._get_stream_reader(file_stream), self._spill_file)
+
+        if self._spill_file.tell() <= self._disk_spill_threshold:
+            self._spill_file.seek(0)
+            return self._spill_file
+
+        self._spill_file.flush()
+        logger.info("File {0} is bigger than {1} bytes, reading it from disk.".format(self._file_name,
+                                                                                   self._disk_spill_threshold))
+
+        return mmap.mmap(self._spill_file.fileno(), 0, access=mmap.ACCESS_READ)
+
     def _get_seekable_file_stream(self, file_stream: IOBase) -> BytesIO:
         seekable_file_stream = BytesIO()
 
-        for line in file_stream:
-            seekable_file_stream.write(line)
-
+        self._copy_stream(self._get_stream_reader(file_stream), seekable_file_stream)
         seekable_file_stream.seek(0)
 
-        if not self._is_gz_file(seekable_file_stream):
-            return self._get_seekable_stream_without_empty_lines(seekable_file_stream)
+        return seekable_file_stream
 
-        seekable_decompressed_gz_file_stream = self._get_seekable_decompressed_gz_file_stream(seekable_file_stream)
-        return self._get_seekable_stream_without_empty_lines(seekable_decompressed_gz_file_stream)
+    def _get_stream_reader(self, file_stream: IOBase) -> StreamReader:
+        # A json document is parsed as is, so it is read by chunks and not by lines. A csv file keeps its empty lines,
+        # since they may be inside quoted values, and the csv reader skips the ones that are empty rows.
+        is_empty_lines_kept = ((self._file_format == FileHandler.JSON_FORMAT_VALUE and self._get_is_json_document_mode())
+                               or self._file_format == FileHandler.CSV_FORMAT_VALUE)
 
-    def _is_gz_file(self, seekable_file_stream: BytesIO) -> bool:
-        is_gz_file = False
+        return StreamReader(file_stream, is_empty_lines_kept=is_empty_lines_kept)
 
-        if seekable_file_stream.read(2) == FileHandler.GZ_MAGIC_NUMBER:
-            is_gz_file = True
+    @staticmethod
+    def _copy_stream(stream_reader: StreamReader, file_stream: IO[bytes]) -> None:
+        while True:
+            data = stream_reader.read(StreamReader.CHUNK_SIZE_BYTES)
 
-        seekable_file_stream.seek(0)
+            if not data:
+                return
 
-        return is_gz_file
+            file_stream.write(data)
 
-    def _get_seekable_decompressed_gz_file_stream(self, seekable_file_stream: BytesIO) -> BytesIO:
-        seekable_decompressed_gz_file_stream = BytesIO()
-        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    def _get_is_streaming_ingestion(self) -> bool:
+        is_streaming_ingestion = os.environ.get(FileHandler.STREAMING_INGESTION_ENVIRON_NAME, FileHandler.FALSE_VALUE)
 
-        for line in seekable_file_stream:
-            decompressed_lines = decompressor.decompress(line).decode("utf-8")
-            new_lines_num = decompressed_lines.count('\n')
+        return is_streaming_ingestion.lower() == FileHandler.TRUE_VALUE
 
-            for decompressed_line in decompressed_lines.splitlines():
-                if new_lines_num > 0:
-                    seekable_decompressed_gz_file_stream.write(str.encode(decompressed_line + '\n'))
-                    new_lines_num -= 1
-                else:
-                    seekable_decompressed_gz_file_stream.write(str.encode(decompressed_line))
+    def _get_disk_spill_threshold(self) -> Optional[int]:
+        disk_spill_threshold = os.environ.get(FileHandler.DISK_SPILL_THRESHOLD_ENVIRON_NAME,
+                                              FileHandler.NO_DISK_SPILL_VALUE)
 
-        seekable_decompressed_gz_file_stream.seek(0)
+        if disk_spill_threshold == FileHandler.NO_DISK_SPILL_VALUE:
+            return None
 
-        return seekable_decompressed_gz_file_stream
+        try:
+            disk_spill_threshold_bytes = int(disk_spill_threshold)
+        except ValueError:
+            logger.error("Disk spill threshold {} is not a number. Disk spill is disabled.".format(
+                disk_spill_threshold))
+            return None
 
-    def _get_seekable_stream_without_empty_lines(self, seekable_file_stream: BytesIO) -> BytesIO:
-        seekable_file_stream_without_empty_lines = BytesIO()
+        if disk_spill_threshold_bytes <= 0:
+            logger.error("Disk spill threshold {} is not a positive number. Disk spill is disabled.".format(
+                disk_spill_threshold))
+            return None
 
-        for line in seekable_file_stream:
-            if line.decode("utf-8").rstrip() == '':
-                continue
+        return disk_spill_threshold_bytes
+
+    def _close_file_stream(self) -> None:
+        if self._spill_file is None:
+            return
+
+        if isinstance(self._file_stream, mmap.mmap):
+            self._file_stream.close()
+
+        self._spill_file.close()
+
+    def _get_logzio_shipper_class(self) -> Type[LogzioShipper]:
+        shipping_backend = os.environ.get(FileHandler.SHIPPING_BACKEND_ENVIRON_NAME,
+                                          FileHandler.THREADS_SHIPPING_BACKEND_VALUE)
+
+        if shipping_backend == FileHandler.ASYNCIO_SHIPPING_BACKEND_VALUE:
+            return AsyncLogzioShipper
+
+        if shipping_backend != FileHandler.THREADS_SHIPPING_BACKEND_VALUE:
+            logger.error("Shipping backend {0} is not supported. Using {1}.".format(
+                shipping_backend, FileHandler.THREADS_SHIPPING_BACKEND_VALUE))
+
+        return LogzioShipper
 
-            seekable_file_stream_without_empty_lines.write(line)
-        
-        seekable_file_stream_without_empty_lines.seek(0)
-        return seekable_file_stream_without_empty_lines
+    def _get_compressed_bulk_size_ratio(self) -> Optional[float]:
+        compressed_bulk_size_ratio = os.environ.get(FileHandler.COMPRESSED_BULK_SIZE_RATIO_ENVIRON_NAME,
+                                                    FileHandler.NO_COMPRESSED_BULK_SIZE_RATIO_VALUE)
+
+        if compressed_bulk_size_ratio == FileHandler.NO_COMPRESSED_BULK_SIZE_RATIO_VALUE:
+            return None
+
+        try:
+            ratio = float(compressed_bulk_size_ratio)
+        except ValueError:
+            ratio = None
+
+        if ratio is None or not 0 < ratio <= 1:
+            logger.error("Compressed bulk size ratio {} is not a number between 0 and 1. Bulks are limited by their "
+                         "uncompressed size.".format(compressed_bulk_size_ratio))
+            return None
+
+        return ratio
+
+    def _get_rate_limit(self, environ_name: str) -> Optional[float]:
+        rate_limit = os.environ.get(environ_name, FileHandler.NO_RATE_LIMIT_VALUE)
+
+        if rate_limit == FileHandler.NO_RATE_LIMIT_VALUE:
+            return None
+
+        try:
+            rate = float(rate_limit)
+        except ValueError:
+            rate = 0
+
+        if rate <= 0:
+            logger.error("{0} {1} is not a positive number. Sending is not rate limited by it.".format(environ_name,
+                                                                                                     rate_limit))
+            return None
+
+        return rate
 
     def _get_multiline_regex(self) -> Optional[str]:
         multiline_regex = os.environ[FileHandler.MULTILINE_REGEX_ENVIRON_NAME]
@@ -152,6 +574,31 @@ class FileHandler:
 
         return multiline_regex
 
+    def _get_multiline_mode(self) -> str:
+        multiline_mode = os.environ.get(FileHandler.MULTILINE_MODE_ENVIRON_NAME, MultilineAssembler.FULL_MATCH_MODE)
+
+        if multiline_mode not in MultilineAssembler.MODES:
+            logger.error("Multiline mode {0} is not one of {1}. Using {2} mode.".format(
+                multiline_mode, ', '.join(MultilineAssembler.MODES), MultilineAssembler.FULL_MATCH_MODE))
+            return MultilineAssembler.FULL_MATCH_MODE
+
+        return multiline_mode
+
+    def _get_positive_number(self, environ_name: str, default_number: int) -> int:
+        positive_number = os.environ.get(environ_name, str(default_number))
+
+        try:
+            number = int(positive_number)
+        except ValueError:
+            number = 0
+
+        if number <= 0:
+            logger.error("{0} {1} is not a positive number. Using {2}.".format(environ_name, positive_number,
+                                                                            default_number))
+            return default_number
+
+        return number
+
     def _get_datetime_filter(self) -> Optional[str]:
         datetime_filter = os.environ[FileHandler.DATETIME_FILTER_ENVIRON_NAME]
 
@@ -177,17 +624,18 @@ class FileHandler:
         return datetime_format
 
     def _get_file_parser(self) -> FileParser:
-        logs_sample = [self._file_stream.readline().decode("utf-8").rstrip(),
-                       self._file_stream.readline().decode("utf-8").rstrip()]
-
-        self._file_stream.seek(0)
-
         if self._file_format == FileHandler.JSON_FORMAT_VALUE:
             self._write_is_datetime_filter_enabled()
+
+            if self._get_is_json_document_mode():
+                return JsonDocumentParser(self._file_stream, self._get_json_envelope_path(), self._datetime_finder,
+                                          self._datetime_format)
+
             return JsonParser(self._file_stream, self._datetime_finder, self._datetime_format)
 
         if self._file_format == FileHandler.CSV_FORMAT_VALUE:
-            delimiter = self._get_csv_delimiter(logs_sample)
+            # Only csv needs a sample, and peeking lines would hold a json document that is one line in memory.
+            delimiter = self._get_csv_delimiter(self._get_logs_sample())
 
             if delimiter is not None:
                 self._write_is_datetime_filter_enabled()
@@ -200,7 +648,194 @@ class FileHandler:
         multiline_regex = self._get_multiline_regex()
         self._write_is_datetime_filter_enabled()
 
-        return TextParser(self._file_stream, multiline_regex, self._datetime_finder, self._datetime_format)
+        return TextParser(self._file_stream, multiline_regex, self._datetime_finder, self._datetime_format,
+                          self._get_multiline_mode(),
+                          self._get_positive_number(FileHandler.MULTILINE_MAX_LINES_ENVIRON_NAME,
+                                                    MultilineAssembler.MAX_LINES),
+                          self._get_positive_number(FileHandler.MULTILINE_MAX_BYTES_ENVIRON_NAME,
+                                                    MultilineAssembler.MAX_BYTES))
+
+    def _get_is_json_document_mode(self) -> bool:
+        is_json_document_mode = os.environ.get(FileHandler.JSON_DOCUMENT_MODE_ENVIRON_NAME, FileHandler.FALSE_VALUE)
+
+        return is_json_document_mode.lower() == FileHandler.TRUE_VALUE
+
+    def _get_json_envelope_path(self) -> Optional[List[str]]:
+        json_envelope_path = os.environ.get(FileHandler.JSON_ENVELOPE_PATH_ENVIRON_NAME,
+                                            FileHandler.NO_ENVELOPE_PATH_VALUE)
+
+        if json_envelope_path == FileHandler.NO_ENVELOPE_PATH_VALUE:
+            return None
+
+        return json_envelope_path.split('.')
+
+    def _get_logs_sample(self) -> List[str]:
+        # The empty lines of a csv file are kept in the stream, but they are not part of the sample.
+        if self._is_streaming_ingestion:
+            peeked_lines_num = 2
+
+            while True:
+                lines = self._file_stream.peek_lines(peeked_lines_num)
+                sample_lines = [line for line in lines if line.strip()][:2]
+
+                if len(sample_lines) == 2 or len(lines) < peeked_lines_num:
+                    break
+
+                peeked_lines_num *= 2
+        else:
+            sample_lines = []
+
+            while len(sample_lines) < 2:
+                line = self._file_stream.readline()
+
+                if line == b'':
+                    break
+
+                if line.strip():
+                    sample_lines.append(line)
+
+            self._file_stream.seek(0)
+
+        sample_lines += [b''] * (2 - len(sample_lines))
+
+        return [line.decode("utf-8").rstrip() for line in sample_lines]
+
+    def _get_parallel_parser(self) -> Optional[ParallelParser]:
+        parallel_parse_workers = os.environ.get(FileHandler.PARALLEL_PARSE_WORKERS_ENVIRON_NAME,
+                                                FileHandler.NO_PARALLEL_PARSE_VALUE)
+
+        if parallel_parse_workers == FileHandler.NO_PARALLEL_PARSE_VALUE:
+            return None
+
+        try:
+            workers_num = int(parallel_parse_workers)
+        except ValueError:
+            workers_num = 0
+
+        if workers_num <= 0:
+            logger.error("Parallel parse workers {} is not a positive number. Parallel parsing is disabled.".format(
+                parallel_parse_workers))
+            return None
+
+        if self._is_streaming_ingestion:
+            logger.info('Parallel parsing is disabled with streaming ingestion.')
+            return None
+
+        if isinstance(self._file_parser, JsonParser):
+            file_parser_kwargs = {}
+        elif isinstance(self._file_parser, TextParser) and self._file_parser.multiline_regex is None:
+            file_parser_kwargs = {'multiline_regex': None}
+        else:
+            logger.info('Parallel parsing is supported only in JSON and non multiline TEXT formats, and not in JSON '
+                        'document mode.')
+            return None
+
+        if not self._is_default_file_parser:
+            file_parser_kwargs['datetime_finder'] = self._datetime_finder
+            file_parser_kwargs['datetime_format'] = self._datetime_format
+
+        logger.info('Parallel parsing is enabled with {} workers.'.format(workers_num))
+
+        return ParallelParser(self._file_stream, workers_num, type(self._file_parser), file_parser_kwargs,
+                              self._datetime_filter, self._custom_fields)
+
+    def _get_checkpoint_store(self) -> Optional[CheckpointStore]:
+        checkpoint_store = os.environ.get(FileHandler.CHECKPOINT_STORE_ENVIRON_NAME, FileHandler.NO_CHECKPOINT_VALUE)
+
+        try:
+            if checkpoint_store == FileHandler.SQLITE_CHECKPOINT_VALUE:
+                return SqliteCheckpointStore(os.environ.get(FileHandler.CHECKPOINT_SQLITE_PATH_ENVIRON_NAME,
+                                                            FileHandler.DEFAULT_CHECKPOINT_SQLITE_PATH))
+
+            if checkpoint_store == FileHandler.TABLE_CHECKPOINT_VALUE:
+                connection_string = os.environ.get(
+                    FileHandler.CHECKPOINT_CONNECTION_STRING_ENVIRON_NAME,
+                    os.environ.get(FileHandler.FUNCTION_STORAGE_CONNECTION_STRING_ENVIRON_NAME))
+                return TableCheckpointStore(connection_string,
+                                            os.environ.get(FileHandler.CHECKPOINT_TABLE_NAME_ENVIRON_NAME,
+                                                           FileHandler.DEFAULT_CHECKPOINT_TABLE_NAME))
+        except Exception as e:
+            logger.error("Failed to create checkpoint store. Checkpoints are disabled - {}".format(e))
+            return None
+
+        if checkpoint_store != FileHandler.NO_CHECKPOINT_VALUE:
+            logger.error("Checkpoint store {} is not supported. Checkpoints are disabled.".format(checkpoint_store))
+
+        return None
+
+    def _get_dead_letter_store(self) -> Optional[DeadLetterStore]:
+        dead_letter_store = os.environ.get(FileHandler.DEAD_LETTER_STORE_ENVIRON_NAME,
+                                           FileHandler.NO_DEAD_LETTER_VALUE)
+
+        try:
+            if dead_letter_store == FileHandler.DIRECTORY_DEAD_LETTER_VALUE:
+                return DirectoryDeadLetterStore(os.environ.get(FileHandler.DEAD_LETTER_DIRECTORY_ENVIRON_NAME,
+                                                               FileHandler.DEFAULT_DEAD_LETTER_DIRECTORY))
+
+            if dead_letter_store == FileHandler.BLOB_DEAD_LETTER_VALUE:
+                connection_string = os.environ.get(
+                    FileHandler.DEAD_LETTER_CONNECTION_STRING_ENVIRON_NAME,
+                    os.environ.get(FileHandler.FUNCTION_STORAGE_CONNECTION_STRING_ENVIRON_NAME))
+                return BlobDeadLetterStore(connection_string,
+                                           os.environ.get(FileHandler.DEAD_LETTER_CONTAINER_NAME_ENVIRON_NAME,
+                                                          FileHandler.DEFAULT_DEAD_LETTER_CONTAINER_NAME))
+        except Exception as e:
+            logger.error("Failed to create dead letter store. Failed bulks fail the file - {}".format(e))
+            return None
+
+        if dead_letter_store != FileHandler.NO_DEAD_LETTER_VALUE:
+            logger.error("Dead letter store {} is not supported. Failed bulks fail the file.".format(
+                dead_letter_store))
+
+        return None
+
+    def _get_blob_checkpoint(self) -> Optional[BlobCheckpoint]:
+        if self._checkpoint_store is None:
+            return None
+
+        # Without an ETag the blob size is the best available guard against resuming into a rewritten blob.
+        etag = self._etag if self._etag is not None else "size-{}".format(self._file_size)
+
+        return BlobCheckpoint(self._checkpoint_store, self._file_name, etag)
+
+    def _resume_from_checkpoint(self) -> None:
+        self._logzio_shipper.set_delivered_offset_callback(self._checkpoint.set_offset)
+        start_offset = self._checkpoint.get_offset()
+
+        if start_offset == 0:
+            return
+
+        logger.info("Resuming file {0} from offset {1}.".format(self._file_name, start_offset))
+
+        self._set_start_offset(start_offset)
+
+    def _get_is_sorted_input(self) -> bool:
+        is_sorted_input = os.environ.get(FileHandler.SORTED_INPUT_ENVIRON_NAME, FileHandler.FALSE_VALUE)
+
+        return is_sorted_input.lower() == FileHandler.TRUE_VALUE
+
+    def _skip_to_datetime_filter(self) -> None:
+        if self._is_streaming_ingestion:
+            logger.info('Sorted input is not supported with streaming ingestion.')
+            return
+
+        start_offset = self._file_parser.find_datetime_filter_offset(self._datetime_filter)
+
+        if start_offset is None:
+            logger.info('Sorted input is supported only with datetime filter in JSON and TEXT formats, and not in '
+                        'FULL_MATCH multiline mode or JSON document mode.')
+            return
+
+        logger.info("Skipping to offset {0} of sorted file {1} because of datetime filter.".format(
+            start_offset, self._file_name))
+        self._set_start_offset(start_offset)
+
+    def _set_start_offset(self, start_offset: int) -> None:
+        self._start_offset = start_offset
+        self._file_parser.set_start_offset(start_offset)
+
+        if self._parallel_parser is not None:
+            self._parallel_parser.set_start_offset(start_offset)
 
     def _write_is_datetime_filter_enabled(self) -> None:
         if self._datetime_filter is None or self._datetime_finder is None or self._datetime_format is None:
@@ -224,60 +859,164 @@ class FileHandler:
         return None
 
     def _send_logs_to_logzio(self) -> None:
-        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        logzio_shipper_future = self._logzio_shipper.start_logzio_shipper()
 
-        executor.submit(self._logzio_shipper.run_logzio_shipper)
+        logs = self._get_logs()
 
-        for log in self._file_parser.parse_file():
-            if not self._is_log_datetime_greater_or_equal_datetime_filter(self._datetime_filter, log):
-                logger.info("Log was not sent to Logz.io because of datetime filter - {}".format(log))
-                continue
+        try:
+            while True:
+                logs_batch = list(itertools.islice(logs, ConsumerProducerQueues.LOGS_BATCH_SIZE))
+
+                if not logs_batch:
+                    break
 
-            self._consumer_producer_queues.put_log_into_queue(log)
+                self._consumer_producer_queues.put_logs_into_queue(logs_batch)
+        except ConsumerProducerQueues.LogsQueueClosedError:
+            # The shipper stopped, its exception fails the file below.
+            pass
+        except Exception:
+            # Parsing failed, so the shipper is cancelled instead of shipping the rest of the queued logs.
+            self._logzio_shipper.stop_logzio_shipper()
+            raise
+        finally:
+            # The shipper must always get the end of the logs, or its thread is blocked for the life of the worker.
+            logs.close()
+            self._consumer_producer_queues.put_end_log_into_queue()
+            concurrent.futures.wait([logzio_shipper_future])
+            self._write_info_logs()
+            self._write_error_logs()
 
-            if self._logzio_shipper.exception is not None:
-                executor.shutdown()
-                self._write_info_logs()
-                self._write_error_logs()
-                raise self.FailedToSendLogsError("Failed to send logs to Logz.io for {}".format(self._file_name))
+        logzio_shipper_exception = logzio_shipper_future.exception()
 
-        self._consumer_producer_queues.put_end_log_into_queue()
-        executor.shutdown()
-        self._write_info_logs()
-        self._write_error_logs()
+        if logzio_shipper_exception is not None:
+            raise self.FailedToSendLogsError("Failed to send logs to Logz.io for {0} - {1}".format(
+                self._file_name, logzio_shipper_exception)) from logzio_shipper_exception
 
         if self._logzio_shipper.exception is not None:
             raise self.FailedToSendLogsError("Failed to send logs to Logz.io for {}".format(self._file_name))
 
-        if not self._file_parser.are_all_logs_parsed or self._logzio_shipper.is_any_log_invalid:
+        if self._is_deadline_reached:
+            self._queue_remainder()
+            return
+
+        if not self._are_all_logs_parsed() or self._logzio_shipper.is_any_log_invalid:
             raise self.FailedToSendLogsError("Some/All logs did not send to Logz.io in {}".format(self._file_name))
 
+        if self._checkpoint is not None:
+            self._checkpoint.delete()
+
+        if self._tail_stream is not None and self._tail_stream.is_tailing:
+            self._save_tail_state()
+
         if self._is_default_file_parser:
             raise self.DefaultParserError("The file {0} is not in {1} format. Used text format instead.".format(
                 self._file_name, self._file_format))
 
-    def _is_log_datetime_greater_or_equal_datetime_filter(self, datetime_filter: str, log: str) -> bool:
-        if datetime_filter is None or self._datetime_format is None:
-            return True
+    def _save_tail_state(self) -> None:
+        tail_state = self._tail_stream.get_tail_state()
+
+        try:
+            self._checkpoint_store.set_tail_state(self._file_name, tail_state)
+        except Exception as e:
+            logger.error("Failed to save tail state of {0} at offset {1} - {2}".format(
+                self._file_name, tail_state.offset, e))
+            return
 
-        log_datetime = self._file_parser.get_log_datetime(log)
+        logger.info("File {0} was processed up to offset {1}.".format(self._file_name, tail_state.offset))
 
-        if log_datetime is None:
-            return True
+    def _get_resumable_deadline(self) -> Optional[float]:
+        if self._deadline is None or self._checkpoint is not None:
+            return self._deadline
+
+        if (self._get_remainder_queue() is not None and not self._is_streaming_ingestion
+                and self._tail_stream is None):
+            return self._deadline
+
+        # Stopping at the deadline without a way to continue from the stop offset would send the same logs on every
+        # retry of the file, so the file is processed until it ends, like without a deadline.
+        logger.info("Processing deadline is disabled for file {}, since there is no checkpoint store or remainder "
+                    "queue to continue it from.".format(self._file_name))
+
+        return None
+
+    def _queue_remainder(self) -> None:
+        delivered_offset = self._logzio_shipper.delivered_offset
+        offset = delivered_offset if delivered_offset is not None else self._start_offset
+
+        # A remainder is queued again with its offset by the invocation that claimed it, without copying its data.
+        if self._is_remainder:
+            self._stopped_offset = offset
+            return
+
+        remainder_queue = self._get_remainder_queue()
+
+        # Without a remainder queue, and for streamed and tailed blobs that can't be read again from the start, only
+        # the checkpoint can resume the file when the host retries it.
+        if remainder_queue is None or self._is_streaming_ingestion or self._tail_stream is not None:
+            raise self.DeadlineReachedError("Processing deadline of {0} was reached at offset {1}.".format(
+                self._file_name, offset))
+
+        # The whole file is queued and not only the rest of it, since the offsets of the checkpoints and of the
+        # datetime filter are offsets in the whole file, and a csv file starts with its header.
+        self._file_stream.seek(0)
 
         try:
-            filter_datetime = datetime.strptime(datetime_filter, self._datetime_format)
-        except ValueError:
-            logger.error(
-                "datetime filter {0} does not match datetime format {1}".format(datetime_filter, self._datetime_format))
+            remainder_name = remainder_queue.put_remainder(
+                self._file_stream, {'file_name': self._file_name, 'etag': self._etag, 'offset': offset, 'attempts': 0})
+        except Exception as e:
+            raise self.DeadlineReachedError("Processing deadline of {0} was reached at offset {1}, and failed to "
+                                            "queue the rest of it - {2}".format(self._file_name, offset, e))
+
+        logger.info("Processing deadline was reached. The rest of file {0} from offset {1} was queued as {2}.".format(
+            self._file_name, offset, remainder_name))
+
+    def _get_logs(self) -> Generator[Tuple[LogRecord, Optional[int]], None, None]:
+        parsed_logs = self._get_parsed_logs()
+
+        try:
+            for log, offset in parsed_logs:
+                # Parsing stops as soon as the logs would not be shipped, and not only between batches.
+                if self._is_parsing_cancelled():
+                    return
+
+                yield log, offset
+        finally:
+            parsed_logs.close()
+
+    def _is_parsing_cancelled(self) -> bool:
+        if self._logzio_shipper.exception is not None:
             return True
 
-        if log_datetime < filter_datetime:
-            return False
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            self._is_deadline_reached = True
+            return True
 
-        return True
+        return False
+
+    def _get_parsed_logs(self) -> Generator[Tuple[LogRecord, Optional[int]], None, None]:
+        if self._parallel_parser is not None:
+            yield from self._parallel_parser.parse_file()
+            return
+
+        for log in self._file_parser.parse_file():
+            if not self._file_parser.is_log_datetime_greater_or_equal_datetime_filter(self._datetime_filter, log):
+                logger.info("Log was not sent to Logz.io because of datetime filter - {}".format(log))
+                continue
+
+            yield log, self._file_parser.offset
+
+    def _are_all_logs_parsed(self) -> bool:
+        if self._parallel_parser is not None:
+            return self._parallel_parser.are_all_logs_parsed
+
+        return self._file_parser.are_all_logs_parsed
 
     def _write_info_logs(self) -> None:
+        logger.info("Parsing was blocked for {0:.3f} seconds by the in flight bytes budget, and shipping was blocked "
+                    "for {1:.3f} seconds by the in flight bulks budget.".format(
+                        self._consumer_producer_queues.logs_blocked_seconds,
+                        self._logzio_shipper.bulks_blocked_seconds))
+
         while True:
             info_message = self._consumer_producer_queues.get_info_from_queue()
 
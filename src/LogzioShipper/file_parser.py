@@ -1,10 +1,12 @@
 import logging
-import json
 
 from abc import ABC, abstractmethod
-from typing import Generator, Optional, Any
+from typing import Generator, Optional, Any, Tuple
 from io import BufferedIOBase
-from datetime import datetime
+from jsonpath_ng import JSONPathError
+from .log_record import LogRecord
+from .json_path_accessor import JsonPathAccessor
+from .datetime_filter import DatetimeFilter
 
 
 logger = logging.getLogger(__name__)
@@ -19,38 +21,177 @@ class FileParser(ABC):
         self._datetime_finder = datetime_finder
         self._datetime_format = datetime_format
         self._are_all_logs_parsed = True
+        self._start_offset = 0
+        self._compiled_datetime_filter: Optional[DatetimeFilter] = None
+        self._compiled_datetime_filter_source: Optional[str] = None
 
     @property
     def are_all_logs_parsed(self) -> bool:
         return self._are_all_logs_parsed
 
+    @property
+    def offset(self) -> int:
+        return self._file_stream.tell()
+
+    def set_start_offset(self, start_offset: int) -> None:
+        self._start_offset = start_offset
+
     @abstractmethod
-    def parse_file(self) -> Generator[str, None, None]:
+    def parse_file(self) -> Generator[LogRecord, None, None]:
         pass
 
     @abstractmethod
-    def get_log_datetime(self, log: str) -> Optional[datetime]:
+    def get_log_datetime_value(self, log: LogRecord) -> Any:
         pass
 
-    def _get_log_datetime(self, log: str, json_path_parser: Optional[Any]) -> Optional[datetime]:
-        if self._datetime_finder is None or self._datetime_format is None:
+    def is_log_datetime_greater_or_equal_datetime_filter(self, datetime_filter: Optional[str], log: LogRecord) -> bool:
+        compiled_datetime_filter = self._get_compiled_datetime_filter(datetime_filter)
+
+        if compiled_datetime_filter is None:
+            return True
+
+        if not log.is_timestamp_cached:
+            log.cache_timestamp(self._get_log_timestamp(log, compiled_datetime_filter))
+
+        if log.timestamp is None:
+            return True
+
+        return compiled_datetime_filter.is_timestamp_greater_or_equal_filter(log.timestamp)
+
+    def find_datetime_filter_offset(self, datetime_filter: Optional[str]) -> Optional[int]:
+        compiled_datetime_filter = self._get_compiled_datetime_filter(datetime_filter)
+
+        if compiled_datetime_filter is None or not self._is_sorted_search_supported():
             return None
 
-        if json_path_parser is None:
+        position = self._file_stream.tell()
+
+        try:
+            self._file_stream.seek(0, 2)
+            start = self._start_offset
+            end = self._file_stream.tell()
+
+            # Every log that starts before start is older than the filter, and the first log that isn't starts
+            # before end.
+            while start < end:
+                middle = (start + end) // 2
+                timestamped_line = self._get_first_timestamped_line(middle, end, compiled_datetime_filter)
+
+                if timestamped_line is None or compiled_datetime_filter.is_timestamp_greater_or_equal_filter(
+                        timestamped_line[1]):
+                    end = middle
+                else:
+                    start = timestamped_line[0]
+
+            return self._get_log_start_offset(start)
+        finally:
+            self._file_stream.seek(position)
+
+    def _is_sorted_search_supported(self) -> bool:
+        return False
+
+    def _is_log_start_line(self, line: bytes) -> bool:
+        return line.strip() != b''
+
+    def _get_line_log(self, line: bytes) -> Optional[LogRecord]:
+        return None
+
+    def _get_first_timestamped_line(self, offset: int, end: int,
+                                    compiled_datetime_filter: DatetimeFilter) -> Optional[Tuple[int, Any]]:
+        if offset == 0:
+            self._file_stream.seek(0)
+        else:
+            self._file_stream.seek(offset - 1)
+            self._file_stream.readline()
+
+        while self._file_stream.tell() < end:
+            line = self._file_stream.readline()
+
+            if line == b'':
+                break
+
+            if not self._is_log_start_line(line):
+                continue
+
+            log = self._get_line_log(line)
+
+            if log is None:
+                continue
+
+            timestamp = self._get_log_timestamp(log, compiled_datetime_filter)
+
+            if timestamp is not None:
+                return self._file_stream.tell(), timestamp
+
+        return None
+
+    def _get_log_start_offset(self, offset: int) -> int:
+        self._file_stream.seek(offset)
+
+        while True:
+            line = self._file_stream.readline()
+
+            if line == b'' or self._is_log_start_line(line):
+                return offset
+
+            offset += len(line)
+
+    def _seek_start_offset(self) -> None:
+        if self._start_offset > self._file_stream.tell():
+            self._file_stream.seek(self._start_offset)
+
+    def _get_compiled_datetime_filter(self, datetime_filter: Optional[str]) -> Optional[DatetimeFilter]:
+        if datetime_filter is None or self._datetime_finder is None or self._datetime_format is None:
             return None
 
-        json_log = json.loads(log)
-        match = json_path_parser.find(json_log)
+        if datetime_filter == self._compiled_datetime_filter_source:
+            return self._compiled_datetime_filter
 
-        if not match or match[0].value is None:
-            logger.error("No match has been found with datetime finder json path {0} for log - {1}".format(
-                self._datetime_finder, log))
+        self._compiled_datetime_filter_source = datetime_filter
+
+        try:
+            self._compiled_datetime_filter = DatetimeFilter(datetime_filter, self._datetime_format)
+        except ValueError:
+            logger.error(
+                "datetime filter {0} does not match datetime format {1}".format(datetime_filter, self._datetime_format))
+            self._compiled_datetime_filter = None
+
+        return self._compiled_datetime_filter
+
+    def _get_log_timestamp(self, log: LogRecord, compiled_datetime_filter: DatetimeFilter) -> Any:
+        datetime_value = self.get_log_datetime_value(log)
+
+        if datetime_value is None:
             return None
 
         try:
-            log_datetime = datetime.strptime(match[0].value, self._datetime_format)
+            return compiled_datetime_filter.get_timestamp(datetime_value)
         except ValueError:
             logger.error("datetime in log {0} does not match datetime format {1}".format(log, self._datetime_format))
+
+        return None
+
+    def _get_json_path_accessor(self) -> Optional[JsonPathAccessor]:
+        if self._datetime_finder is None:
+            return None
+
+        try:
+            return JsonPathAccessor.get_accessor(self._datetime_finder)
+        except JSONPathError as e:
+            logger.error(
+                "Something is wrong with the datetime finder json path {0} - {1}".format(self._datetime_finder, e))
+
+        return None
+
+    def _get_log_datetime_value(self, log: LogRecord, json_path_accessor: Optional[JsonPathAccessor]) -> Any:
+        if json_path_accessor is None:
+            return None
+
+        datetime_value = json_path_accessor.get_value(log.json_log)
+
+        if datetime_value is None:
+            logger.error("No match has been found with datetime finder json path {0} for log - {1}".format(
+                self._datetime_finder, log))
             return None
 
-        return log_datetime
+        return datetime_value
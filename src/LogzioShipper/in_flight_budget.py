@@ -0,0 +1,64 @@
+import threading
+import time
+
+from typing import Optional
+
+
+class InFlightBudget:
+
+    def __init__(self, max_bytes: Optional[int] = None, max_items: Optional[int] = None) -> None:
+        self._max_bytes = max_bytes
+        self._max_items = max_items
+        self._condition = threading.Condition()
+        self._bytes = 0
+        self._items = 0
+        self._is_closed = False
+        self._blocked_seconds = 0.0
+        self._blocked_times = 0
+
+    @property
+    def blocked_seconds(self) -> float:
+        return self._blocked_seconds
+
+    @property
+    def blocked_times(self) -> int:
+        return self._blocked_times
+
+    @property
+    def is_closed(self) -> bool:
+        return self._is_closed
+
+    def acquire(self, bytes_num: int, items_num: int = 1) -> None:
+        with self._condition:
+            if self._is_exhausted(bytes_num, items_num):
+                blocking_start_time = time.monotonic()
+
+                while self._is_exhausted(bytes_num, items_num):
+                    self._condition.wait()
+
+                self._blocked_seconds += time.monotonic() - blocking_start_time
+                self._blocked_times += 1
+
+            self._bytes += bytes_num
+            self._items += items_num
+
+    def release(self, bytes_num: int, items_num: int = 1) -> None:
+        with self._condition:
+            self._bytes -= bytes_num
+            self._items -= items_num
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        with self._condition:
+            self._is_closed = True
+            self._condition.notify_all()
+
+    def _is_exhausted(self, bytes_num: int, items_num: int) -> bool:
+        # A single item that is bigger than the budget is let through when nothing else is in flight.
+        if self._is_closed or self._items == 0:
+            return False
+
+        if self._max_bytes is not None and self._bytes + bytes_num > self._max_bytes:
+            return True
+
+        return self._max_items is not None and self._items + items_num > self._max_items
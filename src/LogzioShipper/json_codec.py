@@ -0,0 +1,75 @@
+import json
+import threading
+
+from typing import Any, List
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+
+_encoder = json.JSONEncoder()
+_simdjson_parsers = threading.local()
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson is stricter than json (NaN, Infinity, integers bigger than 64 bits), so json has the last word.
+            pass
+
+    return json.loads(data)
+
+
+def dumps(json_log: Any) -> bytes:
+    # The output must stay byte for byte the same as json.dumps, since bulk sizes are calculated from it. orjson has
+    # no separators or ASCII escaping options, and rewriting its output is slower than the stdlib C encoder.
+    return _encoder.encode(json_log).encode('utf-8')
+
+
+def encode_string(value: str) -> bytes:
+    return json.encoder.encode_basestring_ascii(value).encode('ascii')
+
+
+def encode_messages(messages: List[str]) -> List[bytes]:
+    # Encoded strings can't contain a new line, so all the logs are encoded into one buffer and split by it.
+    encoded_logs = '\n'.join(['{"message": ' + encoded_message + '}'
+                               for encoded_message in map(json.encoder.encode_basestring_ascii, messages)])
+
+    return encoded_logs.encode('ascii').split(b'\n') if messages else []
+
+
+def is_valid(data: bytes) -> bool:
+    # simdjson validates without building the Python objects of the log, json only decides the logs it rejects.
+    if simdjson is not None and _is_valid_simdjson(data):
+        return True
+
+    try:
+        loads(data)
+    except ValueError:
+        return False
+
+    return True
+
+
+def _is_valid_simdjson(data: bytes) -> bool:
+    parser = getattr(_simdjson_parsers, 'parser', None)
+
+    if parser is None:
+        parser = simdjson.Parser()
+        _simdjson_parsers.parser = parser
+
+    try:
+        parser.parse(data)
+    except ValueError:
+        return False
+
+    return True
@@ -0,0 +1,231 @@
+import logging
+import json
+import codecs
+import re
+
+from typing import Generator, Optional, List, Any
+from io import BytesIO
+from .file_parser import FileParser
+from .log_record import LogRecord
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class JsonDocumentParser(FileParser):
+
+    READ_SIZE_BYTES = 64 * 1024             # 64 KB
+    MAX_VALUE_SIZE = 5 * 1000 * 1000        # 5 MB
+    INCOMPLETE_VALUE_MARGIN = len('\\uXXXX')
+    WHITESPACE_REGEX = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, file_stream: BytesIO, envelope_path: Optional[List[str]] = None,
+                 datetime_finder: Optional[str] = None, datetime_format: Optional[str] = None) -> None:
+        super().__init__(file_stream, datetime_finder, datetime_format)
+        self._envelope_path = envelope_path
+        self._json_path_accessor = self._get_json_path_accessor()
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._position = 0
+        self._buffer_offset = 0
+        self._is_stream_ended = False
+
+    class ValueTooBigError(Exception):
+        pass
+
+    @property
+    def offset(self) -> int:
+        return self._buffer_offset
+
+    def parse_file(self) -> Generator[LogRecord, None, None]:
+        self._seek_start_offset()
+        self._buffer_offset = self._file_stream.tell()
+
+        try:
+            for json_log in self._get_json_logs():
+                if not isinstance(json_log, dict):
+                    logger.error("The following json is not an object: {}".format(json.dumps(json_log)[:1000]))
+                    self._are_all_logs_parsed = False
+                    continue
+
+                yield LogRecord(json_log=json_log)
+        except ValueError as e:
+            logger.error("The json document is not valid after offset {0} - {1}".format(self._buffer_offset, e))
+            self._are_all_logs_parsed = False
+        except self.ValueTooBigError as e:
+            logger.error(e)
+            self._are_all_logs_parsed = False
+
+    def get_log_datetime_value(self, log: LogRecord) -> Any:
+        return self._get_log_datetime_value(log, self._json_path_accessor)
+
+    def _get_json_logs(self) -> Generator[Any, None, None]:
+        if self._buffer_offset > 0:
+            yield from self._get_resumed_json_logs()
+
+        while True:
+            char = self._peek_char()
+
+            if char == '':
+                return
+
+            if char == '[':
+                self._advance(self._position + 1)
+                yield from self._get_array_values()
+            elif char == '{' and self._envelope_path is not None:
+                if not (yield from self._get_envelope_values(self._envelope_path)):
+                    logger.error("Envelope path {} has not been found in the json document.".format(
+                        '.'.join(self._envelope_path)))
+                    self._are_all_logs_parsed = False
+            else:
+                yield self._decode_value()
+
+    def _get_resumed_json_logs(self) -> Generator[Any, None, None]:
+        # A resumed document starts right after a log, which is either an array element or a top level value.
+        if self._peek_char() not in (',', ']'):
+            return
+
+        while self._is_next_array_value():
+            yield self._decode_value()
+
+        while self._peek_char() in (',', '}'):
+            self._skip_object_members()
+
+    def _get_array_values(self) -> Generator[Any, None, None]:
+        if self._peek_char() == ']':
+            self._advance(self._position + 1)
+            return
+
+        yield self._decode_value()
+
+        while self._is_next_array_value():
+            yield self._decode_value()
+
+    def _get_envelope_values(self, envelope_path: List[str]) -> Generator[Any, None, bool]:
+        is_envelope_found = False
+        self._expect_char('{')
+
+        if self._peek_char() == '}':
+            self._advance(self._position + 1)
+            return is_envelope_found
+
+        while True:
+            key = self._decode_value()
+            self._expect_char(':')
+
+            if key != envelope_path[0]:
+                self._decode_value()
+            elif len(envelope_path) > 1:
+                if self._peek_char() == '{':
+                    is_envelope_found |= yield from self._get_envelope_values(envelope_path[1:])
+                else:
+                    self._decode_value()
+            elif self._peek_char() == '[':
+                self._advance(self._position + 1)
+                yield from self._get_array_values()
+                is_envelope_found = True
+            else:
+                yield self._decode_value()
+                is_envelope_found = True
+
+            char = self._peek_char()
+            self._advance(self._position + 1)
+
+            if char == '}':
+                return is_envelope_found
+
+            if char != ',':
+                raise self._get_decode_error("Expecting ',' delimiter")
+
+    def _is_next_array_value(self) -> bool:
+        char = self._peek_char()
+        self._advance(self._position + 1)
+
+        if char == ']':
+            return False
+
+        if char != ',':
+            raise self._get_decode_error("Expecting ',' delimiter")
+
+        return True
+
+    def _skip_object_members(self) -> None:
+        while True:
+            char = self._peek_char()
+            self._advance(self._position + 1)
+
+            if char == '}':
+                return
+
+            if char != ',':
+                raise self._get_decode_error("Expecting ',' delimiter")
+
+            self._decode_value()
+            self._expect_char(':')
+            self._decode_value()
+
+    def _expect_char(self, expected_char: str) -> None:
+        if self._peek_char() != expected_char:
+            raise self._get_decode_error("Expecting '{}'".format(expected_char))
+
+        self._advance(self._position + 1)
+
+    def _peek_char(self) -> str:
+        while True:
+            self._advance(JsonDocumentParser.WHITESPACE_REGEX.match(self._buffer, self._position).end())
+
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+
+            if not self._read():
+                return ''
+
+    def _decode_value(self) -> Any:
+        self._peek_char()
+
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+
+                # A value that ends with the buffer may continue in the next read, like a number.
+                if end < len(self._buffer) or self._is_stream_ended:
+                    self._advance(end)
+                    return value
+            except json.JSONDecodeError as e:
+                if self._is_stream_ended or not self._is_value_incomplete(e):
+                    raise
+
+            if len(self._buffer) - self._position > JsonDocumentParser.MAX_VALUE_SIZE:
+                raise self.ValueTooBigError("A json value after offset {0} is bigger than {1} characters.".format(
+                    self._buffer_offset, JsonDocumentParser.MAX_VALUE_SIZE))
+
+            self._read()
+
+    def _is_value_incomplete(self, error: json.JSONDecodeError) -> bool:
+        # Values that are cut by the end of the buffer fail close to it, like a cut literal or escape sequence.
+        return error.msg.startswith('Unterminated string') \
+            or error.pos >= len(self._buffer) - JsonDocumentParser.INCOMPLETE_VALUE_MARGIN
+
+    def _read(self) -> bool:
+        if self._is_stream_ended:
+            return False
+
+        data = self._file_stream.read(JsonDocumentParser.READ_SIZE_BYTES)
+        self._is_stream_ended = data == b''
+        self._buffer = self._buffer[self._position:] + self._text_decoder.decode(data, final=self._is_stream_ended)
+        self._position = 0
+
+        return not self._is_stream_ended
+
+    def _advance(self, position: int) -> None:
+        if position == self._position:
+            return
+
+        consumed_text = self._buffer[self._position:position]
+        self._buffer_offset += len(consumed_text) if consumed_text.isascii() else len(consumed_text.encode('utf-8'))
+        self._position = position
+
+    def _get_decode_error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self._buffer, self._position)
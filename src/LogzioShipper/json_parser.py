@@ -1,11 +1,10 @@
 import logging
-import json
 
-from typing import Generator, Optional
+from typing import Generator, Optional, Any
 from io import BytesIO
-from jsonpath_ng import parse, JSONPathError
-from datetime import datetime
 from .file_parser import FileParser
+from .log_record import LogRecord
+from . import json_codec
 
 
 logger = logging.getLogger(__name__)
@@ -17,28 +16,55 @@ class JsonParser(FileParser):
     def __init__(self, file_stream: BytesIO, datetime_finder: Optional[str] = None,
                  datetime_format: Optional[str] = None) -> None:
         super().__init__(file_stream, datetime_finder, datetime_format)
+        self._json_path_accessor = self._get_json_path_accessor()
 
-        if self._datetime_finder is not None:
-            try:
-                self._json_path_parser = parse(self._datetime_finder)
-            except JSONPathError as e:
-                logger.error(
-                    "Something is wrong with the datetime finder json path {0} - {1}".format(self._datetime_finder, e))
-                self._json_path_parser = None
+    def parse_file(self) -> Generator[LogRecord, None, None]:
+        self._seek_start_offset()
 
-    def parse_file(self) -> Generator[str, None, None]:
         while True:
-            log = self._file_stream.readline().decode("utf-8").rstrip()
+            log = self._file_stream.readline().rstrip()
 
-            if log == '':
+            if log == b'':
                 break
 
-            try:
-                json.loads(log)
-                yield log
-            except ValueError:
-                logger.error("The following json is not valid: {}".format(log))
+            log_record = self._get_log_record(log)
+
+            if log_record is None:
+                logger.error("The following json is not valid: {}".format(log.decode("utf-8", errors="replace")))
+                self._are_all_logs_parsed = False
+                continue
+
+            if not self._is_json_object(log_record):
+                logger.error("The following json is not an object: {}".format(log.decode("utf-8", errors="replace")))
                 self._are_all_logs_parsed = False
+                continue
+
+            yield log_record
+
+    def get_log_datetime_value(self, log: LogRecord) -> Any:
+        return self._get_log_datetime_value(log, self._json_path_accessor)
+
+    def _get_log_record(self, log: bytes) -> Optional[LogRecord]:
+        if self._datetime_finder is None or self._datetime_format is None:
+            if not json_codec.is_valid(log):
+                return None
+
+            return LogRecord(log)
+
+        try:
+            return LogRecord(log, json_codec.loads(log))
+        except ValueError:
+            return None
+
+    def _is_json_object(self, log: LogRecord) -> bool:
+        # Custom fields can only be added to objects, and a valid json that starts with '{' is an object.
+        if log.is_encoded:
+            return log.raw.lstrip().startswith(b'{')
+
+        return isinstance(log.json_log, dict)
+
+    def _is_sorted_search_supported(self) -> bool:
+        return True
 
-    def get_log_datetime(self, log: str) -> Optional[datetime]:
-        return self._get_log_datetime(log, self._json_path_parser)
+    def _get_line_log(self, line: bytes) -> Optional[LogRecord]:
+        return self._get_log_record(line.rstrip())
@@ -0,0 +1,89 @@
+import re
+
+from typing import Any, Optional, Tuple, Union
+from functools import lru_cache
+from jsonpath_ng import parse
+
+
+class JsonPathAccessor:
+
+    # Dotted fields, quoted keys and fixed array indexes, e.g. $.metadata['event time'].values[0].datetime
+    FIELD_REGEX = r"[A-Za-z_][A-Za-z0-9_\-]*"
+    QUOTED_KEY_REGEX = r"'([^'\\]*)'|\"([^\"\\]*)\""
+    STEP_REGEX = re.compile(r"\.(?:({0})|{1})|\[(?:(\d+)|{1})\]".format(FIELD_REGEX, QUOTED_KEY_REGEX))
+    FIRST_STEP_REGEX = re.compile(r"(?:\$|({0})|{1})".format(FIELD_REGEX, QUOTED_KEY_REGEX))
+
+    ACCESSORS_CACHE_SIZE = 128
+
+    def __init__(self, expression: str) -> None:
+        self._expression = expression
+        self._keys = JsonPathAccessor.compile_keys(expression)
+        self._json_path_parser = parse(expression) if self._keys is None else None
+
+    @staticmethod
+    @lru_cache(maxsize=ACCESSORS_CACHE_SIZE)
+    def get_accessor(expression: str) -> 'JsonPathAccessor':
+        return JsonPathAccessor(expression)
+
+    @staticmethod
+    def compile_keys(expression: str) -> Optional[Tuple[Union[str, int], ...]]:
+        match = JsonPathAccessor.FIRST_STEP_REGEX.match(expression)
+
+        if match is None:
+            return None
+
+        keys = [key for key in match.groups() if key is not None]
+        position = match.end()
+
+        while position < len(expression):
+            match = JsonPathAccessor.STEP_REGEX.match(expression, position)
+
+            if match is None:
+                return None
+
+            field, single_quoted_key, double_quoted_key, index, bracket_single_quoted_key, \
+                bracket_double_quoted_key = match.groups()
+
+            if index is not None:
+                keys.append(int(index))
+            else:
+                keys.append(next(key for key in (field, single_quoted_key, double_quoted_key,
+                                                 bracket_single_quoted_key, bracket_double_quoted_key)
+                                 if key is not None))
+
+            position = match.end()
+
+        if not keys:
+            return None
+
+        return tuple(keys)
+
+    @property
+    def expression(self) -> str:
+        return self._expression
+
+    @property
+    def is_compiled(self) -> bool:
+        return self._keys is not None
+
+    def get_value(self, json_log: Any) -> Any:
+        if self._keys is None:
+            match = self._json_path_parser.find(json_log)
+
+            if not match:
+                return None
+
+            return match[0].value
+
+        value = json_log
+
+        for key in self._keys:
+            if isinstance(key, int):
+                if not isinstance(value, list) or key >= len(value):
+                    return None
+            elif not isinstance(value, dict) or key not in value:
+                return None
+
+            value = value[key]
+
+        return value
@@ -0,0 +1,52 @@
+from typing import Optional, Dict, Any
+from . import json_codec
+
+
+class LogRecord:
+
+    __slots__ = ('_raw', '_json_log', '_timestamp', '_is_timestamp_cached')
+
+    _NOT_DECODED = object()
+
+    def __init__(self, raw: Optional[bytes] = None, json_log: Any = _NOT_DECODED) -> None:
+        self._raw = raw
+        self._json_log = json_log
+        self._timestamp: Any = None
+        self._is_timestamp_cached = False
+
+    def __str__(self) -> str:
+        return self.raw.decode('utf-8', errors='replace')
+
+    @property
+    def raw(self) -> bytes:
+        if self._raw is None:
+            self._raw = json_codec.dumps(self._json_log)
+
+        return self._raw
+
+    @property
+    def is_encoded(self) -> bool:
+        return self._raw is not None
+
+    @property
+    def json_log(self) -> Any:
+        if self._json_log is LogRecord._NOT_DECODED:
+            self._json_log = json_codec.loads(self._raw)
+
+        return self._json_log
+
+    @property
+    def is_timestamp_cached(self) -> bool:
+        return self._is_timestamp_cached
+
+    @property
+    def timestamp(self) -> Any:
+        return self._timestamp
+
+    def cache_timestamp(self, timestamp: Any) -> None:
+        self._timestamp = timestamp
+        self._is_timestamp_cached = True
+
+    def update(self, fields: Dict[str, Any]) -> None:
+        self.json_log.update(fields)
+        self._raw = None
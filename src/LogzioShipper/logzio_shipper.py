@@ -2,14 +2,19 @@ import requests
 import threading
 import concurrent.futures
 import gzip
-import json
-
-from typing import List, Optional
-from requests.adapters import HTTPAdapter, RetryError
-from requests.sessions import InvalidSchema, Session
-from urllib3.util.retry import Retry
+import datetime
+import time
+
+from typing import List, Optional, Dict, Callable, Tuple
+from requests.adapters import RetryError
+from requests.sessions import InvalidSchema
+from .shipping_runtime import ShippingRuntime
+from .bulk_builder import BulkBuilder
+from .in_flight_budget import InFlightBudget
+from .dead_letter_store import DeadLetterStore
 from .consumer_producer_queues import ConsumerProducerQueues
-from .custom_field import CustomField
+from .custom_field import CustomField, CustomFieldsInjector
+from .log_record import LogRecord
 
 
 class LogzioShipper:
@@ -21,22 +26,47 @@ class LogzioShipper:
     MAX_WORKERS = 5
     MAX_RETRIES = 3
     BACKOFF_FACTOR = 1
-    STATUS_FORCELIST = [500, 502, 503, 504]
+    STATUS_FORCELIST = [429, 500, 502, 503, 504]
     CONNECTION_TIMEOUT_SECONDS = 5
 
+    # Only one invocation on a worker replays the dead letters at a time.
+    _dead_letters_replay_lock = threading.Lock()
+
     def __init__(self, logzio_url: str, logzio_token: str, consumer_producer_queues: ConsumerProducerQueues,
-                 version: str) -> None:
+                 version: str, compressed_bulk_size_ratio: Optional[float] = None,
+                 max_in_flight_bytes: Optional[int] = None, max_in_flight_bulks: Optional[int] = None,
+                 max_requests_per_second: Optional[float] = None,
+                 max_bytes_per_second: Optional[float] = None) -> None:
         self._logzio_url = "{0}/?token={1}&type=azure_blob_trigger".format(logzio_url, logzio_token)
+        self._logzio_token = logzio_token
         self._consumer_producer_queues = consumer_producer_queues
         self._version = version
-        self._session = self._get_request_retry_session()
+        self._compressed_bulk_size_ratio = compressed_bulk_size_ratio
+        self._shipping_runtime = ShippingRuntime.get_instance(LogzioShipper.MAX_WORKERS, LogzioShipper.MAX_RETRIES,
+                                                              LogzioShipper.BACKOFF_FACTOR,
+                                                              LogzioShipper.STATUS_FORCELIST,
+                                                              max_requests_per_second, max_bytes_per_second)
         self._lock = threading.Lock()
-        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=LogzioShipper.MAX_WORKERS)
+        self._bulks_futures: List[concurrent.futures.Future] = []
+        self._bulks_budget = InFlightBudget(max_in_flight_bytes, max_in_flight_bulks)
         self._exception: Optional[Exception] = None
+        self._is_stopped = False
         self._is_any_log_invalid = False
-        self._logs: List[str] = []
+        self._logs: List[bytes] = []
         self._bulk_size = 0
+        self._bulk_builder = self._get_bulk_builder()
+        self._bulk_offset: Optional[int] = None
+        self._bulks_num = 0
+        self._next_bulk_to_deliver = 0
+        self._delivered_bulks_offsets: Dict[int, Optional[int]] = {}
+        self._delivered_offset: Optional[int] = None
+        self._delivered_offset_callback: Optional[Callable[[int], None]] = None
+        self._delivered_offset_callback_lock = threading.Lock()
+        self._dead_letter_store: Optional[DeadLetterStore] = None
+        self._file_name: Optional[str] = None
+        self._spilled_bulks_num = 0
         self._custom_fields: List[CustomField] = []
+        self._custom_fields_injector = CustomFieldsInjector(self._custom_fields)
 
     @property
     def exception(self) -> Exception:
@@ -46,149 +76,361 @@ class LogzioShipper:
     def is_any_log_invalid(self) -> bool:
         return self._is_any_log_invalid
 
-    def run_logzio_shipper(self) -> None:
-        while True:
-            if self._exception is not None:
-                break
+    @property
+    def delivered_offset(self) -> Optional[int]:
+        return self._delivered_offset
 
-            log = self._consumer_producer_queues.get_log_from_queue()
+    @property
+    def bulks_blocked_seconds(self) -> float:
+        return self._bulks_budget.blocked_seconds
 
-            if log is None:
-                self._executor.submit(self._send_to_logzio, self._logs, self._bulk_size)
-                break
+    @property
+    def spilled_bulks_num(self) -> int:
+        return self._spilled_bulks_num
 
-            enriched_log = self._add_custom_fields_to_log(log)
-            enriched_log_size = len(enriched_log)
+    def run_logzio_shipper(self) -> None:
+        try:
+            while True:
+                if self._exception is not None or self._is_stopped:
+                    break
+
+                queued_logs = self._consumer_producer_queues.get_logs_from_queue()
+
+                if queued_logs is None:
+                    if self._exception is None and not self._is_stopped:
+                        self._submit_bulk()
+                    break
 
-            if not self._is_log_valid_to_be_sent(enriched_log, enriched_log_size):
-                self._is_any_log_invalid = True
-                continue
+                for log, offset in queued_logs:
+                    self._add_log(log, offset)
+        finally:
+            # The parser must not wait for logs that will not be shipped anymore, even when the shipper failed.
+            self._consumer_producer_queues.close_logs_queue()
 
-            if not self._bulk_size + enriched_log_size > LogzioShipper.MAX_BULK_SIZE_BYTES:
-                self._logs.append(enriched_log)
-                self._bulk_size += enriched_log_size
-                continue
+            # The senders are shared with other invocations, so only the bulks of this shipper are waited for.
+            concurrent.futures.wait(self._bulks_futures)
 
-            self._executor.submit(self._send_to_logzio, self._logs, self._bulk_size)
+            self._bulks_futures = []
             self._reset_logs()
-            self._logs.append(enriched_log)
-            self._bulk_size = enriched_log_size
 
-        self._executor.shutdown()
+    def start_logzio_shipper(self) -> concurrent.futures.Future:
+        return self._shipping_runtime.submit_shipper(self.run_logzio_shipper)
 
-        self._reset_logs()
-        self._session.close()
+    def stop_logzio_shipper(self) -> None:
+        # The queued logs are dropped, only the bulks that were already submitted are waited for.
+        self._is_stopped = True
+        self._consumer_producer_queues.close_logs_queue()
 
     def add_custom_field_to_list(self, custom_field: CustomField) -> None:
         self._custom_fields.append(custom_field)
+        self._custom_fields_injector = CustomFieldsInjector(self._custom_fields)
+
+    def set_delivered_offset_callback(self, delivered_offset_callback: Callable[[int], None]) -> None:
+        self._delivered_offset_callback = delivered_offset_callback
+
+    def set_dead_letter_store(self, dead_letter_store: DeadLetterStore, file_name: str) -> None:
+        self._dead_letter_store = dead_letter_store
+        self._file_name = file_name
+
+    def replay_dead_letters(self, deadline: Optional[float] = None) -> None:
+        if self._dead_letter_store is None:
+            return
+
+        if not LogzioShipper._dead_letters_replay_lock.acquire(blocking=False):
+            return
+
+        try:
+            self._replay_dead_letters(deadline)
+        finally:
+            LogzioShipper._dead_letters_replay_lock.release()
+
+    def _add_log(self, log: LogRecord, offset: Optional[int]) -> None:
+        enriched_log = self._add_custom_fields_to_log(log)
+        enriched_log_size = len(enriched_log)
+
+        if not self._is_log_valid_to_be_sent(enriched_log, enriched_log_size):
+            self._is_any_log_invalid = True
+            self._set_bulk_offset(offset)
+            return
+
+        if not self._can_add_log_to_bulk(enriched_log_size):
+            self._submit_bulk()
+            self._reset_logs()
+
+        self._add_log_to_bulk(enriched_log, enriched_log_size)
+        self._set_bulk_offset(offset)
+
+    def _set_bulk_offset(self, offset: Optional[int]) -> None:
+        if offset is not None:
+            self._bulk_offset = offset
 
-    def _send_to_logzio(self, logs: List[str], bulk_size: int) -> None:
-        if not logs:
+    def _get_bulk_builder(self) -> Optional[BulkBuilder]:
+        if self._compressed_bulk_size_ratio is None:
+            return None
+
+        return BulkBuilder(int(LogzioShipper.MAX_BODY_SIZE_BYTES * self._compressed_bulk_size_ratio))
+
+    def _can_add_log_to_bulk(self, log_size: int) -> bool:
+        if self._bulk_builder is not None:
+            return self._bulk_builder.can_add_log(log_size)
+
+        return self._bulk_size + log_size <= LogzioShipper.MAX_BULK_SIZE_BYTES
+
+    def _add_log_to_bulk(self, log: bytes, log_size: int) -> None:
+        if self._bulk_builder is not None:
+            self._bulk_builder.add_log(log)
+        else:
+            self._logs.append(log)
+
+        self._bulk_size += log_size
+
+    def _submit_bulk(self) -> None:
+        compressed_logs = None
+
+        if self._bulk_builder is not None and self._bulk_builder.logs_num > 0:
+            compressed_logs = self._bulk_builder.get_compressed_bulk()
+
+        # Blocks the shipper while the bulks that are being sent are over the budget.
+        self._bulks_budget.acquire(self._get_in_flight_size(self._bulk_size, compressed_logs))
+        self._bulks_futures.append(self._submit_sender(self._logs, self._bulk_size, self._bulks_num,
+                                                       self._bulk_offset, compressed_logs))
+        self._bulks_num += 1
+
+    def _submit_sender(self, logs: List[bytes], bulk_size: int, bulk_num: int, bulk_offset: Optional[int],
+                       compressed_logs: Optional[bytes]) -> concurrent.futures.Future:
+        return self._shipping_runtime.submit_sender(self._send_bulk, logs, bulk_size, bulk_num, bulk_offset,
+                                                    compressed_logs)
+
+    def _send_bulk(self, logs: List[bytes], bulk_size: int, bulk_num: int, bulk_offset: Optional[int],
+                   compressed_logs: Optional[bytes]) -> None:
+        try:
+            self._send_to_logzio(logs, bulk_size, bulk_num, bulk_offset, compressed_logs)
+        finally:
+            self._bulks_budget.release(self._get_in_flight_size(bulk_size, compressed_logs))
+
+    @staticmethod
+    def _get_in_flight_size(bulk_size: int, compressed_logs: Optional[bytes]) -> int:
+        # A bulk that was compressed while it was built is held in memory only in its compressed form.
+        if compressed_logs is not None:
+            return len(compressed_logs)
+
+        return bulk_size
+
+    def _send_to_logzio(self, logs: List[bytes], bulk_size: int, bulk_num: int = 0,
+                        bulk_offset: Optional[int] = None, compressed_logs: Optional[bytes] = None) -> None:
+        if not logs and compressed_logs is None:
+            self._set_bulk_delivered(bulk_num, bulk_offset)
             return
 
+        compressed_data = compressed_logs
+
         try:
-            headers = {"Content-Type": "application/json",
-                       "Content-Encoding": "gzip",
-                       "Logzio-Shipper": "logzio-azure-blob-trigger/v{0}/0/0.".format(self._version)}
-            compressed_data = gzip.compress(str.encode('\n'.join(logs)))
-            response = self._session.post(url=self._logzio_url,
+            if compressed_data is None:
+                compressed_data = self._compress_logs(logs)
+
+            # The rate limits are shared by all the senders of the worker.
+            self._shipping_runtime.rate_limiter.acquire(len(compressed_data))
+            response = self._shipping_runtime.session.post(url=self._logzio_url,
                                           data=compressed_data,
-                                          headers=headers,
+                                          headers=self._get_headers(),
                                           timeout=LogzioShipper.CONNECTION_TIMEOUT_SECONDS)
             response.raise_for_status()
             self._consumer_producer_queues.put_info_into_queue(
                 "Successfully sent bulk of {} bytes to Logz.io.".format(bulk_size))
-        except requests.ConnectionError as e:
-            message = "Can't establish connection to {0} url. Please make sure your url is a Logz.io valid url. Max retries of {1} has reached. response: {2}".format(
-                    self._logzio_url, LogzioShipper.MAX_RETRIES, e)
-            self._set_exception(message, e)
-            return
-        except RetryError as e:
-            message = "Something went wrong. Max retries of {0} has reached. response: {1}".format(
-                LogzioShipper.MAX_RETRIES, e)
+            self._set_bulk_delivered(bulk_num, bulk_offset)
+        except Exception as e:
+            message, is_transient = self._get_send_error_message(e)
+
+            if is_transient:
+                self._set_transient_exception(message, e, compressed_data, bulk_size, bulk_num, bulk_offset)
+                return
+
             self._set_exception(message, e)
+
+    def _get_headers(self) -> Dict[str, str]:
+        return {"Content-Type": "application/json",
+                "Content-Encoding": "gzip",
+                "Logzio-Shipper": "logzio-azure-blob-trigger/v{0}/0/0.".format(self._version)}
+
+    @staticmethod
+    def _compress_logs(logs: List[bytes]) -> bytes:
+        return gzip.compress(b'\n'.join(logs))
+
+    def _get_send_error_message(self, exception: Exception) -> Tuple[str, bool]:
+        # Returns the error message and whether the error is transient, for the threaded and the async senders.
+        if isinstance(exception, requests.ConnectionError):
+            return "Can't establish connection to {0} url. Please make sure your url is a Logz.io valid url. Max retries of {1} has reached. response: {2}".format(
+                    self._logzio_url, LogzioShipper.MAX_RETRIES, exception), True
+
+        if isinstance(exception, RetryError):
+            return "Something went wrong. Max retries of {0} has reached. response: {1}".format(
+                LogzioShipper.MAX_RETRIES, exception), True
+
+        if isinstance(exception, requests.Timeout):
+            return "Something went wrong. response: {}".format(exception), True
+
+        if isinstance(exception, requests.exceptions.InvalidURL):
+            return "Invalid url. Make sure your url is a valid url.", False
+
+        if isinstance(exception, InvalidSchema):
+            return "No connection adapters were found for {}. Make sure your url starts with http:// or https://".format(
+                    self._logzio_url), False
+
+        if isinstance(exception, requests.HTTPError):
+            if exception.response.status_code >= 500:
+                return "Something went wrong. response: {}".format(exception), True
+
+            if exception.response.status_code == 400:
+                return "The logs are bad formatted. response: {}".format(exception), False
+
+            if exception.response.status_code == 401:
+                return "The token is missing or not valid. Make sure you’re using the right account token.", False
+
+        return "Something went wrong. response: {}".format(exception), False
+
+    def _set_exception(self, message: str, exception: Exception) -> None:
+        self._lock.acquire()
+
+        if self._exception is None:
+            self._consumer_producer_queues.put_error_into_queue(message)
+            self._exception = exception
+
+        self._lock.release()
+
+    def _set_transient_exception(self, message: str, exception: Exception, compressed_data: Optional[bytes],
+                                 bulk_size: int, bulk_num: int, bulk_offset: Optional[int]) -> None:
+        # A bulk that may be accepted later is spilled as is, so the rest of the file keeps being shipped.
+        if self._dead_letter_store is None or compressed_data is None:
+            self._set_exception(message, exception)
             return
-        except requests.exceptions.InvalidURL as e:
-            message = "Invalid url. Make sure your url is a valid url."
-            self._set_exception(message, e)
+
+        metadata = {'file_name': self._file_name,
+                    'bulk_size': bulk_size,
+                    'bulk_offset': bulk_offset,
+                    'error': str(exception).replace(self._logzio_token, '<token>'),
+                    'spilled_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    'version': self._version}
+
+        try:
+            dead_letter_name = self._dead_letter_store.put_dead_letter(compressed_data, metadata)
+        except Exception as e:
+            self._consumer_producer_queues.put_error_into_queue(
+                "Failed to spill bulk of {0} bytes to the dead letter store - {1}".format(bulk_size, e))
+            self._set_exception(message, exception)
             return
-        except InvalidSchema as e:
-            message = "No connection adapters were found for {}. Make sure your url starts with http:// or https://".format(
-                    self._logzio_url)
-            self._set_exception(message, e)
+
+        with self._lock:
+            self._spilled_bulks_num += 1
+
+        self._consumer_producer_queues.put_error_into_queue(
+            "Failed to send bulk of {0} bytes to Logz.io, it was spilled to dead letter {1} to be replayed. {2}".format(
+                bulk_size, dead_letter_name, message))
+        self._set_bulk_delivered(bulk_num, bulk_offset)
+
+    def _replay_dead_letters(self, deadline: Optional[float]) -> None:
+        try:
+            dead_letters_names = self._dead_letter_store.get_dead_letters_names()
+        except Exception as e:
+            self._consumer_producer_queues.put_error_into_queue("Failed to list dead letters - {}".format(e))
             return
-        except requests.HTTPError as e:
-            status_code = e.response.status_code
 
-            if status_code == 400:
-                message = "The logs are bad formatted. response: {}".format(e)
-                self._set_exception(message, e)
+        for dead_letter_name in dead_letters_names:
+            if deadline is not None and time.monotonic() >= deadline:
+                self._consumer_producer_queues.put_info_into_queue(
+                    "Replaying dead letters is stopped by the processing deadline, the rest of them are replayed by "
+                    "the next invocations.")
                 return
 
-            if status_code == 401:
-                message = "The token is missing or not valid. Make sure you’re using the right account token."
-                self._set_exception(message, e)
+            try:
+                dead_letter = self._dead_letter_store.get_dead_letter(dead_letter_name)
+                self._shipping_runtime.rate_limiter.acquire(len(dead_letter.payload))
+                response = self._shipping_runtime.session.post(url=self._logzio_url,
+                                                               data=dead_letter.payload,
+                                                               headers=self._get_headers(),
+                                                               timeout=LogzioShipper.CONNECTION_TIMEOUT_SECONDS)
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                # The payload itself was rejected, so it is quarantined for inspection and the next ones are replayed.
+                if e.response.status_code < 500:
+                    self._quarantine_dead_letter(dead_letter_name, e)
+                    continue
+
+                self._put_replay_stopped_error(dead_letter_name, e)
+                return
+            except Exception as e:
+                self._put_replay_stopped_error(dead_letter_name, e)
                 return
 
-            message = "Something went wrong. response: {}".format(e)
-            self._set_exception(message, e)
-            return
+            try:
+                self._dead_letter_store.delete_dead_letter(dead_letter_name)
+            except Exception as e:
+                self._consumer_producer_queues.put_error_into_queue(
+                    "Failed to delete replayed dead letter {0} - {1}".format(dead_letter_name, e))
+
+            self._consumer_producer_queues.put_info_into_queue(
+                "Successfully replayed dead letter {0} of file {1}.".format(dead_letter_name,
+                                                                          dead_letter.metadata.get('file_name')))
+
+    def _quarantine_dead_letter(self, dead_letter_name: str, exception: Exception) -> None:
+        try:
+            self._dead_letter_store.quarantine_dead_letter(dead_letter_name)
         except Exception as e:
-            message = "Something went wrong. response: {}".format(e)
-            self._set_exception(message, e)
+            self._consumer_producer_queues.put_error_into_queue(
+                "Dead letter {0} was rejected by Logz.io and failed to be quarantined - {1}. response: {2}".format(
+                    dead_letter_name, e, exception))
             return
 
-    def _set_exception(self, message: str, exception: Exception) -> None:
-        self._lock.acquire()
+        self._consumer_producer_queues.put_error_into_queue(
+            "Dead letter {0} was rejected by Logz.io and was quarantined, it will not be replayed. response: "
+            "{1}".format(dead_letter_name, str(exception).replace(self._logzio_token, '<token>')))
 
-        if self._exception is None:
-            self._consumer_producer_queues.put_error_into_queue(message)
-            self._exception = exception
+    def _put_replay_stopped_error(self, dead_letter_name: str, exception: Exception) -> None:
+        # Logz.io is still unreachable, the rest of the dead letters wait for the next replay.
+        self._consumer_producer_queues.put_error_into_queue(
+            "Failed to replay dead letter {0}, replaying is stopped until the next invocation - {1}".format(
+                dead_letter_name, str(exception).replace(self._logzio_token, '<token>')))
 
-        self._lock.release()
+    def _set_bulk_delivered(self, bulk_num: int, bulk_offset: Optional[int]) -> None:
+        with self._lock:
+            self._delivered_bulks_offsets[bulk_num] = bulk_offset
+            delivered_offset = self._delivered_offset
+
+            while self._next_bulk_to_deliver in self._delivered_bulks_offsets:
+                offset = self._delivered_bulks_offsets.pop(self._next_bulk_to_deliver)
+                self._next_bulk_to_deliver += 1
+
+                if offset is not None:
+                    delivered_offset = offset
+
+            if delivered_offset == self._delivered_offset:
+                return
+
+            self._delivered_offset = delivered_offset
+
+        if self._delivered_offset_callback is None:
+            return
+
+        # The callback writes the checkpoint, so it is called without holding the senders back. An offset that a newer
+        # one replaced while waiting is skipped, the sender of the newer offset calls the callback with it.
+        with self._delivered_offset_callback_lock:
+            if delivered_offset == self._delivered_offset:
+                self._delivered_offset_callback(delivered_offset)
 
-    def _is_log_valid_to_be_sent(self, log: str, log_size: int) -> bool:
+    def _is_log_valid_to_be_sent(self, log: bytes, log_size: int) -> bool:
         if log_size > LogzioShipper.MAX_LOG_SIZE_BYTES:
             self._consumer_producer_queues.put_error_into_queue(
                 "The following log's size is greater than the max log size - {0} bytes, that can be sent to Logz.io: {1}".format(
-                    LogzioShipper.MAX_LOG_SIZE_BYTES, log))
+                    LogzioShipper.MAX_LOG_SIZE_BYTES, log.decode('utf-8', errors='replace')))
 
             return False
 
         return True
 
-    def _add_custom_fields_to_log(self, log: str) -> str:
-        json_log = json.loads(log)
-
-        for custom_field in self._custom_fields:
-            json_log[custom_field.key] = custom_field.value
-
-        return json.dumps(json_log)
-
-    def _get_request_retry_session(
-            self,
-            retries=MAX_RETRIES,
-            backoff_factor=BACKOFF_FACTOR,
-            status_forcelist=STATUS_FORCELIST
-    ) -> Session:
-        session = requests.Session()
-        retry = Retry(
-            total=retries,
-            read=retries,
-            connect=retries,
-            status=retries,
-            backoff_factor=backoff_factor,
-            allowed_methods=frozenset(['GET', 'POST']),
-            status_forcelist=status_forcelist,
-        )
-        adapter = HTTPAdapter(max_retries=retry)
-
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-        session.headers.update({"Content-Type": "application/json"})
-
-        return session
+    def _add_custom_fields_to_log(self, log: LogRecord) -> bytes:
+        return self._custom_fields_injector.add_custom_fields_to_log(log)
 
     def _reset_logs(self) -> None:
         self._logs = []
         self._bulk_size = 0
+        self._bulk_builder = self._get_bulk_builder()
+        self._bulk_offset = None
@@ -0,0 +1,118 @@
+import logging
+import re
+
+from typing import Generator, List
+from io import BytesIO
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class MultilineAssembler:
+
+    FULL_MATCH_MODE = 'FULL_MATCH'
+    RECORD_START_MODE = 'RECORD_START'
+    CONTINUATION_MODE = 'CONTINUATION'
+    MODES = (FULL_MATCH_MODE, RECORD_START_MODE, CONTINUATION_MODE)
+
+    MAX_LINES = 10000
+    MAX_BYTES = 500 * 1000                  # 500 KB
+
+    def __init__(self, file_stream: BytesIO, multiline_regex: str, mode: str = FULL_MATCH_MODE,
+                 max_lines: int = MAX_LINES, max_bytes: int = MAX_BYTES) -> None:
+        self._file_stream = file_stream
+        self._pattern = re.compile(multiline_regex)
+        self._mode = mode
+        self._max_lines = max_lines
+        self._max_bytes = max_bytes
+        self._pending_line_size = 0
+
+    class NoMatchError(Exception):
+        pass
+
+    @property
+    def pending_line_size(self) -> int:
+        return self._pending_line_size
+
+    def is_multiline_log_start(self, line: str) -> bool:
+        is_matching = self._pattern.match(line) is not None
+
+        if self._mode == MultilineAssembler.CONTINUATION_MODE:
+            return not is_matching
+
+        return is_matching
+
+    def get_multiline_logs(self) -> Generator[str, None, None]:
+        if self._mode == MultilineAssembler.FULL_MATCH_MODE:
+            return self._get_full_match_multiline_logs()
+
+        return self._get_split_multiline_logs()
+
+    def _get_full_match_multiline_logs(self) -> Generator[str, None, None]:
+        while True:
+            line = self._file_stream.readline()
+
+            if line == b'':
+                return
+
+            multiline_log = line.decode("utf-8")
+            lines_num = 1
+            multiline_log_size = len(line)
+
+            while True:
+                if self._pattern.fullmatch(multiline_log) is not None:
+                    yield multiline_log
+                    break
+
+                if self._pattern.fullmatch(multiline_log.rstrip()) is not None:
+                    yield multiline_log.rstrip()
+                    break
+
+                if lines_num >= self._max_lines or multiline_log_size >= self._max_bytes:
+                    raise self.NoMatchError("No match within {0} lines or {1} bytes.".format(self._max_lines,
+                                                                                           self._max_bytes))
+
+                line = self._file_stream.readline()
+
+                if line == b'':
+                    raise self.NoMatchError("No match until the end of the file.")
+
+                multiline_log += line.decode("utf-8")
+                lines_num += 1
+                multiline_log_size += len(line)
+
+    def _get_split_multiline_logs(self) -> Generator[str, None, None]:
+        lines: List[str] = []
+        multiline_log_size = 0
+
+        while True:
+            line = self._file_stream.readline()
+
+            if line == b'':
+                break
+
+            decoded_line = line.decode("utf-8")
+
+            if lines and self._is_multiline_log_end(decoded_line, len(lines), multiline_log_size + len(line)):
+                # The line that ends a log is already read, so it is not part of the offset of that log.
+                self._pending_line_size = len(line)
+                yield ''.join(lines).rstrip()
+
+                lines = []
+                multiline_log_size = 0
+
+            self._pending_line_size = 0
+            lines.append(decoded_line)
+            multiline_log_size += len(line)
+
+        if lines:
+            yield ''.join(lines).rstrip()
+
+    def _is_multiline_log_end(self, next_line: str, lines_num: int, multiline_log_size: int) -> bool:
+        if lines_num >= self._max_lines or multiline_log_size > self._max_bytes:
+            logger.warning("Multiline log reached the limit of {0} lines or {1} bytes and was split.".format(
+                self._max_lines, self._max_bytes))
+            return True
+
+        return self.is_multiline_log_start(next_line)
@@ -0,0 +1,151 @@
+import logging
+import threading
+import multiprocessing
+import concurrent.futures
+
+from typing import Generator, List, Optional, NamedTuple, Type, Dict, Any, Tuple
+from io import BytesIO, IOBase
+from collections import deque
+from functools import partial
+from .file_parser import FileParser
+from .custom_field import CustomField, CustomFieldsInjector
+from .log_record import LogRecord
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class ParsedChunk(NamedTuple):
+    logs: List[bytes]
+    filtered_logs_num: int
+    are_all_logs_parsed: bool
+
+
+def parse_chunk(chunk: bytes, file_parser_class: Type[FileParser], file_parser_kwargs: Dict[str, Any],
+                datetime_filter: Optional[str], custom_fields: List[CustomField]) -> ParsedChunk:
+    file_parser = file_parser_class(BytesIO(chunk), **file_parser_kwargs)
+    custom_fields_injector = CustomFieldsInjector(custom_fields)
+    logs = []
+    filtered_logs_num = 0
+
+    for log in file_parser.parse_file():
+        if not file_parser.is_log_datetime_greater_or_equal_datetime_filter(datetime_filter, log):
+            filtered_logs_num += 1
+            continue
+
+        logs.append(custom_fields_injector.add_custom_fields_to_log(log))
+
+    return ParsedChunk(logs, filtered_logs_num, file_parser.are_all_logs_parsed)
+
+
+class ParallelParser:
+
+    CHUNK_SIZE_BYTES = 1024 * 1024          # 1 MB
+    MAX_PENDING_CHUNKS_PER_WORKER = 2
+
+    _executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+    _executor_workers_num: Optional[int] = None
+    _executor_lock = threading.Lock()
+
+    def __init__(self, file_stream: IOBase, workers_num: int, file_parser_class: Type[FileParser],
+                 file_parser_kwargs: Dict[str, Any], datetime_filter: Optional[str],
+                 custom_fields: List[CustomField], chunk_size: int = CHUNK_SIZE_BYTES) -> None:
+        self._file_stream = file_stream
+        self._workers_num = workers_num
+        self._chunk_size = chunk_size
+        self._parse_chunk = partial(parse_chunk,
+                                    file_parser_class=file_parser_class,
+                                    file_parser_kwargs=file_parser_kwargs,
+                                    datetime_filter=datetime_filter,
+                                    custom_fields=custom_fields)
+        self._are_all_logs_parsed = True
+        self._start_offset = 0
+
+    @property
+    def are_all_logs_parsed(self) -> bool:
+        return self._are_all_logs_parsed
+
+    def set_start_offset(self, start_offset: int) -> None:
+        self._start_offset = start_offset
+
+    @staticmethod
+    def _get_executor(workers_num: int) -> concurrent.futures.ProcessPoolExecutor:
+        # The pool is process wide like the shipping runtime, so the workers are started once and not for every file.
+        # It is created again when the workers num changes, and the previous pool exits when the parsers that use it
+        # finish.
+        with ParallelParser._executor_lock:
+            if ParallelParser._executor is None or ParallelParser._executor_workers_num != workers_num:
+                ParallelParser._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=workers_num, mp_context=ParallelParser._get_mp_context())
+                ParallelParser._executor_workers_num = workers_num
+
+            return ParallelParser._executor
+
+    @staticmethod
+    def _release_executor(executor: concurrent.futures.ProcessPoolExecutor) -> None:
+        with ParallelParser._executor_lock:
+            if ParallelParser._executor is executor:
+                ParallelParser._executor = None
+                ParallelParser._executor_workers_num = None
+
+    @staticmethod
+    def _get_mp_context() -> multiprocessing.context.BaseContext:
+        # Forking the worker copies the locks of the shipper and sender threads, which may be held while it forks.
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            return multiprocessing.get_context('forkserver')
+
+        return multiprocessing.get_context('spawn')
+
+    def parse_file(self) -> Generator[Tuple[LogRecord, Optional[int]], None, None]:
+        executor = ParallelParser._get_executor(self._workers_num)
+        pending_chunks: deque = deque()
+        max_pending_chunks = self._workers_num * ParallelParser.MAX_PENDING_CHUNKS_PER_WORKER
+
+        try:
+            for chunk, chunk_end_offset in self._get_chunks():
+                pending_chunks.append((executor.submit(self._parse_chunk, chunk), chunk_end_offset))
+
+                if len(pending_chunks) < max_pending_chunks:
+                    continue
+
+                yield from self._get_parsed_chunk_logs(*pending_chunks.popleft())
+
+            while pending_chunks:
+                yield from self._get_parsed_chunk_logs(*pending_chunks.popleft())
+        except concurrent.futures.process.BrokenProcessPool:
+            # A pool with a worker that died can't run chunks anymore, so the next file gets a new one.
+            ParallelParser._release_executor(executor)
+            raise
+        finally:
+            for parsed_chunk_future, _ in pending_chunks:
+                parsed_chunk_future.cancel()
+
+    def _get_chunks(self) -> Generator[Tuple[bytes, int], None, None]:
+        if self._start_offset > 0:
+            self._file_stream.seek(self._start_offset)
+
+        while True:
+            chunk = self._file_stream.read(self._chunk_size)
+
+            if not chunk:
+                return
+
+            yield chunk + self._file_stream.readline(), self._file_stream.tell()
+
+    def _get_parsed_chunk_logs(self, parsed_chunk_future: concurrent.futures.Future,
+                               chunk_end_offset: int) -> Generator[Tuple[LogRecord, Optional[int]], None, None]:
+        parsed_chunk = parsed_chunk_future.result()
+
+        if not parsed_chunk.are_all_logs_parsed:
+            self._are_all_logs_parsed = False
+
+        if parsed_chunk.filtered_logs_num > 0:
+            logger.info("{} logs were not sent to Logz.io because of datetime filter.".format(
+                parsed_chunk.filtered_logs_num))
+
+        for log in parsed_chunk.logs[:-1]:
+            yield LogRecord(log), None
+
+        if parsed_chunk.logs:
+            yield LogRecord(parsed_chunk.logs[-1]), chunk_end_offset
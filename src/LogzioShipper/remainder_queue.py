@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import uuid
+import shutil
+
+from typing import Any, Dict, IO, Optional, Tuple
+
+
+class RemainderQueue:
+
+    DATA_EXTENSION = '.data'
+    METADATA_EXTENSION = '.json'
+    CLAIMED_EXTENSION = '.claimed'
+    TEMP_EXTENSION = '.tmp'
+    # A remainder that was claimed for longer than this was left by a worker that died, so it is queued again.
+    CLAIM_TIMEOUT_SECONDS = 2 * 60 * 60
+
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+
+    def put_remainder(self, file_stream: IO[bytes], metadata: Dict[str, Any]) -> str:
+        os.makedirs(self._directory, exist_ok=True)
+
+        # Names are sorted by their queuing time, so the remainders are processed in the order they were queued.
+        name = "{0:020d}-{1}".format(time.time_ns(), uuid.uuid4().hex)
+        data_temp_path = self._get_path(name + RemainderQueue.DATA_EXTENSION + RemainderQueue.TEMP_EXTENSION)
+        metadata_temp_path = self._get_path(name + RemainderQueue.METADATA_EXTENSION + RemainderQueue.TEMP_EXTENSION)
+
+        with open(data_temp_path, 'wb') as data_file:
+            shutil.copyfileobj(file_stream, data_file)
+
+        with open(metadata_temp_path, 'w') as metadata_file:
+            json.dump(metadata, metadata_file)
+
+        # The metadata file is moved last, so a remainder is never claimed before its data is complete.
+        os.replace(data_temp_path, self._get_path(name + RemainderQueue.DATA_EXTENSION))
+        os.replace(metadata_temp_path, self._get_path(name + RemainderQueue.METADATA_EXTENSION))
+
+        return name
+
+    def claim_remainder(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        if not os.path.isdir(self._directory):
+            return None
+
+        self._requeue_expired_claims()
+
+        for file_name in sorted(os.listdir(self._directory)):
+            if not file_name.endswith(RemainderQueue.METADATA_EXTENSION):
+                continue
+
+            name = file_name[:-len(RemainderQueue.METADATA_EXTENSION)]
+            claimed_path = self._get_path(name + RemainderQueue.CLAIMED_EXTENSION)
+
+            # Renaming is atomic, so a remainder is claimed by only one of the invocations that share the directory.
+            try:
+                os.rename(self._get_path(file_name), claimed_path)
+            except FileNotFoundError:
+                continue
+
+            os.utime(claimed_path)
+
+            with open(claimed_path, 'r') as metadata_file:
+                return name, json.load(metadata_file)
+
+        return None
+
+    def get_data_path(self, name: str) -> str:
+        return self._get_path(name + RemainderQueue.DATA_EXTENSION)
+
+    def release_remainder(self, name: str, metadata: Dict[str, Any]) -> None:
+        metadata_temp_path = self._get_path(name + RemainderQueue.METADATA_EXTENSION + RemainderQueue.TEMP_EXTENSION)
+
+        with open(metadata_temp_path, 'w') as metadata_file:
+            json.dump(metadata, metadata_file)
+
+        os.replace(metadata_temp_path, self._get_path(name + RemainderQueue.METADATA_EXTENSION))
+        os.remove(self._get_path(name + RemainderQueue.CLAIMED_EXTENSION))
+
+    def delete_remainder(self, name: str) -> None:
+        os.remove(self._get_path(name + RemainderQueue.CLAIMED_EXTENSION))
+        os.remove(self._get_path(name + RemainderQueue.DATA_EXTENSION))
+
+    def _requeue_expired_claims(self) -> None:
+        expiration_time = time.time() - RemainderQueue.CLAIM_TIMEOUT_SECONDS
+
+        for file_name in os.listdir(self._directory):
+            if not file_name.endswith(RemainderQueue.CLAIMED_EXTENSION):
+                continue
+
+            claimed_path = self._get_path(file_name)
+
+            try:
+                if os.path.getmtime(claimed_path) < expiration_time:
+                    name = file_name[:-len(RemainderQueue.CLAIMED_EXTENSION)]
+                    os.rename(claimed_path, self._get_path(name + RemainderQueue.METADATA_EXTENSION))
+            except FileNotFoundError:
+                continue
+
+    def _get_path(self, file_name: str) -> str:
+        return os.path.join(self._directory, file_name)
@@ -0,0 +1,129 @@
+import requests
+import threading
+import concurrent.futures
+import asyncio
+import weakref
+
+from typing import Optional, List, Callable, Coroutine, Any, Tuple, TYPE_CHECKING
+from requests.adapters import HTTPAdapter
+from requests.sessions import Session
+from .throttling import RateLimiter, ThrottlingRetry
+
+if TYPE_CHECKING:
+    from .async_http_client import AsyncHttpClient
+
+
+class ShippingRuntime:
+
+    # Invocations that ship logs at the same time on a worker, each one runs a shipper thread.
+    MAX_SHIPPERS = 32
+
+    _instance: Optional['ShippingRuntime'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, senders_num: int, retries: int, backoff_factor: float, status_forcelist: List[int],
+                 max_requests_per_second: Optional[float] = None, max_bytes_per_second: Optional[float] = None) -> None:
+        self._config = ShippingRuntime._get_config(senders_num, retries, backoff_factor, status_forcelist,
+                                                   max_requests_per_second, max_bytes_per_second)
+        self._retries = retries
+        self._backoff_factor = backoff_factor
+        self._status_forcelist = status_forcelist
+        self._rate_limiter = RateLimiter(max_requests_per_second, max_bytes_per_second)
+        self._session = self._get_request_retry_session(senders_num, retries, backoff_factor, status_forcelist)
+        self._senders_executor = concurrent.futures.ThreadPoolExecutor(max_workers=senders_num,
+                                                                       thread_name_prefix='logzio-sender')
+        self._shippers_executor = concurrent.futures.ThreadPoolExecutor(max_workers=ShippingRuntime.MAX_SHIPPERS,
+                                                                        thread_name_prefix='logzio-shipper')
+        self._event_loop_lock = threading.Lock()
+        self._event_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_http_client: Optional['AsyncHttpClient'] = None
+
+    @staticmethod
+    def get_instance(senders_num: int, retries: int, backoff_factor: float, status_forcelist: List[int],
+                     max_requests_per_second: Optional[float] = None,
+                     max_bytes_per_second: Optional[float] = None) -> 'ShippingRuntime':
+        # The runtime is process wide: it is kept between invocations on the same worker, so the connections, threads
+        # and rate limits are shared by all of them. It is created again when the config changes, and the previous
+        # runtime is released when the shippers that use it finish.
+        config = ShippingRuntime._get_config(senders_num, retries, backoff_factor, status_forcelist,
+                                             max_requests_per_second, max_bytes_per_second)
+        instance = ShippingRuntime._instance
+
+        if instance is None or instance._config != config:
+            with ShippingRuntime._instance_lock:
+                instance = ShippingRuntime._instance
+
+                if instance is None or instance._config != config:
+                    instance = ShippingRuntime(senders_num, retries, backoff_factor, status_forcelist,
+                                               max_requests_per_second, max_bytes_per_second)
+                    ShippingRuntime._instance = instance
+
+        return instance
+
+    @staticmethod
+    def _get_config(senders_num: int, retries: int, backoff_factor: float, status_forcelist: List[int],
+                    max_requests_per_second: Optional[float],
+                    max_bytes_per_second: Optional[float]) -> Tuple[Any, ...]:
+        return (senders_num, retries, backoff_factor, tuple(status_forcelist), max_requests_per_second,
+                max_bytes_per_second)
+
+    @property
+    def session(self) -> Session:
+        return self._session
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        return self._rate_limiter
+
+    def submit_shipper(self, shipper: Callable[[], None]) -> concurrent.futures.Future:
+        return self._shippers_executor.submit(shipper)
+
+    def submit_sender(self, sender: Callable[..., None], *args: Any) -> concurrent.futures.Future:
+        return self._senders_executor.submit(sender, *args)
+
+    def get_async_http_client(self, max_connections: int, timeout: float) -> 'AsyncHttpClient':
+        # aiohttp is imported only by the ASYNCIO shipping backend.
+        from .async_http_client import AsyncHttpClient
+
+        with self._event_loop_lock:
+            if self._async_http_client is None:
+                self._async_http_client = AsyncHttpClient(max_connections, timeout, self._retries,
+                                                          self._backoff_factor, self._status_forcelist,
+                                                          self._rate_limiter)
+
+        return self._async_http_client
+
+    def submit_coroutine(self, coroutine: Coroutine) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._get_event_loop())
+
+    def _get_event_loop(self) -> asyncio.AbstractEventLoop:
+        # The event loop runs in its own thread for the life of the worker, like the executors.
+        with self._event_loop_lock:
+            if self._event_loop is None:
+                self._event_loop = asyncio.new_event_loop()
+                threading.Thread(target=self._event_loop.run_forever, name='logzio-event-loop', daemon=True).start()
+                # The executors threads exit when a replaced runtime is released, and so does the event loop thread.
+                weakref.finalize(self, self._event_loop.call_soon_threadsafe, self._event_loop.stop)
+
+        return self._event_loop
+
+    def _get_request_retry_session(self, senders_num: int, retries: int, backoff_factor: float,
+                                   status_forcelist: List[int]) -> Session:
+        session = requests.Session()
+        retry = ThrottlingRetry(
+            total=retries,
+            read=retries,
+            connect=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            allowed_methods=frozenset(['GET', 'POST']),
+            status_forcelist=status_forcelist,
+            rate_limiter=self._rate_limiter,
+        )
+        adapter = HTTPAdapter(pool_maxsize=senders_num, max_retries=retry)
+
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({"Content-Type": "application/json"})
+
+        return session
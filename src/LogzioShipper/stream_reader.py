@@ -0,0 +1,190 @@
+from typing import Generator, List
+from io import IOBase
+from collections import deque
+from itertools import chain
+from .decompressors import HEADER_SIZE_BYTES, get_decompressor
+
+
+class StreamReader:
+
+    CHUNK_SIZE_BYTES = 64 * 1024            # 64 KB
+
+    def __init__(self, file_stream: IOBase, chunk_size: int = CHUNK_SIZE_BYTES,
+                 is_empty_lines_kept: bool = False) -> None:
+        self._file_stream = file_stream
+        self._chunk_size = chunk_size
+        # Without empty lines, read and seek go line by line. With them, they go chunk by chunk, so a document that is
+        # one long line is never held in memory as a whole.
+        self._is_empty_lines_kept = is_empty_lines_kept
+        self._chunks = self._get_decompressed_chunks()
+        self._chunk = b''
+        self._chunk_position = 0
+        self._lines = self._get_lines() if is_empty_lines_kept else self._get_lines_without_empty_lines()
+        self._peeked_lines: deque = deque()
+        self._position = 0
+
+    def __iter__(self) -> Generator[bytes, None, None]:
+        while True:
+            line = self.readline()
+
+            if line == b'':
+                return
+
+            yield line
+
+    class BackwardSeekError(Exception):
+        pass
+
+    def readline(self) -> bytes:
+        if self._peeked_lines:
+            line = self._peeked_lines.popleft()
+        else:
+            line = next(self._lines, b'')
+
+        self._position += len(line)
+
+        return line
+
+    def read(self, size: int = -1) -> bytes:
+        parts: List[bytes] = []
+        parts_size = 0
+
+        while size < 0 or parts_size < size:
+            if self._is_empty_lines_kept and not self._peeked_lines:
+                part = self._read_chunk_part(size - parts_size if size >= 0 else -1)
+            else:
+                part = self.readline()
+
+            if part == b'':
+                break
+
+            if 0 <= size < parts_size + len(part):
+                part_end = size - parts_size
+                self._peeked_lines.appendleft(part[part_end:])
+                self._position -= len(part) - part_end
+                part = part[:part_end]
+
+            parts.append(part)
+            parts_size += len(part)
+
+        return b''.join(parts)
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int) -> int:
+        if offset < self._position:
+            raise self.BackwardSeekError("Can't seek back to offset {0} from offset {1} in a stream.".format(
+                offset, self._position))
+
+        while self._position < offset:
+            if self._is_empty_lines_kept:
+                data = self.read(min(offset - self._position, self._chunk_size))
+            else:
+                data = self.readline()
+
+            if data == b'':
+                break
+
+        return self._position
+
+    def peek_lines(self, lines_num: int) -> List[bytes]:
+        while len(self._peeked_lines) < lines_num:
+            line = next(self._lines, None)
+
+            if line is None:
+                break
+
+            self._peeked_lines.append(line)
+
+        return list(self._peeked_lines)[:lines_num]
+
+    def _get_chunks(self) -> Generator[bytes, None, None]:
+        while True:
+            chunk = self._file_stream.read(self._chunk_size)
+
+            if not chunk:
+                return
+
+            yield chunk
+
+    def _get_decompressed_chunks(self) -> Generator[bytes, None, None]:
+        chunks = self._get_chunks()
+        first_chunk = b''
+
+        for chunk in chunks:
+            first_chunk += chunk
+
+            if len(first_chunk) >= HEADER_SIZE_BYTES:
+                break
+
+        decompressor = get_decompressor(first_chunk, self._chunk_size)
+        chunks = chain([first_chunk], chunks)
+
+        if decompressor is None:
+            yield from chunks
+            return
+
+        yield from decompressor.decompress(chunks)
+
+    def _next_chunk(self) -> bool:
+        self._chunk = next(self._chunks, b'')
+        self._chunk_position = 0
+
+        return self._chunk != b''
+
+    def _read_chunk_part(self, size: int) -> bytes:
+        # Returns the rest of the current chunk, or of the next one, and up to size bytes of it.
+        while self._chunk_position >= len(self._chunk):
+            if not self._next_chunk():
+                return b''
+
+        end = len(self._chunk) if size < 0 else min(len(self._chunk), self._chunk_position + size)
+        part = self._chunk[self._chunk_position:end]
+        self._chunk_position = end
+        self._position += len(part)
+
+        return part
+
+    def _get_lines(self) -> Generator[bytes, None, None]:
+        # The chunk state is kept on the reader between lines, since read can consume from the same chunks.
+        while True:
+            chunk = self._chunk
+            start = self._chunk_position
+            end = chunk.find(b'\n', start)
+
+            if end != -1:
+                self._chunk_position = end + 1
+                yield chunk[start:end + 1]
+                continue
+
+            line = self._read_line_across_chunks()
+
+            if line == b'':
+                return
+
+            yield line
+
+    def _read_line_across_chunks(self) -> bytes:
+        partial_line: List[bytes] = []
+
+        while True:
+            if self._chunk_position < len(self._chunk):
+                end = self._chunk.find(b'\n', self._chunk_position)
+                line_end = len(self._chunk) if end == -1 else end + 1
+                partial_line.append(self._chunk[self._chunk_position:line_end])
+                self._chunk_position = line_end
+
+                if end != -1:
+                    break
+            elif not self._next_chunk():
+                break
+
+        return b''.join(partial_line)
+
+    def _get_lines_without_empty_lines(self) -> Generator[bytes, None, None]:
+        for line in self._get_lines():
+            if not line.strip():
+                continue
+
+            yield line
@@ -0,0 +1,105 @@
+import logging
+import hashlib
+
+from typing import Optional
+from io import IOBase
+from .checkpoint_store import TailState
+from .decompressors import HEADER_SIZE_BYTES, get_decompressor
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class TailStream:
+
+    SKIP_CHUNK_SIZE_BYTES = 1024 * 1024     # 1 MB
+
+    def __init__(self, file_stream: IOBase, file_size: int, tail_state: Optional[TailState]) -> None:
+        self._file_stream = file_stream
+        self._start_offset = 0
+        self._read_bytes = 0
+        self._pending_data = b''
+        self._is_tailing = True
+
+        if tail_state is not None and file_size >= tail_state.offset + tail_state.partial_line_size:
+            self._skip_to_tail(tail_state)
+        else:
+            self._check_is_compressed()
+
+    class RewrittenBlobError(Exception):
+        pass
+
+    @property
+    def is_tailing(self) -> bool:
+        return self._is_tailing
+
+    @property
+    def start_offset(self) -> int:
+        return self._start_offset
+
+    def get_tail_state(self) -> TailState:
+        return TailState(self._start_offset + self._read_bytes,
+                         hashlib.sha256(self._pending_data).hexdigest(),
+                         len(self._pending_data))
+
+    def read(self, size: int = -1) -> bytes:
+        if not self._is_tailing:
+            data, self._pending_data = self._pending_data + self._file_stream.read(size), b''
+            return data
+
+        while True:
+            new_data = self._file_stream.read(size)
+            data = self._pending_data + new_data
+            last_new_line_index = data.rfind(b'\n')
+
+            if last_new_line_index == -1:
+                self._pending_data = data
+
+                if not new_data:
+                    return b''
+
+                continue
+
+            self._pending_data = data[last_new_line_index + 1:]
+            self._read_bytes += last_new_line_index + 1
+
+            return data[:last_new_line_index + 1]
+
+    def _skip_to_tail(self, tail_state: TailState) -> None:
+        if self._file_stream.seekable():
+            self._file_stream.seek(tail_state.offset)
+        else:
+            skipped_bytes = 0
+
+            while skipped_bytes < tail_state.offset:
+                data = self._file_stream.read(min(TailStream.SKIP_CHUNK_SIZE_BYTES, tail_state.offset - skipped_bytes))
+
+                if not data:
+                    break
+
+                skipped_bytes += len(data)
+
+        partial_line = self._file_stream.read(tail_state.partial_line_size)
+
+        if hashlib.sha256(partial_line).hexdigest() != tail_state.partial_line_hash:
+            if not self._file_stream.seekable():
+                raise self.RewrittenBlobError("The blob was rewritten since offset {}.".format(tail_state.offset))
+
+            logger.warning("The blob was rewritten since offset {}. Processing the whole file.".format(
+                tail_state.offset))
+            self._file_stream.seek(0)
+            self._check_is_compressed()
+            return
+
+        self._start_offset = tail_state.offset
+        self._pending_data = partial_line
+
+    def _check_is_compressed(self) -> None:
+        self._pending_data = self._file_stream.read(HEADER_SIZE_BYTES)
+
+        if get_decompressor(self._pending_data, HEADER_SIZE_BYTES) is None:
+            return
+
+        logger.info('Compressed files are not tailed. Processing the whole file.')
+        self._is_tailing = False
@@ -1,11 +1,12 @@
 import logging
 import re
-import json
 
-from typing import Generator, Optional
+from typing import Generator, Optional, List, Pattern
 from io import BytesIO
-from datetime import datetime
 from .file_parser import FileParser
+from .log_record import LogRecord
+from .multiline_assembler import MultilineAssembler
+from . import json_codec
 
 
 logger = logging.getLogger(__name__)
@@ -14,91 +15,157 @@ logger.setLevel(logging.INFO)
 
 class TextParser(FileParser):
 
+    LINES_BATCH_SIZE = 1000
+
     def __init__(self, file_stream: BytesIO, multiline_regex: Optional[str] = None,
-                 datetime_finder: Optional[str] = None, datetime_format: Optional[str] = None) -> None:
+                 datetime_finder: Optional[str] = None, datetime_format: Optional[str] = None,
+                 multiline_mode: str = MultilineAssembler.FULL_MATCH_MODE,
+                 multiline_max_lines: int = MultilineAssembler.MAX_LINES,
+                 multiline_max_bytes: int = MultilineAssembler.MAX_BYTES) -> None:
         super().__init__(file_stream, datetime_finder, datetime_format)
         self._multiline_regex = multiline_regex
+        self._multiline_mode = multiline_mode
+        self._multiline_max_lines = multiline_max_lines
+        self._multiline_max_bytes = multiline_max_bytes
+        self._multiline_assembler: Optional[MultilineAssembler] = None
+        self._pending_lines_size = 0
+        self._datetime_finder_pattern = self._get_datetime_finder_pattern()
 
         if self._multiline_regex is None:
             logger.info('Text multiline is desabled.')
         else:
             logger.info('Text multiline is enabled.')
 
-    def parse_file(self) -> Generator[str, None, None]:
+    @property
+    def multiline_regex(self) -> Optional[str]:
+        return self._multiline_regex
+
+    @property
+    def offset(self) -> int:
+        if self._multiline_assembler is None:
+            return super().offset - self._pending_lines_size
+
+        return super().offset - self._multiline_assembler.pending_line_size
+
+    def parse_file(self) -> Generator[LogRecord, None, None]:
+        self._seek_start_offset()
+
         if self._multiline_regex is not None:
-            while True:
-                log = self._file_stream.readline().decode("utf-8")
-
-                if log == '':
-                    break
-                try:
-                    multiline_log = self._get_multiline_log(log)
-                except re.error:
-                    self._are_all_logs_parsed = False
-                    break
-
-                if multiline_log is None:
-                    logger.error("There is no match using the multiline regex {}".format(repr(self._multiline_regex)))
-                    self._are_all_logs_parsed = False
-                    break
-
-                yield self._get_json_log(multiline_log)
+            try:
+                self._multiline_assembler = self._get_multiline_assembler()
+            except re.error as e:
+                logger.error("Something is wrong with the multiline regex {0} - {1}".format(repr(self._multiline_regex),
+                                                                                            e))
+                self._are_all_logs_parsed = False
+                return
+
+            try:
+                for multiline_log in self._multiline_assembler.get_multiline_logs():
+                    yield self._get_json_log(multiline_log)
+            except MultilineAssembler.NoMatchError as e:
+                logger.error("There is no match using the multiline regex {0} - {1}".format(
+                    repr(self._multiline_regex), e))
+                self._are_all_logs_parsed = False
         else:
-            while True:
-                log = self._file_stream.readline().decode("utf-8").rstrip()
+            yield from self._get_logs()
 
-                if log == '':
-                    break
+    def get_log_datetime_value(self, log: LogRecord) -> Optional[str]:
+        if self._datetime_finder_pattern is None:
+            return None
 
-                yield self._get_json_log(log)
+        # The regex runs on the json encoded log, like it always did, so the existing datetime finders still match.
+        json_log = log.raw.decode('utf-8')
+        match = self._datetime_finder_pattern.search(json_log)
 
-    def get_log_datetime(self, log: str) -> Optional[datetime]:
-        if self._datetime_finder is None or self._datetime_format is None:
+        if match is None:
+            logger.error("No match has been found with datetime finder regex {0} for log - {1}".format(
+                self._datetime_finder, json_log))
             return None
 
+        # The same value that re.findall returns first.
+        if self._datetime_finder_pattern.groups == 1:
+            return match.group(1) or ''
+
+        return match.group(0)
+
+    def _is_sorted_search_supported(self) -> bool:
+        if self._multiline_regex is None:
+            return True
+
+        if self._multiline_mode == MultilineAssembler.FULL_MATCH_MODE:
+            return False
+
         try:
-            matches = re.findall(self._datetime_finder, log)
-        except re.error as e:
-            logger.error(
-                "Something is wrong with datetime finder regex {0} - {1}".format(repr(self._datetime_finder), e))
-            return None
+            self._multiline_assembler = self._get_multiline_assembler()
+        except re.error:
+            return False
 
-        if not matches:
-            logger.error("No match has been found with datetime finder regex {0} for log - {1}".format(
-                self._datetime_finder, log))
+        return True
+
+    def _is_log_start_line(self, line: bytes) -> bool:
+        if self._multiline_assembler is None:
+            return super()._is_log_start_line(line)
+
+        return self._multiline_assembler.is_multiline_log_start(line.decode("utf-8", errors="replace"))
+
+    def _get_line_log(self, line: bytes) -> Optional[LogRecord]:
+        return self._get_json_log(line.decode("utf-8", errors="replace").rstrip())
+
+    def _get_multiline_assembler(self) -> MultilineAssembler:
+        if self._multiline_assembler is not None:
+            return self._multiline_assembler
+
+        return MultilineAssembler(self._file_stream, self._multiline_regex, self._multiline_mode,
+                                  self._multiline_max_lines, self._multiline_max_bytes)
+
+    def _get_datetime_finder_pattern(self) -> Optional[Pattern]:
+        if self._datetime_finder is None:
             return None
 
         try:
-            log_datetime = datetime.strptime(matches[0], self._datetime_format)
-        except ValueError:
-            logger.error("datetime in log {0} does not match datetime format {1}".format(log, self._datetime_format))
-            return None
+            return re.compile(self._datetime_finder)
+        except re.error as e:
+            logger.error(
+                "Something is wrong with datetime finder regex {0} - {1}".format(repr(self._datetime_finder), e))
 
-        return log_datetime
+        return None
+
+    def _get_logs(self) -> Generator[LogRecord, None, None]:
+        is_json_log_needed = self._datetime_finder is not None and self._datetime_format is not None
 
-    def _get_multiline_log(self, multiline_log: str) -> Optional[str]:
         while True:
-            try:
-                if re.fullmatch(self._multiline_regex, multiline_log) is not None:
-                    return multiline_log
-                elif re.fullmatch(self._multiline_regex, multiline_log.rstrip()) is not None:
-                    return multiline_log.rstrip()
-            except re.error as e:
-                logger.error("Something is wrong with the multiline regex {0} - {1}".format(repr(self._multiline_regex),
-                                                                                            e))
-                raise
+            lines = self._read_lines_batch()
+
+            if not lines:
+                return
+
+            self._pending_lines_size = sum(len(line) for line in lines)
+            messages = [line.decode("utf-8").rstrip() for line in lines]
+            encoded_logs = iter(json_codec.encode_messages([message for message in messages if message != '']))
+
+            for line, message in zip(lines, messages):
+                self._pending_lines_size -= len(line)
+
+                if message == '':
+                    continue
+
+                if is_json_log_needed:
+                    yield LogRecord(next(encoded_logs), {'message': message})
+                else:
+                    yield LogRecord(next(encoded_logs))
 
-            line = self._file_stream.readline().decode("utf-8")
+    def _read_lines_batch(self) -> List[bytes]:
+        lines = []
 
-            if line == '':
-                return None
+        for _ in range(TextParser.LINES_BATCH_SIZE):
+            line = self._file_stream.readline()
 
-            multiline_log += line
+            if line == b'':
+                break
 
-    def _get_json_log(self, log: str) -> str:
-        json_log = '{"message": ""}'
-        json_log_data = json.loads(json_log)
+            lines.append(line)
 
-        json_log_data['message'] = log
+        return lines
 
-        return json.dumps(json_log_data)
+    def _get_json_log(self, log: str) -> LogRecord:
+        return LogRecord(json_log={'message': log})
@@ -0,0 +1,131 @@
+import threading
+import time
+import random
+import email.utils
+
+from typing import Any, Optional
+from urllib3.util.retry import Retry
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._update_time = time.monotonic()
+
+    def reserve(self, tokens: float, now: float) -> float:
+        self._tokens = min(self._capacity, self._tokens + (now - self._update_time) * self._rate)
+        self._update_time = now
+        # The tokens are taken even when there are not enough of them, the debt is paid by waiting.
+        self._tokens -= tokens
+
+        if self._tokens >= 0:
+            return 0
+
+        return -self._tokens / self._rate
+
+
+class RateLimiter:
+
+    def __init__(self, max_requests_per_second: Optional[float] = None,
+                 max_bytes_per_second: Optional[float] = None) -> None:
+        self._lock = threading.Lock()
+        self._requests_bucket = self._get_token_bucket(max_requests_per_second)
+        self._bytes_bucket = self._get_token_bucket(max_bytes_per_second)
+        self._paused_until = 0.0
+        self._waited_seconds = 0.0
+
+    @property
+    def waited_seconds(self) -> float:
+        return self._waited_seconds
+
+    def reserve(self, bytes_num: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait_seconds = max(self._paused_until - now, 0)
+
+            if self._requests_bucket is not None:
+                wait_seconds = max(wait_seconds, self._requests_bucket.reserve(1, now))
+
+            if self._bytes_bucket is not None:
+                wait_seconds = max(wait_seconds, self._bytes_bucket.reserve(bytes_num, now))
+
+            self._waited_seconds += wait_seconds
+
+            return wait_seconds
+
+    def acquire(self, bytes_num: int) -> None:
+        wait_seconds = self.reserve(bytes_num)
+
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+    def pause(self, seconds: float) -> None:
+        # A throttled request holds back all the senders of the worker, not only the one that was throttled.
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _get_token_bucket(self, rate: Optional[float]) -> Optional[TokenBucket]:
+        if rate is None:
+            return None
+
+        return TokenBucket(rate, rate)
+
+
+class ThrottlingRetry(Retry):
+
+    MAX_RETRY_AFTER_SECONDS = 60
+
+    def __init__(self, *args: Any, rate_limiter: Optional[RateLimiter] = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._rate_limiter = rate_limiter
+
+    @staticmethod
+    def get_jittered_seconds(seconds: float) -> float:
+        # Equal jitter, so retries of senders that failed together are spread out but still back off.
+        return random.uniform(seconds / 2, seconds)
+
+    @staticmethod
+    def get_retry_after_seconds(retry_after: Optional[str]) -> Optional[float]:
+        if not retry_after:
+            return None
+
+        try:
+            seconds = float(retry_after)
+        except ValueError:
+            try:
+                seconds = email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+
+        return min(max(seconds, 0), ThrottlingRetry.MAX_RETRY_AFTER_SECONDS)
+
+    def new(self, **kw: Any) -> 'ThrottlingRetry':
+        retry = super().new(**kw)
+        retry._rate_limiter = self._rate_limiter
+
+        return retry
+
+    def get_backoff_time(self) -> float:
+        return self.get_jittered_seconds(super().get_backoff_time())
+
+    def sleep_for_retry(self, response: Any) -> bool:
+        retry_after_seconds = self.get_retry_after_seconds(response.headers.get('Retry-After'))
+
+        if retry_after_seconds is None:
+            return False
+
+        if self._rate_limiter is not None:
+            self._rate_limiter.pause(retry_after_seconds)
+
+        time.sleep(retry_after_seconds)
+
+        return True
+
+    def sleep(self, response: Any = None) -> None:
+        super().sleep(response)
+
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire(0)
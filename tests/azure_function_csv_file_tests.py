@@ -1,7 +1,10 @@
 import unittest
 import logging
 import os
+import json
 import math
+import gzip
+import requests_mock
 
 from io import BytesIO
 from .tests_utils import TestsUtils
@@ -51,6 +54,8 @@ class TestAzureFunctionCsvFile(unittest.TestCase):
         os.environ[FileHandler.DATETIME_FILTER_ENVIRON_NAME] = FileHandler.NO_DATETIME_FILTER_VALUE
         os.environ[FileHandler.DATETIME_FINDER_ENVIRON_NAME] = FileHandler.NO_DATETIME_FINDER_VALUE
         os.environ[FileHandler.DATETIME_FORMAT_ENVIRON_NAME] = FileHandler.NO_DATETIME_FORMAT_VALUE
+        os.environ[FileHandler.STREAMING_INGESTION_ENVIRON_NAME] = FileHandler.FALSE_VALUE
+        os.environ[FileHandler.DISK_SPILL_THRESHOLD_ENVIRON_NAME] = FileHandler.NO_DISK_SPILL_VALUE
 
         TestAzureFunctionCsvFile.csv_comma_delimiter_stream.seek(0)
         TestAzureFunctionCsvFile.csv_semicolon_delimiter_stream.seek(0)
@@ -79,6 +84,44 @@ class TestAzureFunctionCsvFile(unittest.TestCase):
 
         self.assertEqual(stream_logs_num - 1, parsed_logs_num)
 
+    def test_parse_csv_multiline_fields(self) -> None:
+        csv_stream = BytesIO(b'log_type,message,datetime\n'
+                             b'ERROR,"something went wrong:\n""timeout""",2021-10-31T10:10:10\n'
+                             b'INFO,sent successfully\n'
+                             b'\n'
+                             b'DEBUG,caf\xc3\xa9,2021-10-31T10:10:10,extra\n')
+        csv_parser = CsvParser(csv_stream, TestAzureFunctionCsvFile.CSV_COMMA_DELIMITER)
+
+        logs = [log.raw for log in csv_parser.parse_file()]
+
+        self.assertEqual([json.dumps({'log_type': 'ERROR', 'message': 'something went wrong:\n"timeout"',
+                                      'datetime': '2021-10-31T10:10:10'}).encode('utf-8'),
+                          json.dumps({'log_type': 'INFO', 'message': 'sent successfully',
+                                      'datetime': None}).encode('utf-8'),
+                          json.dumps({'log_type': 'DEBUG', 'message': 'café', 'datetime': '2021-10-31T10:10:10',
+                                      None: ['extra']}).encode('utf-8')],
+                         logs)
+
+    def test_send_csv_empty_lines_in_quoted_fields(self) -> None:
+        csv_data = b'a,b\n\n1,"line1\n\nline3"\n\n2,line4\n'
+        sent_logs = []
+
+        for is_streaming_ingestion in (FileHandler.FALSE_VALUE, FileHandler.TRUE_VALUE):
+            os.environ[FileHandler.STREAMING_INGESTION_ENVIRON_NAME] = is_streaming_ingestion
+            csv_file_handler = FileHandler(TestAzureFunctionCsvFile.CSV_COMMA_DELIMITER_LOG_FILE, BytesIO(csv_data),
+                                           len(csv_data))
+
+            with requests_mock.Mocker() as mocker:
+                mocker.register_uri('POST', os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME], status_code=200)
+                csv_file_handler.handle_file()
+
+            sent_logs.append([json.loads(log) for request in mocker.request_history
+                              for log in gzip.decompress(request.body).splitlines()])
+
+        for logs in sent_logs:
+            self.assertEqual([{'a': '1', 'b': 'line1\n\nline3'}, {'a': '2', 'b': 'line4'}],
+                             [{'a': log['a'], 'b': log['b']} for log in logs])
+
     def test_send_csv_comma_delimiter_data(self) -> None:
         csv_comma_file_handler = self.tests_utils.create_file_handler(
             TestAzureFunctionCsvFile.CSV_COMMA_DELIMITER_LOG_FILE,
@@ -157,6 +200,25 @@ class TestAzureFunctionCsvFile(unittest.TestCase):
         self.assertEqual(regular_sent_logs_num, gz_sent_logs_num)
         self.assertEqual(regular_sent_bytes, gz_sent_bytes)
 
+    def test_send_csv_semicolon_delimiter_streaming_data(self) -> None:
+        csv_semicolon_file_handler = self.tests_utils.create_file_handler(
+            TestAzureFunctionCsvFile.CSV_SEMICOLON_DELIMITER_FILE,
+            TestAzureFunctionCsvFile.csv_semicolon_delimiter_stream,
+            TestAzureFunctionCsvFile.csv_semicolon_delimiter_size)
+        _, regular_sent_logs_num, regular_sent_bytes = self.tests_utils.get_sending_file_results(
+            csv_semicolon_file_handler)
+
+        os.environ[FileHandler.STREAMING_INGESTION_ENVIRON_NAME] = FileHandler.TRUE_VALUE
+
+        csv_semicolon_streaming_file_handler = FileHandler(TestAzureFunctionCsvFile.CSV_SEMICOLON_DELIMITER_FILE,
+                                                           TestAzureFunctionCsvFile.csv_semicolon_delimiter_stream,
+                                                           TestAzureFunctionCsvFile.csv_semicolon_delimiter_size)
+        _, streaming_sent_logs_num, streaming_sent_bytes = self.tests_utils.get_sending_file_results(
+            csv_semicolon_streaming_file_handler)
+
+        self.assertEqual(regular_sent_logs_num, streaming_sent_logs_num)
+        self.assertEqual(regular_sent_bytes, streaming_sent_bytes)
+
     def test_datetime_filter(self) -> None:
         os.environ[FileHandler.DATETIME_FILTER_ENVIRON_NAME] = TestAzureFunctionCsvFile.DATETIME_FILTER
         os.environ[FileHandler.DATETIME_FINDER_ENVIRON_NAME] = TestAzureFunctionCsvFile.DATETIME_FINDER
@@ -2,15 +2,35 @@ import unittest
 import logging
 import requests
 import os
+import tempfile
 import httpretty
+import requests_mock
+import threading
+import time
+import json
+import gzip
+import zlib
+import concurrent.futures
 
 from io import BytesIO
+from jsonpath_ng import parse
+from unittest.mock import patch
 from requests.sessions import InvalidSchema
-from .tests_utils import TestsUtils
+from .tests_utils import TestsUtils, LocalListener
 from src.LogzioShipper.file_handler import FileHandler
 from src.LogzioShipper.json_parser import JsonParser
 from src.LogzioShipper.consumer_producer_queues import ConsumerProducerQueues
 from src.LogzioShipper.logzio_shipper import LogzioShipper
+from src.LogzioShipper.async_logzio_shipper import AsyncLogzioShipper
+from src.LogzioShipper.checkpoint_store import SqliteCheckpointStore
+from src.LogzioShipper.dead_letter_store import DirectoryDeadLetterStore
+from src.LogzioShipper.remainder_queue import RemainderQueue
+from src.LogzioShipper.datetime_filter import DatetimeFilter
+from src.LogzioShipper.json_path_accessor import JsonPathAccessor
+from src.LogzioShipper.shipping_runtime import ShippingRuntime
+from src.LogzioShipper.throttling import RateLimiter
+from src.LogzioShipper.log_record import LogRecord
+from src.LogzioShipper.custom_field import CustomField
 
 
 logger = logging.getLogger(__name__)
@@ -22,6 +42,8 @@ class TestAzureFunctionGeneral(unittest.TestCase):
     BAD_LOGZIO_URL = 'https://bad.endpoint:1234'
     BAD_URI = 'https:/bad.uri:1234'
     BAD_CONNECTION_ADAPTER_URL = 'bad://connection.adapter:1234'
+    ETAG = '0x8D9A1B2C3D4E5F6'
+    CHECKPOINT_BULK_SIZE_BYTES = 10 * 1024
 
     json_stream: BytesIO = None
     json_size = 0
@@ -96,6 +118,21 @@ class TestAzureFunctionGeneral(unittest.TestCase):
 
         self.assertEqual(LogzioShipper.MAX_RETRIES + 1, requests_num)
 
+    @httpretty.activate
+    def test_send_retry_status_429_retry_after(self) -> None:
+        httpretty.register_uri(httpretty.POST, os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME],
+                               responses=[httpretty.Response(body='', status=429, adding_headers={'Retry-After': '1'}),
+                                          httpretty.Response(body='', status=200)])
+
+        start_time = time.monotonic()
+        self.file_handler.handle_file()
+        elapsed_seconds = time.monotonic() - start_time
+
+        requests_num = len(httpretty.latest_requests()) / 2
+
+        self.assertEqual(2, requests_num)
+        self.assertGreaterEqual(elapsed_seconds, 1)
+
     @httpretty.activate
     def test_send_bad_format(self) -> None:
         httpretty.register_uri(httpretty.POST, os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME], status=400)
@@ -162,6 +199,619 @@ class TestAzureFunctionGeneral(unittest.TestCase):
 
         self.assertEqual(InvalidSchema, type(logzio_shipper.exception))
 
+    def test_resume_from_checkpoint(self) -> None:
+        checkpoint_sqlite_path = os.path.join(tempfile.mkdtemp(), 'checkpoints.db')
+        checkpoint_store = SqliteCheckpointStore(checkpoint_sqlite_path)
+
+        os.environ[FileHandler.CHECKPOINT_STORE_ENVIRON_NAME] = FileHandler.SQLITE_CHECKPOINT_VALUE
+        os.environ[FileHandler.CHECKPOINT_SQLITE_PATH_ENVIRON_NAME] = checkpoint_sqlite_path
+        set_offset = SqliteCheckpointStore.set_offset
+        are_shipper_locks_held = []
+
+        def set_offset_without_lock(store: SqliteCheckpointStore, blob_name: str, etag: str, offset: int) -> None:
+            # The checkpoint is written without holding the lock of the shipper.
+            are_shipper_locks_held.append(failing_file_handler._logzio_shipper._lock.locked())
+            set_offset(store, blob_name, etag, offset)
+
+        try:
+            # A runtime with a single sender, so the bulks are answered in the order they were made.
+            with patch.object(LogzioShipper, 'MAX_WORKERS', 1), patch.object(ShippingRuntime, '_instance', None), \
+                    patch.object(LogzioShipper, 'MAX_BULK_SIZE_BYTES', TestAzureFunctionGeneral.CHECKPOINT_BULK_SIZE_BYTES):
+                TestAzureFunctionGeneral.json_stream.seek(0)
+                failing_file_handler = FileHandler(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE,
+                                                   TestAzureFunctionGeneral.json_stream,
+                                                   TestAzureFunctionGeneral.json_size,
+                                                   TestAzureFunctionGeneral.ETAG)
+
+                with requests_mock.Mocker() as mocker, \
+                        patch.object(SqliteCheckpointStore, 'set_offset', set_offset_without_lock):
+                    mocker.register_uri('POST', os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME],
+                                        [{'status_code': 200}] * 3 + [{'status_code': 400}])
+
+                    with self.assertRaises(FileHandler.FailedToSendLogsError):
+                        failing_file_handler.handle_file()
+
+                checkpoint_offset = checkpoint_store.get_offset(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE,
+                                                                TestAzureFunctionGeneral.ETAG)
+
+                TestAzureFunctionGeneral.json_stream.seek(0)
+                resumed_file_handler = FileHandler(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE,
+                                                   TestAzureFunctionGeneral.json_stream,
+                                                   TestAzureFunctionGeneral.json_size,
+                                                   TestAzureFunctionGeneral.ETAG)
+                _, sent_logs_num, _ = self.tests_utils.get_sending_file_results(resumed_file_handler)
+        finally:
+            os.environ[FileHandler.CHECKPOINT_STORE_ENVIRON_NAME] = FileHandler.NO_CHECKPOINT_VALUE
+
+        remaining_logs_num = len(TestAzureFunctionGeneral.json_stream.getvalue()[checkpoint_offset:].splitlines())
+
+        self.assertGreater(checkpoint_offset, 0)
+        self.assertLess(checkpoint_offset, TestAzureFunctionGeneral.json_size)
+        self.assertEqual(remaining_logs_num, sent_logs_num)
+        self.assertEqual(3, len(are_shipper_locks_held))
+        self.assertFalse(any(are_shipper_locks_held))
+        self.assertEqual(0, checkpoint_store.get_offset(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE,
+                                                        TestAzureFunctionGeneral.ETAG))
+
+    def test_dead_letter_spill_and_replay(self) -> None:
+        dead_letter_directory = tempfile.mkdtemp()
+        dead_letter_store = DirectoryDeadLetterStore(dead_letter_directory)
+
+        os.environ[FileHandler.DEAD_LETTER_STORE_ENVIRON_NAME] = FileHandler.DIRECTORY_DEAD_LETTER_VALUE
+        os.environ[FileHandler.DEAD_LETTER_DIRECTORY_ENVIRON_NAME] = dead_letter_directory
+
+        try:
+            with patch.object(LogzioShipper, 'MAX_BULK_SIZE_BYTES', TestAzureFunctionGeneral.CHECKPOINT_BULK_SIZE_BYTES):
+                TestAzureFunctionGeneral.json_stream.seek(0)
+                spilling_file_handler = FileHandler(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE,
+                                                    TestAzureFunctionGeneral.json_stream,
+                                                    TestAzureFunctionGeneral.json_size)
+
+                spilled_bodies = []
+                lock = threading.Lock()
+
+                def send_bulk(request, context) -> str:
+                    # Every second bulk fails as if the listener was unavailable.
+                    with lock:
+                        if len(spilled_bodies) < 2 and len(mocker.request_history) % 2 == 0:
+                            spilled_bodies.append(request.body)
+                            context.status_code = 503
+
+                    return ''
+
+                with requests_mock.Mocker() as mocker:
+                    mocker.register_uri('POST', os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME], text=send_bulk)
+                    spilling_file_handler.handle_file()
+
+                dead_letters = [dead_letter_store.get_dead_letter(dead_letter_name)
+                                for dead_letter_name in dead_letter_store.get_dead_letters_names()]
+
+                TestAzureFunctionGeneral.json_stream.seek(0)
+                replaying_file_handler = FileHandler(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE,
+                                                     TestAzureFunctionGeneral.json_stream,
+                                                     TestAzureFunctionGeneral.json_size)
+
+                with requests_mock.Mocker() as mocker:
+                    mocker.register_uri('POST', os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME], status_code=200)
+                    replaying_file_handler.handle_file()
+
+                replayed_bodies = [request.body for request in mocker.request_history[:len(spilled_bodies)]]
+        finally:
+            os.environ[FileHandler.DEAD_LETTER_STORE_ENVIRON_NAME] = FileHandler.NO_DEAD_LETTER_VALUE
+
+        self.assertEqual(2, len(spilled_bodies))
+        self.assertEqual(sorted(spilled_bodies), sorted(dead_letter.payload for dead_letter in dead_letters))
+        self.assertEqual([TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE] * 2,
+                         [dead_letter.metadata['file_name'] for dead_letter in dead_letters])
+        self.assertNotIn(os.environ[FileHandler.LOGZIO_TOKEN_ENVIRON_NAME], dead_letters[0].metadata['error'])
+        self.assertEqual(sorted(spilled_bodies), sorted(replayed_bodies))
+        self.assertEqual([], dead_letter_store.get_dead_letters_names())
+
+    def test_dead_letter_quarantine(self) -> None:
+        dead_letter_directory = tempfile.mkdtemp()
+        dead_letter_store = DirectoryDeadLetterStore(dead_letter_directory)
+        dead_letter_name = dead_letter_store.put_dead_letter(
+            gzip.compress(b'{"message": "rejected"}'), {'file_name': TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE})
+
+        os.environ[FileHandler.DEAD_LETTER_STORE_ENVIRON_NAME] = FileHandler.DIRECTORY_DEAD_LETTER_VALUE
+        os.environ[FileHandler.DEAD_LETTER_DIRECTORY_ENVIRON_NAME] = dead_letter_directory
+
+        try:
+            TestAzureFunctionGeneral.json_stream.seek(0)
+            file_handler = FileHandler(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE,
+                                       TestAzureFunctionGeneral.json_stream,
+                                       TestAzureFunctionGeneral.json_size)
+
+            with requests_mock.Mocker() as mocker:
+                mocker.register_uri('POST', os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME], status_code=400)
+                file_handler._logzio_shipper.replay_dead_letters(time.monotonic())
+                deadline_requests_num = len(mocker.request_history)
+                deadline_dead_letters_names = dead_letter_store.get_dead_letters_names()
+
+                file_handler._logzio_shipper.replay_dead_letters()
+                requests_num = len(mocker.request_history)
+        finally:
+            os.environ[FileHandler.DEAD_LETTER_STORE_ENVIRON_NAME] = FileHandler.NO_DEAD_LETTER_VALUE
+
+        self.assertEqual(0, deadline_requests_num)
+        self.assertEqual([dead_letter_name], deadline_dead_letters_names)
+        self.assertEqual(1, requests_num)
+        self.assertEqual([], dead_letter_store.get_dead_letters_names())
+        self.assertEqual(sorted([dead_letter_name + DirectoryDeadLetterStore.PAYLOAD_EXTENSION,
+                                 dead_letter_name + DirectoryDeadLetterStore.METADATA_EXTENSION]),
+                         sorted(os.listdir(os.path.join(dead_letter_directory,
+                                                        DirectoryDeadLetterStore.QUARANTINE_DIRECTORY_NAME))))
+
+    def test_processing_deadline(self) -> None:
+        remainder_queue_directory = tempfile.mkdtemp()
+
+        os.environ[FileHandler.REMAINDER_QUEUE_DIRECTORY_ENVIRON_NAME] = remainder_queue_directory
+        os.environ[FileHandler.MAX_IN_FLIGHT_BYTES_ENVIRON_NAME] = str(TestAzureFunctionGeneral.CHECKPOINT_BULK_SIZE_BYTES)
+        os.environ[FileHandler.MAX_IN_FLIGHT_BULKS_ENVIRON_NAME] = '1'
+
+        def send_bulk(request, context) -> str:
+            # A slow listener, so the parser is held back by the in flight budgets until the deadline.
+            time.sleep(0.1)
+            return ''
+
+        try:
+            with patch.object(LogzioShipper, 'MAX_BULK_SIZE_BYTES', TestAzureFunctionGeneral.CHECKPOINT_BULK_SIZE_BYTES), \
+                    patch.object(ConsumerProducerQueues, 'LOGS_BATCH_SIZE', 10):
+                TestAzureFunctionGeneral.json_stream.seek(0)
+                file_handler = FileHandler(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE,
+                                           TestAzureFunctionGeneral.json_stream,
+                                           TestAzureFunctionGeneral.json_size,
+                                           TestAzureFunctionGeneral.ETAG,
+                                           deadline=time.monotonic() + 0.3)
+
+                with requests_mock.Mocker() as mocker, self.assertLogs('src.LogzioShipper.file_handler') as logs:
+                    mocker.register_uri('POST', os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME], text=send_bulk)
+                    file_handler.handle_file()
+
+                sent_logs_num = sum(len(gzip.decompress(request.body).splitlines())
+                                    for request in mocker.request_history)
+                remainder_name, metadata = RemainderQueue(remainder_queue_directory).claim_remainder()
+                RemainderQueue(remainder_queue_directory).release_remainder(remainder_name, metadata)
+
+                # Remainders get only part of the time that is left before the deadline.
+                with patch.object(FileHandler, 'REMAINDERS_DEADLINE_RATIO', 0):
+                    FileHandler.handle_remainders(time.monotonic() + 60)
+
+                remainder_name, metadata = RemainderQueue(remainder_queue_directory).claim_remainder()
+                RemainderQueue(remainder_queue_directory).release_remainder(remainder_name, metadata)
+
+                with requests_mock.Mocker() as mocker:
+                    mocker.register_uri('POST', os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME], status_code=200)
+                    FileHandler.handle_remainders(None)
+
+                remaining_sent_logs_num = sum(len(gzip.decompress(request.body).splitlines())
+                                              for request in mocker.request_history)
+
+                # Without a remainder queue or a checkpoint the deadline is ignored, so the whole file is sent.
+                os.environ[FileHandler.REMAINDER_QUEUE_DIRECTORY_ENVIRON_NAME] = FileHandler.NO_REMAINDER_QUEUE_VALUE
+                TestAzureFunctionGeneral.json_stream.seek(0)
+                file_handler = FileHandler(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE,
+                                           TestAzureFunctionGeneral.json_stream,
+                                           TestAzureFunctionGeneral.json_size,
+                                           deadline=time.monotonic())
+
+                with requests_mock.Mocker() as mocker:
+                    mocker.register_uri('POST', os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME], status_code=200)
+                    file_handler.handle_file()
+
+                no_deadline_sent_logs_num = sum(len(gzip.decompress(request.body).splitlines())
+                                                for request in mocker.request_history)
+
+                # With only a checkpoint the file fails at the deadline, so the host retry resumes it.
+                os.environ[FileHandler.CHECKPOINT_STORE_ENVIRON_NAME] = FileHandler.SQLITE_CHECKPOINT_VALUE
+                os.environ[FileHandler.CHECKPOINT_SQLITE_PATH_ENVIRON_NAME] = os.path.join(tempfile.mkdtemp(),
+                                                                                           'checkpoints.db')
+                TestAzureFunctionGeneral.json_stream.seek(0)
+                file_handler = FileHandler(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE,
+                                           TestAzureFunctionGeneral.json_stream,
+                                           TestAzureFunctionGeneral.json_size,
+                                           deadline=time.monotonic())
+
+                with requests_mock.Mocker() as mocker, self.assertRaises(FileHandler.DeadlineReachedError):
+                    mocker.register_uri('POST', os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME], status_code=200)
+                    file_handler.handle_file()
+        finally:
+            os.environ[FileHandler.REMAINDER_QUEUE_DIRECTORY_ENVIRON_NAME] = FileHandler.NO_REMAINDER_QUEUE_VALUE
+            os.environ[FileHandler.CHECKPOINT_STORE_ENVIRON_NAME] = FileHandler.NO_CHECKPOINT_VALUE
+            del os.environ[FileHandler.MAX_IN_FLIGHT_BYTES_ENVIRON_NAME]
+            del os.environ[FileHandler.MAX_IN_FLIGHT_BULKS_ENVIRON_NAME]
+
+        logs_num = len(TestAzureFunctionGeneral.json_stream.getvalue().splitlines())
+
+        self.assertIn("INFO:src.LogzioShipper.file_handler:Partially processed file - {}, the remainder was "
+                      "queued.".format(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE), logs.output)
+        self.assertFalse(any('Successfully finished processing file' in log for log in logs.output))
+        self.assertEqual(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE, metadata['file_name'])
+        self.assertGreater(metadata['offset'], 0)
+        self.assertLess(metadata['offset'], TestAzureFunctionGeneral.json_size)
+        self.assertEqual(len(TestAzureFunctionGeneral.json_stream.getvalue()[:metadata['offset']].splitlines()),
+                         sent_logs_num)
+        self.assertEqual(logs_num, sent_logs_num + remaining_sent_logs_num)
+        self.assertIsNone(RemainderQueue(remainder_queue_directory).claim_remainder())
+        self.assertEqual(logs_num, no_deadline_sent_logs_num)
+
+    def test_remainder_attempts(self) -> None:
+        remainder_queue_directory = tempfile.mkdtemp()
+        remainder_queue = RemainderQueue(remainder_queue_directory)
+        offset = len(TestAzureFunctionGeneral.json_stream.getvalue().splitlines(keepends=True)[0])
+
+        TestAzureFunctionGeneral.json_stream.seek(0)
+        remainder_queue.put_remainder(TestAzureFunctionGeneral.json_stream,
+                                      {'file_name': TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE,
+                                       'etag': TestAzureFunctionGeneral.ETAG, 'offset': offset, 'attempts': 0})
+        os.environ[FileHandler.REMAINDER_QUEUE_DIRECTORY_ENVIRON_NAME] = remainder_queue_directory
+        attempts = []
+
+        try:
+            with requests_mock.Mocker() as mocker, self.assertLogs('src.LogzioShipper.file_handler') as logs:
+                mocker.register_uri('POST', os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME], status_code=200)
+
+                # The deadline is reached before any log is delivered, so the offset of the remainder doesn't advance.
+                for _ in range(FileHandler.MAX_REMAINDER_ATTEMPTS):
+                    remainder_name, metadata = remainder_queue.claim_remainder()
+                    FileHandler._handle_remainder(remainder_queue, remainder_name, metadata, time.monotonic())
+                    attempts.append(metadata['attempts'])
+                    data_files_num = len([file_name for file_name in os.listdir(remainder_queue_directory)
+                                          if file_name.endswith(RemainderQueue.DATA_EXTENSION)])
+
+                    if data_files_num == 0:
+                        break
+
+                    self.assertEqual(1, data_files_num)
+        finally:
+            os.environ[FileHandler.REMAINDER_QUEUE_DIRECTORY_ENVIRON_NAME] = FileHandler.NO_REMAINDER_QUEUE_VALUE
+
+        self.assertEqual(list(range(FileHandler.MAX_REMAINDER_ATTEMPTS)), attempts)
+        self.assertEqual(0, len(mocker.request_history))
+        self.assertIsNone(remainder_queue.claim_remainder())
+        self.assertIn("ERROR:src.LogzioShipper.file_handler:The rest of file {0} was not processed from offset {1} "
+                      "{2} times. Giving up on it.".format(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE, offset,
+                                                           FileHandler.MAX_REMAINDER_ATTEMPTS), logs.output)
+
+    def test_parser_error_ends_shipper(self) -> None:
+        logs = b''.join(b'{"message": "log number %d"}\n' % log_num for log_num in range(200000))
+        corrupt_gz_data = bytearray(gzip.compress(logs))
+        corrupt_gz_data[len(corrupt_gz_data) // 2:len(corrupt_gz_data) // 2 + 16] = b'\xff' * 16
+        logzio_shippers_futures = []
+        start_logzio_shipper = LogzioShipper.start_logzio_shipper
+
+        def start_and_keep_logzio_shipper(logzio_shipper: LogzioShipper) -> concurrent.futures.Future:
+            logzio_shipper_future = start_logzio_shipper(logzio_shipper)
+            logzio_shippers_futures.append(logzio_shipper_future)
+
+            return logzio_shipper_future
+
+        os.environ[FileHandler.STREAMING_INGESTION_ENVIRON_NAME] = FileHandler.TRUE_VALUE
+
+        try:
+            file_handler = FileHandler(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE, BytesIO(corrupt_gz_data),
+                                       len(corrupt_gz_data))
+
+            with requests_mock.Mocker() as mocker, \
+                    patch.object(LogzioShipper, 'start_logzio_shipper', start_and_keep_logzio_shipper):
+                mocker.register_uri('POST', os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME], status_code=200)
+
+                with self.assertRaises(zlib.error):
+                    file_handler.handle_file()
+        finally:
+            os.environ[FileHandler.STREAMING_INGESTION_ENVIRON_NAME] = FileHandler.FALSE_VALUE
+
+        sent_logs_num = sum(len(gzip.decompress(request.body).splitlines()) for request in mocker.request_history)
+
+        self.assertEqual(1, len(logzio_shippers_futures))
+        self.assertTrue(logzio_shippers_futures[0].done())
+        self.assertLess(sent_logs_num, 200000)
+
+    def test_failed_shipper_releases_parser(self) -> None:
+        os.environ[FileHandler.MAX_IN_FLIGHT_BYTES_ENVIRON_NAME] = '1000'
+
+        def add_log(logzio_shipper: LogzioShipper, log: LogRecord, offset: int) -> None:
+            raise RuntimeError("The shipper failed.")
+
+        try:
+            TestAzureFunctionGeneral.json_stream.seek(0)
+            file_handler = FileHandler(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE,
+                                       TestAzureFunctionGeneral.json_stream,
+                                       TestAzureFunctionGeneral.json_size)
+
+            with patch.object(ConsumerProducerQueues, 'LOGS_BATCH_SIZE', 1), \
+                    patch.object(LogzioShipper, '_add_log', add_log):
+                with self.assertRaises(FileHandler.FailedToSendLogsError):
+                    file_handler.handle_file()
+        finally:
+            del os.environ[FileHandler.MAX_IN_FLIGHT_BYTES_ENVIRON_NAME]
+
+    def test_append_blob_tailing(self) -> None:
+        os.environ[FileHandler.CHECKPOINT_STORE_ENVIRON_NAME] = FileHandler.SQLITE_CHECKPOINT_VALUE
+        os.environ[FileHandler.CHECKPOINT_SQLITE_PATH_ENVIRON_NAME] = os.path.join(tempfile.mkdtemp(), 'checkpoints.db')
+        os.environ[FileHandler.APPEND_BLOB_TAILING_ENVIRON_NAME] = FileHandler.TRUE_VALUE
+
+        lines = TestAzureFunctionGeneral.json_stream.getvalue().splitlines(keepends=True)
+        blob_versions = [b''.join(lines[:10]) + lines[10][:20],
+                         b''.join(lines[:15]),
+                         b''.join(lines[:15]),
+                         b''.join(lines[5:15])]
+        sent_logs_nums = []
+
+        try:
+            for blob_version in blob_versions:
+                tail_file_handler = FileHandler(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE,
+                                                BytesIO(blob_version),
+                                                len(blob_version))
+                _, sent_logs_num, _ = self.tests_utils.get_sending_file_results(tail_file_handler)
+                sent_logs_nums.append(sent_logs_num)
+        finally:
+            os.environ[FileHandler.CHECKPOINT_STORE_ENVIRON_NAME] = FileHandler.NO_CHECKPOINT_VALUE
+            os.environ[FileHandler.APPEND_BLOB_TAILING_ENVIRON_NAME] = FileHandler.FALSE_VALUE
+
+        self.assertEqual([10, 5, 0, 10], sent_logs_nums)
+
+    def test_blob_skip_rules(self) -> None:
+        os.environ[FileHandler.BLOB_INCLUDE_PATTERNS_ENVIRON_NAME] = 'logs/*.json, logs/*.gz'
+        os.environ[FileHandler.BLOB_EXCLUDE_PATTERNS_ENVIRON_NAME] = '*/archive/*'
+        os.environ[FileHandler.PARTITION_DATETIME_FILTER_ENVIRON_NAME] = FileHandler.TRUE_VALUE
+        os.environ[FileHandler.DATETIME_FILTER_ENVIRON_NAME] = '2024-05-01T13:30:00+02:00'
+        os.environ[FileHandler.DATETIME_FORMAT_ENVIRON_NAME] = '%Y-%m-%dT%H:%M:%S%z'
+
+        try:
+            self.assertTrue(FileHandler.is_file_skipped('logs/app.json', 0))
+            self.assertTrue(FileHandler.is_file_skipped('logs/app.txt', 100))
+            self.assertTrue(FileHandler.is_file_skipped('logs/archive/app.json', 100))
+            self.assertTrue(FileHandler.is_file_skipped('logs/y=2024/m=05/d=01/h=10/m=00/PT1H.json', 100))
+            self.assertTrue(FileHandler.is_file_skipped('logs/y=2024/m=04/PT1H.json', 100))
+            self.assertFalse(FileHandler.is_file_skipped('logs/y=2024/m=05/d=01/h=11/m=00/PT1H.json', 100))
+            self.assertFalse(FileHandler.is_file_skipped('logs/y=2024/m=05/PT1H.json', 100))
+            self.assertFalse(FileHandler.is_file_skipped('logs/app.json', 100))
+
+            os.environ[FileHandler.PARTITION_DATETIME_FILTER_ENVIRON_NAME] = FileHandler.FALSE_VALUE
+
+            self.assertFalse(FileHandler.is_file_skipped('logs/y=2024/m=05/d=01/h=10/m=00/PT1H.json', 100))
+        finally:
+            TestsUtils.set_up(FileHandler.JSON_FORMAT_VALUE)
+
+    def test_datetime_filter_formats(self) -> None:
+        lexicographic_filter = DatetimeFilter('2021-11-01T10:10:10', '%Y-%m-%dT%H:%M:%S')
+        iso_filter = DatetimeFilter('2021-11-01T10:10:10.000+00:00', '%Y-%m-%dT%H:%M:%S.%f%z')
+        epoch_filter = DatetimeFilter('1635761410', DatetimeFilter.EPOCH_SECONDS_FORMAT)
+        strptime_filter = DatetimeFilter('01/Nov/2021:10:10:10', '%d/%b/%Y:%H:%M:%S')
+
+        self.assertTrue(lexicographic_filter.is_timestamp_greater_or_equal_filter(
+            lexicographic_filter.get_timestamp('2021-11-01T10:10:10')))
+        self.assertFalse(lexicographic_filter.is_timestamp_greater_or_equal_filter(
+            lexicographic_filter.get_timestamp('2021-10-31T23:59:59')))
+        self.assertFalse(lexicographic_filter.is_timestamp_greater_or_equal_filter(
+            lexicographic_filter.get_timestamp('2021-9-30T10:10:10')))
+        self.assertTrue(iso_filter.is_timestamp_greater_or_equal_filter(
+            iso_filter.get_timestamp('2021-11-01T12:10:10.000+02:00')))
+        self.assertFalse(iso_filter.is_timestamp_greater_or_equal_filter(
+            iso_filter.get_timestamp('2021-11-01T12:10:10.0+02:30')))
+        self.assertTrue(epoch_filter.is_timestamp_greater_or_equal_filter(epoch_filter.get_timestamp(1635761411)))
+        self.assertFalse(epoch_filter.is_timestamp_greater_or_equal_filter(epoch_filter.get_timestamp('1635761409.5')))
+        self.assertTrue(strptime_filter.is_timestamp_greater_or_equal_filter(
+            strptime_filter.get_timestamp('01/Dec/2021:10:10:10')))
+        self.assertRaises(ValueError, lexicographic_filter.get_timestamp, '2021-11-01 10:10:10')
+        self.assertRaises(ValueError, epoch_filter.get_timestamp, 'yesterday')
+        self.assertRaises(ValueError, DatetimeFilter, '2021-11-01', '%Y-%m-%dT%H:%M:%S')
+
+    def test_shared_shipping_runtime(self) -> None:
+        other_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionGeneral.JSON_DATETIME_LOG_FILE,
+                                                                  BytesIO(TestAzureFunctionGeneral.json_stream.read()),
+                                                                  TestAzureFunctionGeneral.json_size)
+        shipping_runtime = ShippingRuntime.get_instance(LogzioShipper.MAX_WORKERS, LogzioShipper.MAX_RETRIES,
+                                                        LogzioShipper.BACKOFF_FACTOR, LogzioShipper.STATUS_FORCELIST)
+        posts_nums = []
+
+        with requests_mock.Mocker() as mocker:
+            mocker.register_uri(method='POST', url=os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME], status_code=200)
+
+            for file_handler in (self.file_handler, other_file_handler):
+                with patch.object(shipping_runtime.session, 'post', wraps=shipping_runtime.session.post) as post:
+                    file_handler.handle_file()
+
+                posts_nums.append(post.call_count)
+
+        self.assertIs(shipping_runtime, self.file_handler._logzio_shipper._shipping_runtime)
+        self.assertIs(shipping_runtime, other_file_handler._logzio_shipper._shipping_runtime)
+        self.assertEqual([1, 1], posts_nums)
+
+    def test_compressed_bulk_size(self) -> None:
+        compressible_logs = [json.dumps({'message': "log number {} was sent".format(log_num)}).encode('utf-8')
+                             for log_num in range(50000)]
+        random_logs = [json.dumps({'message': os.urandom(500).hex()}).encode('utf-8') for _ in range(2000)]
+        compressed_bulk_size_ratio = 0.05
+
+        # The compressible logs are about 2 MB, which are 2 bulks when the bulks are limited by their uncompressed size.
+
+        for logs, max_requests_num in ((compressible_logs, 1), (random_logs, 5)):
+            consumer_producer_queues = ConsumerProducerQueues()
+            logzio_shipper = LogzioShipper(os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME],
+                                           os.environ[FileHandler.LOGZIO_TOKEN_ENVIRON_NAME],
+                                           consumer_producer_queues,
+                                           FileHandler.VERSION,
+                                           compressed_bulk_size_ratio)
+
+            for log in logs:
+                consumer_producer_queues.put_log_into_queue(LogRecord(log))
+
+            consumer_producer_queues.put_end_log_into_queue()
+
+            with requests_mock.Mocker() as mocker, \
+                    patch.object(logzio_shipper._bulks_budget, 'acquire',
+                                 side_effect=logzio_shipper._bulks_budget.acquire) as budget_acquire:
+                mocker.register_uri(method='POST', url=os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME],
+                                    status_code=200)
+                logzio_shipper.run_logzio_shipper()
+
+            bodies = [request.body for request in mocker.request_history]
+            in_flight_sizes = [call.args[0] for call in budget_acquire.call_args_list]
+            sent_logs = [log for body in bodies for log in gzip.decompress(body).splitlines()]
+
+            self.assertIsNone(logzio_shipper.exception)
+            self.assertLessEqual(len(bodies), max_requests_num)
+            self.assertTrue(all(len(body) <= LogzioShipper.MAX_BODY_SIZE_BYTES * compressed_bulk_size_ratio
+                                for body in bodies))
+            self.assertEqual(sorted(logs), sorted(sent_logs))
+            # The in flight budget is charged with the compressed bulks that are held in memory.
+            self.assertEqual(sorted(len(body) for body in bodies), sorted(in_flight_sizes))
+
+    def test_logs_queue_batches(self) -> None:
+        consumer_producer_queues = ConsumerProducerQueues()
+        logs_batch = [(LogRecord(b'END'), 4), (LogRecord(json_log='END'), 10), (LogRecord(b'{"message": "END"}'), 29)]
+
+        consumer_producer_queues.put_logs_into_queue(logs_batch)
+        consumer_producer_queues.put_log_into_queue(LogRecord(b'{}'))
+        consumer_producer_queues.put_end_log_into_queue()
+
+        self.assertEqual(logs_batch, consumer_producer_queues.get_logs_from_queue())
+        self.assertEqual(b'{}', consumer_producer_queues.get_logs_from_queue()[0][0].raw)
+        self.assertIsNone(consumer_producer_queues.get_logs_from_queue())
+
+    def test_in_flight_budget(self) -> None:
+        logs = [json.dumps({'message': os.urandom(300).hex()}).encode('utf-8') for _ in range(10000)]
+        consumer_producer_queues = ConsumerProducerQueues(LogzioShipper.MAX_BULK_SIZE_BYTES)
+        logzio_shipper = LogzioShipper(os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME],
+                                       os.environ[FileHandler.LOGZIO_TOKEN_ENVIRON_NAME],
+                                       consumer_producer_queues,
+                                       FileHandler.VERSION,
+                                       max_in_flight_bulks=1)
+        sending_bulks_nums = []
+        sending_bulks_num = [0]
+        lock = threading.Lock()
+
+        def send_bulk(request, context) -> str:
+            with lock:
+                sending_bulks_num[0] += 1
+                sending_bulks_nums.append(sending_bulks_num[0])
+
+            time.sleep(0.2)
+
+            with lock:
+                sending_bulks_num[0] -= 1
+
+            return ''
+
+        with requests_mock.Mocker() as mocker:
+            mocker.register_uri(method='POST', url=os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME], text=send_bulk)
+            logzio_shipper_future = logzio_shipper.start_logzio_shipper()
+
+            for log in logs:
+                consumer_producer_queues.put_log_into_queue(LogRecord(log))
+
+            consumer_producer_queues.put_end_log_into_queue()
+            logzio_shipper_future.result()
+
+        sent_logs = [log for request in mocker.request_history for log in gzip.decompress(request.body).splitlines()]
+
+        self.assertIsNone(logzio_shipper.exception)
+        self.assertEqual(logs, sent_logs)
+        self.assertEqual({1}, set(sending_bulks_nums))
+        self.assertGreater(consumer_producer_queues.logs_blocked_seconds, 0)
+        self.assertGreater(logzio_shipper.bulks_blocked_seconds, 0)
+
+    def test_rate_limiter(self) -> None:
+        requests_rate_limiter = RateLimiter(max_requests_per_second=100)
+        bytes_rate_limiter = RateLimiter(max_bytes_per_second=1000 * 1000)
+
+        def acquire_requests() -> None:
+            for _ in range(50):
+                requests_rate_limiter.acquire(1000)
+
+        start_time = time.monotonic()
+        senders = [threading.Thread(target=acquire_requests) for _ in range(3)]
+
+        for sender in senders:
+            sender.start()
+
+        for sender in senders:
+            sender.join()
+
+        requests_elapsed_seconds = time.monotonic() - start_time
+        start_time = time.monotonic()
+
+        for _ in range(10):
+            bytes_rate_limiter.acquire(200 * 1000)
+
+        bytes_elapsed_seconds = time.monotonic() - start_time
+
+        # The first second of tokens is a burst that is not waited for.
+        self.assertGreaterEqual(requests_elapsed_seconds, 0.45)
+        self.assertGreaterEqual(bytes_elapsed_seconds, 0.95)
+        self.assertGreater(requests_rate_limiter.waited_seconds, 0)
+
+    def test_shipping_runtime_config(self) -> None:
+        with patch.object(ShippingRuntime, '_instance', None):
+            shipping_runtime = ShippingRuntime.get_instance(2, 3, 1, [503])
+            same_shipping_runtime = ShippingRuntime.get_instance(2, 3, 1, [503])
+            rate_limited_shipping_runtime = ShippingRuntime.get_instance(2, 3, 1, [503], max_requests_per_second=10)
+
+        self.assertIs(shipping_runtime, same_shipping_runtime)
+        self.assertIsNot(shipping_runtime, rate_limited_shipping_runtime)
+        self.assertIsNot(shipping_runtime.rate_limiter, rate_limited_shipping_runtime.rate_limiter)
+
+    def test_async_shipping_backend(self) -> None:
+        logs = [json.dumps({'message': os.urandom(300).hex()}).encode('utf-8') for _ in range(20000)]
+
+        with LocalListener(response_delay_seconds=0.05) as local_listener:
+            consumer_producer_queues = ConsumerProducerQueues()
+            logzio_shipper = AsyncLogzioShipper(local_listener.url,
+                                                os.environ[FileHandler.LOGZIO_TOKEN_ENVIRON_NAME],
+                                                consumer_producer_queues,
+                                                FileHandler.VERSION,
+                                                max_in_flight_bulks=20)
+            logzio_shipper.add_custom_field_to_list(CustomField('file', 'logs.json'))
+
+            for log in logs:
+                consumer_producer_queues.put_log_into_queue(LogRecord(log))
+
+            consumer_producer_queues.put_end_log_into_queue()
+            logzio_shipper.run_logzio_shipper()
+
+        sent_logs = [log for body in local_listener.bodies for log in gzip.decompress(body).splitlines()]
+
+        self.assertIsNone(logzio_shipper.exception)
+        self.assertFalse(logzio_shipper.is_any_log_invalid)
+        self.assertEqual(sorted(log[:-1] + b', "file": "logs.json"}' for log in logs), sorted(sent_logs))
+        self.assertGreater(len(local_listener.bodies), AsyncLogzioShipper.MAX_CONNECTIONS)
+        self.assertLessEqual(local_listener.connections_num, AsyncLogzioShipper.MAX_CONNECTIONS)
+
+        with LocalListener(status_code=401) as local_listener:
+            consumer_producer_queues = ConsumerProducerQueues()
+            logzio_shipper = AsyncLogzioShipper(local_listener.url,
+                                                os.environ[FileHandler.LOGZIO_TOKEN_ENVIRON_NAME],
+                                                consumer_producer_queues,
+                                                FileHandler.VERSION)
+
+            self.tests_utils.add_first_log_to_logzio_shipper(self.file_parser, consumer_producer_queues)
+            logzio_shipper.run_logzio_shipper()
+
+        self.assertEqual(requests.HTTPError, type(logzio_shipper.exception))
+        self.assertEqual(401, logzio_shipper.exception.response.status_code)
+
+    def test_json_path_accessor(self) -> None:
+        json_log = {'metadata': [{'event time': '2021-11-01T10:10:10', 'datetime': '2021-11-01'}], 'time': None}
+
+        self.assertEqual(('metadata', 0, 'datetime'), JsonPathAccessor.compile_keys('$.metadata[0].datetime'))
+        self.assertEqual(('metadata', 0, 'event time'), JsonPathAccessor.compile_keys("metadata[0]['event time']"))
+        self.assertIsNone(JsonPathAccessor.compile_keys('metadata[:1].datetime'))
+        self.assertIs(JsonPathAccessor.get_accessor('metadata[0].datetime'),
+                      JsonPathAccessor.get_accessor('metadata[0].datetime'))
+
+        for expression in ('metadata[0].datetime', 'metadata[:1].datetime', "metadata[0].'event time'"):
+            accessor = JsonPathAccessor.get_accessor(expression)
+            reference_value = [match.value for match in parse(expression).find(json_log)][0]
+
+            self.assertEqual(reference_value, accessor.get_value(json_log))
+
+        self.assertFalse(JsonPathAccessor.get_accessor('metadata[:1].datetime').is_compiled)
+        self.assertIsNone(JsonPathAccessor.get_accessor('metadata[1].datetime').get_value(json_log))
+        self.assertIsNone(JsonPathAccessor.get_accessor('metadata.datetime').get_value(json_log))
+        self.assertIsNone(JsonPathAccessor.get_accessor('time').get_value(json_log))
+
 
 if __name__ == '__main__':
     unittest.main()
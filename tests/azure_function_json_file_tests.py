@@ -2,12 +2,23 @@ import unittest
 import logging
 import os
 import math
+import json
+import gzip
+import requests_mock
+import tracemalloc
+import itertools
 
 from io import BytesIO
+from unittest import mock
 from .tests_utils import TestsUtils
 from src.LogzioShipper.file_handler import FileHandler
 from src.LogzioShipper.json_parser import JsonParser
+from src.LogzioShipper.json_document_parser import JsonDocumentParser
 from src.LogzioShipper.logzio_shipper import LogzioShipper
+from src.LogzioShipper.parallel_parser import ParallelParser
+from src.LogzioShipper import json_codec
+from src.LogzioShipper.custom_field import CustomField, CustomFieldsInjector
+from src.LogzioShipper.log_record import LogRecord
 
 
 logger = logging.getLogger(__name__)
@@ -18,6 +29,8 @@ class TestAzureFunctionJsonFile(unittest.TestCase):
     JSON_LOG_FILE = 'tests/logs/json'
     JSON_WITH_BAD_LINES_LOG_FILE = 'tests/logs/json_bad_lines'
     JSON_GZ_LOG_FILE = "{}.gz".format(JSON_LOG_FILE)
+    DISK_SPILL_THRESHOLD_BYTES = '1024'
+    PARALLEL_PARSE_WORKERS = '2'
     DATETIME_FILTER = '2021-11-01T10:10:10'
     DATETIME_FINDER = 'metadata.datetime'
     DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
@@ -45,6 +58,11 @@ class TestAzureFunctionJsonFile(unittest.TestCase):
         os.environ[FileHandler.DATETIME_FILTER_ENVIRON_NAME] = FileHandler.NO_DATETIME_FILTER_VALUE
         os.environ[FileHandler.DATETIME_FINDER_ENVIRON_NAME] = FileHandler.NO_DATETIME_FINDER_VALUE
         os.environ[FileHandler.DATETIME_FORMAT_ENVIRON_NAME] = FileHandler.NO_DATETIME_FORMAT_VALUE
+        os.environ[FileHandler.DISK_SPILL_THRESHOLD_ENVIRON_NAME] = FileHandler.NO_DISK_SPILL_VALUE
+        os.environ[FileHandler.PARALLEL_PARSE_WORKERS_ENVIRON_NAME] = FileHandler.NO_PARALLEL_PARSE_VALUE
+        os.environ[FileHandler.SORTED_INPUT_ENVIRON_NAME] = FileHandler.FALSE_VALUE
+        os.environ[FileHandler.JSON_DOCUMENT_MODE_ENVIRON_NAME] = FileHandler.FALSE_VALUE
+        os.environ[FileHandler.JSON_ENVELOPE_PATH_ENVIRON_NAME] = FileHandler.NO_ENVELOPE_PATH_VALUE
 
         TestAzureFunctionJsonFile.json_stream.seek(0)
         TestAzureFunctionJsonFile.json_bad_logs_stream.seek(0)
@@ -87,6 +105,22 @@ class TestAzureFunctionJsonFile(unittest.TestCase):
         self.assertNotEqual(stream_logs_num, sent_logs_num)
         self.assertNotEqual(TestAzureFunctionJsonFile.json_bad_logs_size - stream_logs_num + 1, sent_bytes)
 
+    def test_send_json_non_object_logs(self) -> None:
+        json_stream = BytesIO(b'{"message": "first"}\n[1, 2]\n"message"\n3\n{"message": "second"}\n')
+        json_file_handler = FileHandler(TestAzureFunctionJsonFile.JSON_LOG_FILE, json_stream,
+                                        len(json_stream.getvalue()))
+
+        with requests_mock.Mocker() as mocker:
+            mocker.register_uri('POST', os.environ[FileHandler.LOGZIO_URL_ENVIRON_NAME], status_code=200)
+
+            with self.assertRaises(FileHandler.FailedToSendLogsError):
+                json_file_handler.handle_file()
+
+        sent_logs = [json.loads(log) for request in mocker.request_history
+                     for log in gzip.decompress(request.body).splitlines()]
+
+        self.assertEqual(['first', 'second'], [sent_log['message'] for sent_log in sent_logs])
+
     def test_send_json_gz_data(self) -> None:
         json_gz_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionJsonFile.JSON_GZ_LOG_FILE,
                                                                     TestAzureFunctionJsonFile.json_gz_stream,
@@ -105,6 +139,156 @@ class TestAzureFunctionJsonFile(unittest.TestCase):
         self.assertEqual(regular_sent_logs_num, gz_sent_logs_num)
         self.assertEqual(regular_sent_bytes, gz_sent_bytes)
 
+    def test_send_json_disk_spill_data(self) -> None:
+        os.environ[FileHandler.DISK_SPILL_THRESHOLD_ENVIRON_NAME] = TestAzureFunctionJsonFile.DISK_SPILL_THRESHOLD_BYTES
+
+        json_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionJsonFile.JSON_LOG_FILE,
+                                                                 TestAzureFunctionJsonFile.json_stream,
+                                                                 TestAzureFunctionJsonFile.json_size)
+        requests_num, sent_logs_num, sent_bytes = self.tests_utils.get_sending_file_results(json_file_handler)
+
+        stream_logs_num = self.tests_utils.get_file_stream_logs_num(TestAzureFunctionJsonFile.json_stream)
+        json_file_custom_fields_bytes = self.tests_utils.get_file_custom_fields_bytes(json_file_handler)
+        stream_size = TestAzureFunctionJsonFile.json_size - stream_logs_num + 1
+        stream_size += stream_logs_num * json_file_custom_fields_bytes
+
+        self.assertEqual(math.ceil(sent_bytes / LogzioShipper.MAX_BULK_SIZE_BYTES), requests_num)
+        self.assertEqual(stream_logs_num, sent_logs_num)
+        self.assertEqual(stream_size, sent_bytes)
+
+    def test_send_json_gz_disk_spill_data(self) -> None:
+        os.environ[FileHandler.DISK_SPILL_THRESHOLD_ENVIRON_NAME] = TestAzureFunctionJsonFile.DISK_SPILL_THRESHOLD_BYTES
+
+        json_gz_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionJsonFile.JSON_GZ_LOG_FILE,
+                                                                    TestAzureFunctionJsonFile.json_gz_stream,
+                                                                    TestAzureFunctionJsonFile.json_size)
+        _, gz_sent_logs_num, gz_sent_bytes = self.tests_utils.get_sending_file_results(json_gz_file_handler)
+
+        os.environ[FileHandler.DISK_SPILL_THRESHOLD_ENVIRON_NAME] = FileHandler.NO_DISK_SPILL_VALUE
+
+        json_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionJsonFile.JSON_LOG_FILE,
+                                                                 TestAzureFunctionJsonFile.json_stream,
+                                                                 TestAzureFunctionJsonFile.json_size)
+        _, regular_sent_logs_num, regular_sent_bytes = self.tests_utils.get_sending_file_results(json_file_handler)
+
+        self.assertEqual(regular_sent_logs_num, gz_sent_logs_num)
+        self.assertEqual(regular_sent_bytes - regular_sent_logs_num * self.tests_utils.get_file_custom_fields_bytes(
+            json_file_handler), gz_sent_bytes - gz_sent_logs_num * self.tests_utils.get_file_custom_fields_bytes(
+            json_gz_file_handler))
+
+    def test_send_json_disk_spill_bad_threshold(self) -> None:
+        for disk_spill_threshold in ('0', '-1024'):
+            os.environ[FileHandler.DISK_SPILL_THRESHOLD_ENVIRON_NAME] = disk_spill_threshold
+            TestAzureFunctionJsonFile.json_stream.seek(0)
+
+            json_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionJsonFile.JSON_LOG_FILE,
+                                                                     TestAzureFunctionJsonFile.json_stream,
+                                                                     TestAzureFunctionJsonFile.json_size)
+            _, sent_logs_num, _ = self.tests_utils.get_sending_file_results(json_file_handler)
+
+            stream_logs_num = self.tests_utils.get_file_stream_logs_num(TestAzureFunctionJsonFile.json_stream)
+
+            self.assertIsNone(json_file_handler._spill_file)
+            self.assertEqual(stream_logs_num, sent_logs_num)
+
+    def test_empty_json_disk_spill_file_is_closed(self) -> None:
+        os.environ[FileHandler.DISK_SPILL_THRESHOLD_ENVIRON_NAME] = TestAzureFunctionJsonFile.DISK_SPILL_THRESHOLD_BYTES
+
+        json_file_handler = FileHandler(TestAzureFunctionJsonFile.JSON_LOG_FILE, BytesIO(b''), 0)
+        json_file_handler.handle_file()
+
+        self.assertTrue(json_file_handler._spill_file.closed)
+
+    def test_send_json_parallel_parse_data(self) -> None:
+        os.environ[FileHandler.PARALLEL_PARSE_WORKERS_ENVIRON_NAME] = TestAzureFunctionJsonFile.PARALLEL_PARSE_WORKERS
+
+        json_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionJsonFile.JSON_LOG_FILE,
+                                                                 TestAzureFunctionJsonFile.json_stream,
+                                                                 TestAzureFunctionJsonFile.json_size)
+        requests_num, sent_logs_num, sent_bytes = self.tests_utils.get_sending_file_results(json_file_handler)
+
+        stream_logs_num = self.tests_utils.get_file_stream_logs_num(TestAzureFunctionJsonFile.json_stream)
+        json_file_custom_fields_bytes = self.tests_utils.get_file_custom_fields_bytes(json_file_handler)
+        stream_size = TestAzureFunctionJsonFile.json_size - stream_logs_num + 1
+        stream_size += stream_logs_num * json_file_custom_fields_bytes
+
+        self.assertEqual(math.ceil(sent_bytes / LogzioShipper.MAX_BULK_SIZE_BYTES), requests_num)
+        self.assertEqual(stream_logs_num, sent_logs_num)
+        self.assertEqual(stream_size, sent_bytes)
+
+    def test_send_json_parallel_parse_bad_workers_num(self) -> None:
+        for parallel_parse_workers in ('0', '-2', 'two'):
+            os.environ[FileHandler.PARALLEL_PARSE_WORKERS_ENVIRON_NAME] = parallel_parse_workers
+            TestAzureFunctionJsonFile.json_stream.seek(0)
+
+            json_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionJsonFile.JSON_LOG_FILE,
+                                                                     TestAzureFunctionJsonFile.json_stream,
+                                                                     TestAzureFunctionJsonFile.json_size)
+            _, sent_logs_num, _ = self.tests_utils.get_sending_file_results(json_file_handler)
+
+            stream_logs_num = self.tests_utils.get_file_stream_logs_num(TestAzureFunctionJsonFile.json_stream)
+
+            self.assertEqual(stream_logs_num, sent_logs_num)
+
+    def test_send_json_parallel_parse_data_with_bad_logs(self) -> None:
+        os.environ[FileHandler.PARALLEL_PARSE_WORKERS_ENVIRON_NAME] = TestAzureFunctionJsonFile.PARALLEL_PARSE_WORKERS
+
+        json_bad_logs_file_handler = FileHandler(TestAzureFunctionJsonFile.JSON_WITH_BAD_LINES_LOG_FILE,
+                                                 TestAzureFunctionJsonFile.json_bad_logs_stream,
+                                                 TestAzureFunctionJsonFile.json_bad_logs_size)
+        _, parallel_sent_logs_num, parallel_sent_bytes = self.tests_utils.get_sending_file_results(
+            json_bad_logs_file_handler)
+
+        os.environ[FileHandler.PARALLEL_PARSE_WORKERS_ENVIRON_NAME] = FileHandler.NO_PARALLEL_PARSE_VALUE
+        TestAzureFunctionJsonFile.json_bad_logs_stream.seek(0)
+
+        json_bad_logs_file_handler = FileHandler(TestAzureFunctionJsonFile.JSON_WITH_BAD_LINES_LOG_FILE,
+                                                 TestAzureFunctionJsonFile.json_bad_logs_stream,
+                                                 TestAzureFunctionJsonFile.json_bad_logs_size)
+        _, regular_sent_logs_num, regular_sent_bytes = self.tests_utils.get_sending_file_results(
+            json_bad_logs_file_handler)
+
+        TestAzureFunctionJsonFile.json_bad_logs_stream.seek(0)
+
+        parallel_parser = ParallelParser(TestAzureFunctionJsonFile.json_bad_logs_stream,
+                                         int(TestAzureFunctionJsonFile.PARALLEL_PARSE_WORKERS), JsonParser, {}, None, [])
+        parsed_logs_num = sum(1 for _ in parallel_parser.parse_file())
+
+        self.assertFalse(parallel_parser.are_all_logs_parsed)
+        self.assertEqual(regular_sent_logs_num, parsed_logs_num)
+        self.assertEqual(regular_sent_logs_num, parallel_sent_logs_num)
+        self.assertEqual(regular_sent_bytes, parallel_sent_bytes)
+
+    def test_parallel_parse_pool(self) -> None:
+        executors = []
+
+        for _ in range(2):
+            TestAzureFunctionJsonFile.json_bad_logs_stream.seek(0)
+            parallel_parser = ParallelParser(TestAzureFunctionJsonFile.json_bad_logs_stream,
+                                             int(TestAzureFunctionJsonFile.PARALLEL_PARSE_WORKERS), JsonParser, {},
+                                             None, [])
+            parsed_logs_num = sum(1 for _ in parallel_parser.parse_file())
+            executors.append(ParallelParser._executor)
+
+        self.assertGreater(parsed_logs_num, 0)
+        self.assertIs(executors[0], executors[1])
+        self.assertNotEqual('fork', executors[0]._mp_context.get_start_method())
+
+    def test_parallel_parse_datetime_filter(self) -> None:
+        os.environ[FileHandler.PARALLEL_PARSE_WORKERS_ENVIRON_NAME] = TestAzureFunctionJsonFile.PARALLEL_PARSE_WORKERS
+        os.environ[FileHandler.DATETIME_FILTER_ENVIRON_NAME] = TestAzureFunctionJsonFile.DATETIME_FILTER
+        os.environ[FileHandler.DATETIME_FINDER_ENVIRON_NAME] = TestAzureFunctionJsonFile.DATETIME_FINDER
+        os.environ[FileHandler.DATETIME_FORMAT_ENVIRON_NAME] = TestAzureFunctionJsonFile.DATETIME_FORMAT
+
+        json_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionJsonFile.JSON_LOG_FILE,
+                                                                 TestAzureFunctionJsonFile.json_stream,
+                                                                 TestAzureFunctionJsonFile.json_size)
+        _, sent_logs_num, _ = self.tests_utils.get_sending_file_results(json_file_handler)
+
+        stream_logs_num = self.tests_utils.get_file_stream_logs_num(TestAzureFunctionJsonFile.json_stream)
+
+        self.assertEqual(stream_logs_num - 5, sent_logs_num)
+
     def test_datetime_filter(self) -> None:
         os.environ[FileHandler.DATETIME_FILTER_ENVIRON_NAME] = TestAzureFunctionJsonFile.DATETIME_FILTER
         os.environ[FileHandler.DATETIME_FINDER_ENVIRON_NAME] = TestAzureFunctionJsonFile.DATETIME_FINDER
@@ -124,6 +308,167 @@ class TestAzureFunctionJsonFile(unittest.TestCase):
         self.assertEqual(stream_logs_num - 5, sent_logs_num)
         self.assertNotEqual(stream_size, sent_bytes)
 
+    def test_sorted_input_datetime_filter(self) -> None:
+        os.environ[FileHandler.DATETIME_FILTER_ENVIRON_NAME] = TestAzureFunctionJsonFile.DATETIME_FILTER
+        os.environ[FileHandler.DATETIME_FINDER_ENVIRON_NAME] = TestAzureFunctionJsonFile.DATETIME_FINDER
+        os.environ[FileHandler.DATETIME_FORMAT_ENVIRON_NAME] = TestAzureFunctionJsonFile.DATETIME_FORMAT
+        os.environ[FileHandler.SORTED_INPUT_ENVIRON_NAME] = FileHandler.TRUE_VALUE
+
+        json_parser = JsonParser(TestAzureFunctionJsonFile.json_stream, TestAzureFunctionJsonFile.DATETIME_FINDER,
+                                 TestAzureFunctionJsonFile.DATETIME_FORMAT)
+        start_offset = json_parser.find_datetime_filter_offset(TestAzureFunctionJsonFile.DATETIME_FILTER)
+        old_logs_size = sum(len(TestAzureFunctionJsonFile.json_stream.readline()) for _ in range(5))
+
+        TestAzureFunctionJsonFile.json_stream.seek(0)
+
+        json_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionJsonFile.JSON_LOG_FILE,
+                                                                 TestAzureFunctionJsonFile.json_stream,
+                                                                 TestAzureFunctionJsonFile.json_size)
+        _, sent_logs_num, _ = self.tests_utils.get_sending_file_results(json_file_handler)
+
+        stream_logs_num = self.tests_utils.get_file_stream_logs_num(TestAzureFunctionJsonFile.json_stream)
+
+        self.assertEqual(old_logs_size, start_offset)
+        self.assertEqual(0, TestAzureFunctionJsonFile.json_stream.tell())
+        self.assertEqual(stream_logs_num - 5, sent_logs_num)
+
+    def test_datetime_filter_decodes_each_log_once(self) -> None:
+        os.environ[FileHandler.DATETIME_FILTER_ENVIRON_NAME] = TestAzureFunctionJsonFile.DATETIME_FILTER
+        os.environ[FileHandler.DATETIME_FINDER_ENVIRON_NAME] = TestAzureFunctionJsonFile.DATETIME_FINDER
+        os.environ[FileHandler.DATETIME_FORMAT_ENVIRON_NAME] = TestAzureFunctionJsonFile.DATETIME_FORMAT
+
+        json_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionJsonFile.JSON_LOG_FILE,
+                                                                 TestAzureFunctionJsonFile.json_stream,
+                                                                 TestAzureFunctionJsonFile.json_size)
+
+        with mock.patch.object(json_codec, 'loads', side_effect=json_codec.loads) as json_loads:
+            _, sent_logs_num, _ = self.tests_utils.get_sending_file_results(json_file_handler)
+
+        stream_logs_num = self.tests_utils.get_file_stream_logs_num(TestAzureFunctionJsonFile.json_stream)
+
+        self.assertEqual(stream_logs_num - 5, sent_logs_num)
+        self.assertEqual(stream_logs_num, json_loads.call_count)
+
+    def test_json_codec(self) -> None:
+        json_log = {'message': 'h\u00e9llo', 'level': 'info', 'count': 3, 'nested': {'values': [1.5, None, True]}}
+
+        self.assertEqual(json.dumps(json_log).encode('utf-8'), json_codec.dumps(json_log))
+        self.assertEqual(json_log, json_codec.loads(json_codec.dumps(json_log)))
+        self.assertTrue(math.isnan(json_codec.loads(b'{"value": NaN}')['value']))
+        self.assertEqual(2 ** 70, json_codec.loads(str(2 ** 70).encode('utf-8')))
+        self.assertTrue(json_codec.is_valid(b'{"value": Infinity}'))
+        self.assertFalse(json_codec.is_valid(b'{"value": }'))
+        self.assertFalse(json_codec.is_valid(b'{"value": "\xff"}'))
+
+    @unittest.skipIf(json_codec.simdjson is None, 'pysimdjson is not installed')
+    def test_json_codec_validates_without_decoding(self) -> None:
+        with mock.patch.object(json_codec, 'loads', side_effect=json_codec.loads) as json_loads:
+            self.assertTrue(json_codec.is_valid(b'{"message": "h\\u00e9llo", "nested": {"values": [1.5, null, true]}}'))
+            self.assertTrue(json_codec.is_valid(b'[1, 2]'))
+
+        self.assertEqual(0, json_loads.call_count)
+
+    def test_custom_fields_injection(self) -> None:
+        custom_fields_injector = CustomFieldsInjector([CustomField('file', 'logs/h\u00e9llo "json"')])
+
+        self.assertEqual(b'{"message":"hello", "file": "logs/h\\u00e9llo \\"json\\""}',
+                         custom_fields_injector.add_custom_fields_to_log(LogRecord(b'{"message":"hello"}')))
+        self.assertEqual(b'{"file": "logs/h\\u00e9llo \\"json\\""}',
+                         custom_fields_injector.add_custom_fields_to_log(LogRecord(b'{}')))
+        self.assertEqual(b'{"file": "logs/h\\u00e9llo \\"json\\"", "message": "hello"}',
+                         custom_fields_injector.add_custom_fields_to_log(
+                             LogRecord(b'{"file": "other", "message": "hello"}')))
+        self.assertEqual(b'{"message": "hello", "file": "logs/h\\u00e9llo \\"json\\""}',
+                         custom_fields_injector.add_custom_fields_to_log(LogRecord(json_log={'message': 'hello'})))
+        self.assertEqual(b'{"file": "logs/h\\u00e9llo \\"json\\"", "message": "hello"}',
+                         custom_fields_injector.add_custom_fields_to_log(
+                             LogRecord(b'{"fil\\u0065": "other", "message": "hello"}')))
+        self.assertEqual(b'{"message": "h\\u00e9llo", "file": "logs/h\\u00e9llo \\"json\\""}',
+                         custom_fields_injector.add_custom_fields_to_log(LogRecord(b'{"message": "h\\u00e9llo"}')))
+
+    def test_parse_json_documents(self) -> None:
+        json_logs = [json.loads(line) for line in TestAzureFunctionJsonFile.json_stream]
+        documents = {
+            'records': json.dumps({'time': 'h\u00e9llo', 'records': json_logs, 'count': len(json_logs)}, indent=2,
+                                  ensure_ascii=False),
+            'data.records': json.dumps({'data': {'records': json_logs}}),
+            None: json.dumps(json_logs, indent=2) + '\n'.join(json.dumps(json_log, indent=4) for json_log in json_logs)
+        }
+
+        for envelope_path, document in documents.items():
+            document_stream = BytesIO(document.encode('utf-8'))
+            expected_logs = json_logs if envelope_path is not None else json_logs * 2
+
+            with mock.patch.object(JsonDocumentParser, 'READ_SIZE_BYTES', 7):
+                json_document_parser = JsonDocumentParser(document_stream,
+                                                          envelope_path.split('.') if envelope_path else None)
+                parsed_logs = []
+
+                for log in json_document_parser.parse_file():
+                    parsed_logs.append(log.json_log)
+
+                    # Resuming from the offset of any log parses the rest of the document.
+                    if len(parsed_logs) == 3:
+                        resumed_json_document_parser = JsonDocumentParser(
+                            BytesIO(document.encode('utf-8')), envelope_path.split('.') if envelope_path else None)
+                        resumed_json_document_parser.set_start_offset(json_document_parser.offset)
+                        resumed_logs = [resumed_log.json_log for resumed_log in
+                                        resumed_json_document_parser.parse_file()]
+
+                        self.assertEqual(expected_logs[3:], resumed_logs)
+                        self.assertTrue(resumed_json_document_parser.are_all_logs_parsed)
+
+            self.assertEqual(expected_logs, parsed_logs)
+            self.assertTrue(json_document_parser.are_all_logs_parsed)
+            self.assertEqual(len(document.encode('utf-8').rstrip()), json_document_parser.offset)
+
+        json_document_parser = JsonDocumentParser(BytesIO(b'[{"message": "hello"}, {"message": }]'))
+
+        self.assertEqual([{'message': 'hello'}], [log.json_log for log in json_document_parser.parse_file()])
+        self.assertFalse(json_document_parser.are_all_logs_parsed)
+
+    def test_stream_json_one_line_document(self) -> None:
+        os.environ[FileHandler.JSON_DOCUMENT_MODE_ENVIRON_NAME] = FileHandler.TRUE_VALUE
+        os.environ[FileHandler.JSON_ENVELOPE_PATH_ENVIRON_NAME] = 'records'
+        os.environ[FileHandler.STREAMING_INGESTION_ENVIRON_NAME] = FileHandler.TRUE_VALUE
+
+        json_logs = [{'message': os.urandom(100).hex(), 'number': log_num} for log_num in range(50000)]
+        document_stream = TestsUtils.get_gz_file_stream(BytesIO(json.dumps({'records': json_logs}).encode('utf-8')))
+        json_file_handler = FileHandler(TestAzureFunctionJsonFile.JSON_GZ_LOG_FILE, document_stream,
+                                        len(document_stream.getvalue()))
+
+        # The document is one line of about 12 MB, and only the chunks that are parsed are held in memory.
+        tracemalloc.start()
+
+        try:
+            parsed_logs = [log.json_log for log in itertools.islice(json_file_handler.file_parser.parse_file(), 10)]
+            _, peak_size = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(json_logs[:10], parsed_logs)
+        self.assertLess(peak_size, 2 * 1024 * 1024)
+
+    def test_send_json_envelope_data(self) -> None:
+        os.environ[FileHandler.JSON_DOCUMENT_MODE_ENVIRON_NAME] = FileHandler.TRUE_VALUE
+        os.environ[FileHandler.JSON_ENVELOPE_PATH_ENVIRON_NAME] = 'records'
+
+        json_logs = [json.loads(line) for line in TestAzureFunctionJsonFile.json_stream]
+        envelope_stream = BytesIO(json.dumps({'records': json_logs}, indent=2).encode('utf-8'))
+        envelope_gz_stream = TestsUtils.get_gz_file_stream(envelope_stream)
+
+        json_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionJsonFile.JSON_GZ_LOG_FILE,
+                                                                 envelope_gz_stream, len(envelope_gz_stream.getvalue()))
+        requests_num, sent_logs_num, sent_bytes = self.tests_utils.get_sending_file_results(json_file_handler)
+
+        json_file_custom_fields_bytes = self.tests_utils.get_file_custom_fields_bytes(json_file_handler)
+        logs_size = TestAzureFunctionJsonFile.json_size - len(json_logs) + 1
+        logs_size += len(json_logs) * json_file_custom_fields_bytes
+
+        self.assertEqual(math.ceil(sent_bytes / LogzioShipper.MAX_BULK_SIZE_BYTES), requests_num)
+        self.assertEqual(len(json_logs), sent_logs_num)
+        self.assertEqual(logs_size, sent_bytes)
+
     def test_bad_datetime_finder(self) -> None:
         os.environ[FileHandler.DATETIME_FILTER_ENVIRON_NAME] = TestAzureFunctionJsonFile.DATETIME_FILTER
         os.environ[FileHandler.DATETIME_FINDER_ENVIRON_NAME] = TestAzureFunctionJsonFile.BAD_DATETIME_FINDER
@@ -2,12 +2,23 @@ import unittest
 import logging
 import os
 import math
+import json
+import gzip
+import bz2
+import lzma
 
 from io import BytesIO
 from .tests_utils import TestsUtils
 from src.LogzioShipper.file_handler import FileHandler
 from src.LogzioShipper.text_parser import TextParser
 from src.LogzioShipper.logzio_shipper import LogzioShipper
+from src.LogzioShipper.decompressors import ZstdDecompressor
+from src.LogzioShipper.multiline_assembler import MultilineAssembler
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 
 logger = logging.getLogger(__name__)
@@ -21,6 +32,9 @@ class TestAzureFunctionTextFile(unittest.TestCase):
     TEXT_MULTILINE_GZ_LOG_FILE = "{}.gz".format(TEXT_MULTILINE_LOG_FILE)
     MULTILINE_REGEX = '(ERROR|INFO):\n[a-zA-Z. ]+'
     BAD_MULTILINE_REGEX = 'WARNING:\n[a-zA-Z. ]+'
+    RECORD_START_MULTILINE_REGEX = '(ERROR|INFO):'
+    CONTINUATION_MULTILINE_REGEX = '\\s'
+    PARALLEL_PARSE_WORKERS = '2'
     DATETIME_FILTER = '2021-11-01T10:10:10'
     DATETIME_FINDER = '[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}'
     DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
@@ -50,6 +64,9 @@ class TestAzureFunctionTextFile(unittest.TestCase):
         os.environ[FileHandler.DATETIME_FILTER_ENVIRON_NAME] = FileHandler.NO_DATETIME_FILTER_VALUE
         os.environ[FileHandler.DATETIME_FINDER_ENVIRON_NAME] = FileHandler.NO_DATETIME_FINDER_VALUE
         os.environ[FileHandler.DATETIME_FORMAT_ENVIRON_NAME] = FileHandler.NO_DATETIME_FORMAT_VALUE
+        os.environ[FileHandler.STREAMING_INGESTION_ENVIRON_NAME] = FileHandler.FALSE_VALUE
+        os.environ[FileHandler.DISK_SPILL_THRESHOLD_ENVIRON_NAME] = FileHandler.NO_DISK_SPILL_VALUE
+        os.environ[FileHandler.PARALLEL_PARSE_WORKERS_ENVIRON_NAME] = FileHandler.NO_PARALLEL_PARSE_VALUE
 
         TestAzureFunctionTextFile.text_stream.seek(0)
         TestAzureFunctionTextFile.text_multiline_stream.seek(0)
@@ -72,6 +89,87 @@ class TestAzureFunctionTextFile(unittest.TestCase):
 
         self.assertEqual(stream_logs_num, parsed_logs_num)
 
+    def test_parse_text_encoding(self) -> None:
+        lines = [b'INFO: "quoted" \\ path\tcaf\xc3\xa9\r\n', b'   \n', b'ERROR: \x1b[31mred\x1b[0m\n']
+        text_stream = BytesIO(b''.join(lines))
+        text_parser = TextParser(text_stream)
+        text_parser.LINES_BATCH_SIZE = 2
+
+        logs = [(log.raw, text_parser.offset) for log in text_parser.parse_file()]
+
+        self.assertEqual([(json.dumps({'message': 'INFO: "quoted" \\ path\tcaf\u00e9'}).encode('utf-8'), len(lines[0])),
+                          (json.dumps({'message': 'ERROR: \x1b[31mred\x1b[0m'}).encode('utf-8'), len(b''.join(lines)))],
+                         logs)
+
+    def test_parse_text_multiline_record_start_file(self) -> None:
+        text_multiline_parser = TextParser(TestAzureFunctionTextFile.text_multiline_stream,
+                                           TestAzureFunctionTextFile.RECORD_START_MULTILINE_REGEX,
+                                           multiline_mode=MultilineAssembler.RECORD_START_MODE)
+        multiline_logs = []
+
+        for log in text_multiline_parser.parse_file():
+            multiline_logs.append((log.json_log['message'], text_multiline_parser.offset))
+
+        TestAzureFunctionTextFile.text_multiline_stream.seek(0)
+        stream_lines = TestAzureFunctionTextFile.text_multiline_stream.readlines()
+        stream_logs = [(b''.join(stream_lines[line_num:line_num + 2]).decode("utf-8").rstrip(),
+                        len(b''.join(stream_lines[:line_num + 2])))
+                       for line_num in range(0, len(stream_lines), 2)]
+
+        self.assertEqual(stream_logs, multiline_logs)
+        self.assertTrue(text_multiline_parser.are_all_logs_parsed)
+
+    def test_parse_text_multiline_continuation_file(self) -> None:
+        text_stream = BytesIO(b'Traceback (most recent call last):\n'
+                              b'  File "main.py", line 1\n'
+                              b'    raise ValueError\n'
+                              b'ValueError\n'
+                              b'INFO: done\n')
+        text_multiline_parser = TextParser(text_stream, TestAzureFunctionTextFile.CONTINUATION_MULTILINE_REGEX,
+                                           multiline_mode=MultilineAssembler.CONTINUATION_MODE, multiline_max_lines=2)
+
+        multiline_logs = [log.json_log['message'] for log in text_multiline_parser.parse_file()]
+
+        self.assertEqual(['Traceback (most recent call last):\n  File "main.py", line 1',
+                          '    raise ValueError',
+                          'ValueError',
+                          'INFO: done'],
+                         multiline_logs)
+
+    def test_sorted_input_multiline_datetime_filter(self) -> None:
+        old_logs = b''.join(b'2021-10-31T10:10:10 ERROR: something went wrong\n  at line 1\n  at line 2\n'
+                            for _ in range(50))
+        new_logs = b''.join(b'2021-11-05T10:10:10 ERROR: something went wrong\n  at line 1\n  at line 2\n'
+                            for _ in range(50))
+        text_stream = BytesIO(old_logs + new_logs)
+        text_multiline_parser = TextParser(text_stream, TestAzureFunctionTextFile.DATETIME_FINDER,
+                                           TestAzureFunctionTextFile.DATETIME_FINDER,
+                                           TestAzureFunctionTextFile.DATETIME_FORMAT,
+                                           multiline_mode=MultilineAssembler.RECORD_START_MODE)
+
+        start_offset = text_multiline_parser.find_datetime_filter_offset(TestAzureFunctionTextFile.DATETIME_FILTER)
+        text_multiline_parser.set_start_offset(start_offset)
+
+        self.assertEqual(len(old_logs), start_offset)
+        self.assertEqual(50, sum(1 for _ in text_multiline_parser.parse_file()))
+
+    def test_datetime_finder_on_json_encoded_log(self) -> None:
+        text_stream = BytesIO(b'time="2021-11-05T10:10:10" level=error\n')
+        text_parser = TextParser(text_stream, datetime_finder='^{"message": "time=\\\\"([0-9T:-]+)\\\\"',
+                                 datetime_format=TestAzureFunctionTextFile.DATETIME_FORMAT)
+
+        self.assertEqual(['2021-11-05T10:10:10'],
+                         [text_parser.get_log_datetime_value(log) for log in text_parser.parse_file()])
+
+    def test_parse_text_multiline_file_max_lines(self) -> None:
+        text_multiline_parser = TextParser(TestAzureFunctionTextFile.text_multiline_stream,
+                                           TestAzureFunctionTextFile.BAD_MULTILINE_REGEX, multiline_max_lines=10)
+        parsed_logs_num = self.tests_utils.get_parsed_logs_num(text_multiline_parser,
+                                                               TestAzureFunctionTextFile.text_multiline_stream)
+
+        self.assertEqual(0, parsed_logs_num)
+        self.assertFalse(text_multiline_parser.are_all_logs_parsed)
+
     def test_send_text_data(self) -> None:
         os.environ[FileHandler.MULTILINE_REGEX_ENVIRON_NAME] = FileHandler.NO_MULTILINE_REGEX_VALUE
 
@@ -166,6 +264,85 @@ class TestAzureFunctionTextFile(unittest.TestCase):
         self.assertEqual(regular_sent_logs_num, gz_sent_logs_num)
         self.assertEqual(regular_sent_bytes, gz_sent_bytes)
 
+    def test_send_text_streaming_data(self) -> None:
+        os.environ[FileHandler.MULTILINE_REGEX_ENVIRON_NAME] = FileHandler.NO_MULTILINE_REGEX_VALUE
+
+        text_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionTextFile.TEXT_LOG_FILE,
+                                                                 TestAzureFunctionTextFile.text_stream,
+                                                                 TestAzureFunctionTextFile.text_size)
+        _, regular_sent_logs_num, regular_sent_bytes = self.tests_utils.get_sending_file_results(text_file_handler)
+
+        os.environ[FileHandler.STREAMING_INGESTION_ENVIRON_NAME] = FileHandler.TRUE_VALUE
+
+        text_streaming_file_handler = FileHandler(TestAzureFunctionTextFile.TEXT_LOG_FILE,
+                                                  TestAzureFunctionTextFile.text_stream,
+                                                  TestAzureFunctionTextFile.text_size)
+        _, streaming_sent_logs_num, streaming_sent_bytes = self.tests_utils.get_sending_file_results(
+            text_streaming_file_handler)
+
+        self.assertEqual(regular_sent_logs_num, streaming_sent_logs_num)
+        self.assertEqual(regular_sent_bytes, streaming_sent_bytes)
+
+    def test_send_text_multiline_gz_streaming_data(self) -> None:
+        os.environ[FileHandler.MULTILINE_REGEX_ENVIRON_NAME] = TestAzureFunctionTextFile.MULTILINE_REGEX
+
+        text_multiline_file_handler = self.tests_utils.create_file_handler(
+            TestAzureFunctionTextFile.TEXT_MULTILINE_LOG_FILE,
+            TestAzureFunctionTextFile.text_multiline_stream,
+            TestAzureFunctionTextFile.text_multiline_size)
+        _, regular_sent_logs_num, regular_sent_bytes = self.tests_utils.get_sending_file_results(
+            text_multiline_file_handler)
+
+        os.environ[FileHandler.STREAMING_INGESTION_ENVIRON_NAME] = FileHandler.TRUE_VALUE
+
+        text_multiline_gz_file_handler = FileHandler(TestAzureFunctionTextFile.TEXT_MULTILINE_GZ_LOG_FILE,
+                                                     TestAzureFunctionTextFile.text_multiline_gz_stream,
+                                                     TestAzureFunctionTextFile.text_multiline_size)
+        _, gz_sent_logs_num, gz_sent_bytes = self.tests_utils.get_sending_file_results(text_multiline_gz_file_handler)
+        regular_sent_bytes -= regular_sent_logs_num * self.tests_utils.get_file_custom_fields_bytes(
+            text_multiline_file_handler)
+        gz_sent_bytes -= gz_sent_logs_num * self.tests_utils.get_file_custom_fields_bytes(
+            text_multiline_gz_file_handler)
+
+        self.assertEqual(regular_sent_logs_num, gz_sent_logs_num)
+        self.assertEqual(regular_sent_bytes, gz_sent_bytes)
+
+    def test_send_text_parallel_parse_data(self) -> None:
+        os.environ[FileHandler.MULTILINE_REGEX_ENVIRON_NAME] = FileHandler.NO_MULTILINE_REGEX_VALUE
+        os.environ[FileHandler.PARALLEL_PARSE_WORKERS_ENVIRON_NAME] = TestAzureFunctionTextFile.PARALLEL_PARSE_WORKERS
+
+        text_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionTextFile.TEXT_LOG_FILE,
+                                                                 TestAzureFunctionTextFile.text_stream,
+                                                                 TestAzureFunctionTextFile.text_size)
+        requests_num, sent_logs_num, sent_bytes = self.tests_utils.get_sending_file_results(text_file_handler)
+
+        stream_logs_num = self.tests_utils.get_file_stream_logs_num(TestAzureFunctionTextFile.text_stream)
+        text_parser = TextParser(TestAzureFunctionTextFile.text_stream, multiline_regex=None)
+        text_file_custom_fields_bytes = self.tests_utils.get_file_custom_fields_bytes(text_file_handler)
+        text_bytes = self.tests_utils.get_parsed_logs_bytes(text_parser, TestAzureFunctionTextFile.text_stream)
+        text_bytes += stream_logs_num * text_file_custom_fields_bytes
+
+        self.assertEqual(math.ceil(sent_bytes / LogzioShipper.MAX_BULK_SIZE_BYTES), requests_num)
+        self.assertEqual(stream_logs_num, sent_logs_num)
+        self.assertEqual(text_bytes, sent_bytes)
+
+    def test_send_text_multi_member_gz_data(self) -> None:
+        self._assert_compressed_text_data(TestsUtils.get_compressed_file_stream(
+            TestAzureFunctionTextFile.text_stream, gzip.compress, members_num=3))
+
+    def test_send_text_bz2_data(self) -> None:
+        self._assert_compressed_text_data(TestsUtils.get_compressed_file_stream(
+            TestAzureFunctionTextFile.text_stream, bz2.compress, members_num=2))
+
+    def test_send_text_xz_data(self) -> None:
+        self._assert_compressed_text_data(TestsUtils.get_compressed_file_stream(
+            TestAzureFunctionTextFile.text_stream, lzma.compress, members_num=2))
+
+    @unittest.skipIf(not ZstdDecompressor.is_available(), 'zstandard is not installed')
+    def test_send_text_zstd_data(self) -> None:
+        self._assert_compressed_text_data(TestsUtils.get_compressed_file_stream(
+            TestAzureFunctionTextFile.text_stream, zstandard.ZstdCompressor().compress, members_num=2))
+
     def test_datetime_filter(self) -> None:
         os.environ[FileHandler.MULTILINE_REGEX_ENVIRON_NAME] = FileHandler.NO_MULTILINE_REGEX_VALUE
         os.environ[FileHandler.DATETIME_FILTER_ENVIRON_NAME] = TestAzureFunctionTextFile.DATETIME_FILTER
@@ -229,6 +406,23 @@ class TestAzureFunctionTextFile(unittest.TestCase):
         self.assertEqual(stream_logs_num, sent_logs_num)
         self.assertEqual(text_bytes, sent_bytes)
 
+    def _assert_compressed_text_data(self, compressed_stream: BytesIO) -> None:
+        os.environ[FileHandler.MULTILINE_REGEX_ENVIRON_NAME] = FileHandler.NO_MULTILINE_REGEX_VALUE
+
+        compressed_file_handler = FileHandler(TestAzureFunctionTextFile.TEXT_LOG_FILE,
+                                              compressed_stream,
+                                              len(compressed_stream.getvalue()))
+        _, compressed_sent_logs_num, compressed_sent_bytes = self.tests_utils.get_sending_file_results(
+            compressed_file_handler)
+
+        text_file_handler = self.tests_utils.create_file_handler(TestAzureFunctionTextFile.TEXT_LOG_FILE,
+                                                                 TestAzureFunctionTextFile.text_stream,
+                                                                 TestAzureFunctionTextFile.text_size)
+        _, regular_sent_logs_num, regular_sent_bytes = self.tests_utils.get_sending_file_results(text_file_handler)
+
+        self.assertEqual(regular_sent_logs_num, compressed_sent_logs_num)
+        self.assertEqual(regular_sent_bytes, compressed_sent_bytes)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -3,8 +3,10 @@ import requests_mock
 import gzip
 import os
 import json
+import asyncio
+import threading
 
-from typing import Tuple
+from typing import Tuple, Callable, List
 from logging.config import fileConfig
 from io import BytesIO
 from src.LogzioShipper.file_parser import FileParser
@@ -29,6 +31,21 @@ class TestsUtils:
         os.environ[FileHandler.DATETIME_FILTER_ENVIRON_NAME] = FileHandler.NO_DATETIME_FILTER_VALUE
         os.environ[FileHandler.DATETIME_FINDER_ENVIRON_NAME] = FileHandler.NO_DATETIME_FINDER_VALUE
         os.environ[FileHandler.DATETIME_FORMAT_ENVIRON_NAME] = FileHandler.NO_DATETIME_FORMAT_VALUE
+        os.environ[FileHandler.STREAMING_INGESTION_ENVIRON_NAME] = FileHandler.FALSE_VALUE
+        os.environ[FileHandler.DISK_SPILL_THRESHOLD_ENVIRON_NAME] = FileHandler.NO_DISK_SPILL_VALUE
+        os.environ[FileHandler.PARALLEL_PARSE_WORKERS_ENVIRON_NAME] = FileHandler.NO_PARALLEL_PARSE_VALUE
+        os.environ[FileHandler.CHECKPOINT_STORE_ENVIRON_NAME] = FileHandler.NO_CHECKPOINT_VALUE
+        os.environ[FileHandler.DEAD_LETTER_STORE_ENVIRON_NAME] = FileHandler.NO_DEAD_LETTER_VALUE
+        os.environ[FileHandler.PROCESSING_DEADLINE_ENVIRON_NAME] = FileHandler.NO_DEADLINE_VALUE
+        os.environ[FileHandler.REMAINDER_QUEUE_DIRECTORY_ENVIRON_NAME] = FileHandler.NO_REMAINDER_QUEUE_VALUE
+        os.environ[FileHandler.APPEND_BLOB_TAILING_ENVIRON_NAME] = FileHandler.FALSE_VALUE
+        os.environ[FileHandler.BLOB_INCLUDE_PATTERNS_ENVIRON_NAME] = FileHandler.NO_PATTERNS_VALUE
+        os.environ[FileHandler.BLOB_EXCLUDE_PATTERNS_ENVIRON_NAME] = FileHandler.NO_PATTERNS_VALUE
+        os.environ[FileHandler.PARTITION_DATETIME_FILTER_ENVIRON_NAME] = FileHandler.FALSE_VALUE
+        os.environ[FileHandler.SORTED_INPUT_ENVIRON_NAME] = FileHandler.FALSE_VALUE
+        os.environ[FileHandler.JSON_DOCUMENT_MODE_ENVIRON_NAME] = FileHandler.FALSE_VALUE
+        os.environ[FileHandler.JSON_ENVELOPE_PATH_ENVIRON_NAME] = FileHandler.NO_ENVELOPE_PATH_VALUE
+        os.environ[FileHandler.COMPRESSED_BULK_SIZE_RATIO_ENVIRON_NAME] = FileHandler.NO_COMPRESSED_BULK_SIZE_RATIO_VALUE
 
     @staticmethod
     def get_file_stream_and_size(file_path: str) -> Tuple[BytesIO, int]:
@@ -44,6 +61,21 @@ class TestsUtils:
 
         return BytesIO(compressed_data)
 
+    @staticmethod
+    def get_compressed_file_stream(file_stream: BytesIO, compress: Callable[[bytes], bytes],
+                                   members_num: int = 1) -> BytesIO:
+        file_stream.seek(0)
+        lines = file_stream.readlines()
+        member_lines_num = -(-len(lines) // members_num)
+        compressed_data = b''
+
+        for member_start in range(0, len(lines), member_lines_num):
+            compressed_data += compress(b''.join(lines[member_start:member_start + member_lines_num]))
+
+        file_stream.seek(0)
+
+        return BytesIO(compressed_data)
+
     def get_parsed_logs_num(self, file_parser: FileParser, file_stream: BytesIO) -> int:
         parsed_logs_num = 0
 
@@ -58,7 +90,7 @@ class TestsUtils:
         parsed_logs_bytes = 0
 
         for log in file_parser.parse_file():
-            parsed_logs_bytes += len(log)
+            parsed_logs_bytes += len(log.raw)
 
         file_stream.seek(0)
 
@@ -118,3 +150,72 @@ class TestsUtils:
         file_stream.seek(0)
 
         return file_handler
+
+
+class LocalListener:
+
+    def __init__(self, status_code: int = 200, response_delay_seconds: float = 0) -> None:
+        self._status_code = status_code
+        self._response_delay_seconds = response_delay_seconds
+        self._event_loop = asyncio.new_event_loop()
+        self._server = self._event_loop.run_until_complete(asyncio.start_server(self._handle_connection,
+                                                                                '127.0.0.1', 0))
+        self._thread = threading.Thread(target=self._event_loop.run_forever, daemon=True)
+        self._writers: List[asyncio.StreamWriter] = []
+        self.bodies: List[bytes] = []
+        self.connections_num = 0
+
+    @property
+    def url(self) -> str:
+        return "http://127.0.0.1:{}".format(self._server.sockets[0].getsockname()[1])
+
+    def __enter__(self) -> 'LocalListener':
+        self._thread.start()
+
+        return self
+
+    def __exit__(self, *args) -> None:
+        asyncio.run_coroutine_threadsafe(self._close(), self._event_loop).result()
+        self._event_loop.call_soon_threadsafe(self._event_loop.stop)
+        self._thread.join()
+        self._event_loop.close()
+
+    async def _close(self) -> None:
+        self._server.close()
+
+        for writer in self._writers:
+            writer.close()
+
+        await asyncio.sleep(0.1)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections_num += 1
+        self._writers.append(writer)
+
+        try:
+            while True:
+                request_line = await reader.readline()
+
+                if not request_line:
+                    break
+
+                headers = {}
+
+                while True:
+                    header_line = (await reader.readline()).decode('latin-1').strip()
+
+                    if not header_line:
+                        break
+
+                    header_name, _, header_value = header_line.partition(':')
+                    headers[header_name.lower()] = header_value.strip()
+
+                self.bodies.append(await reader.readexactly(int(headers['content-length'])))
+
+                await asyncio.sleep(self._response_delay_seconds)
+                writer.write("HTTP/1.1 {} Status\r\nContent-Length: 2\r\n\r\nok".format(self._status_code).encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()